@@ -0,0 +1,7 @@
+"""
+Benchmarks for logparser and imcapicli.plat.
+
+    python -m bench.run               # generate a log, start a mock IMC and run every stage
+    python -m bench.genlog <file>     # only generate a log
+    python -m bench.mockimc           # only run the mock IMC server
+"""
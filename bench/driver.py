@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Runs a single benchmark stage, copied into the benchmark workspace by bench.run.
+
+imcapicli loads config.yaml and writes logs/ relative to the calling script, so each stage
+runs as this script from the workspace (next to a copy of logparser.py) in its own process,
+which also makes the peak rss reported the peak for that stage alone.
+
+    python bench_driver.py <stage> <result.json>
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# imported in main() so bench.run can import STAGES, imcapicli loads config.yaml relative to the calling script
+logparser = None
+
+STARTUP_RUNS = 10
+
+
+def _peak_mb() -> float:
+    if resource is None:
+        return None
+    # ru_maxrss is KB on linux, bytes on macOS, children covers the process pool and the startup stage
+    peak = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _log_lines() -> int:
+    log_file = logparser.get_lines()
+    return log_file.count_lines(0, log_file.size)
+
+
+def get_lines() -> None:
+    for _ in logparser.get_lines().lines():
+        pass
+
+
+def grep() -> None:
+    for _ in logparser.get_lines().grep(b"THREAD("):
+        pass
+
+
+def sshv1() -> None:
+    # --no-cache (a global option) so every repeat parses the log instead of loading the memoized result
+    logparser.app(["--no-cache", "sshv1", "--refresh"], standalone_mode=False)
+
+
+def get_all_lines() -> None:
+    logparser.app(["get-all-lines"], standalone_mode=False)
+
+
+def startup() -> int:
+    '''Start logparser for a command that doesn't call IMC (imports and config only).'''
+    for _ in range(STARTUP_RUNS):
+        subprocess.run([sys.executable, "logparser.py", "get-all-lines", "--help"], stdout=subprocess.DEVNULL, check=True)
+    return STARTUP_RUNS
+
+
+def get_all_devs() -> int:
+    config, imc = logparser.config, logparser.imc
+    workers = config.get("imc", {}).get("workers", 4)
+    return len(imc.device.get_all_devs(config.imc.creds, config.imc.url, by_id=True, workers=workers, verify=False))
+
+
+STAGES = {
+    # stage: (function, unit counted), throughput for "lines" is the number of lines in the log
+    "get_lines": (get_lines, "lines"),
+    "grep": (grep, "lines"),
+    "sshv1": (sshv1, "lines"),
+    "get_all_lines": (get_all_lines, "lines"),
+    "get_all_devs": (get_all_devs, "devices"),
+    "startup": (startup, "starts"),
+}
+
+
+def main():
+    global logparser
+    import logparser
+
+    stage, result_file = sys.argv[1:3]
+    func, unit = STAGES[stage]
+    os.environ.setdefault("PAGER", "cat")
+    count = _log_lines() if unit == "lines" else None
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    count = result if count is None else count
+    with open(result_file, "w") as f:
+        json.dump({"stage": stage, "count": count, "unit": unit, "elapsed": elapsed, "peak_mb": _peak_mb()}, f)
+
+
+if __name__ == "__main__":
+    main()
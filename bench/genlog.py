@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Synthetic imcupgdm log generator.
+
+Sessions (one device job each) run on a fixed number of threads, their tagged lines are
+interleaved the way IMC logs them.  The lines that are logged together (an error and the
+iDevID block that follows it, "Finished, result:" and the cli output) are kept together.
+
+    python -m bench.genlog in/bench.log --sessions 100000 --threads 20
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, TextIO, Union
+
+FIRST_DEV_ID = 1000  # ids used match the devices served by bench.mockimc
+PARSE_USER = "imc-svc-user"
+START = datetime(2020, 11, 17)
+NOT_AUTHZ = "% Not authorized to run this command"
+
+
+def _session(rnd: random.Random, thread: int, dev_id: int, ssh_v1: float, cli_fail: float,
+             not_authz: float) -> List[List[str]]:
+    '''Return the line groups for one session, each group is written without interleaving.'''
+    ip = f"10.{dev_id // 65536 % 256}.{dev_id // 256 % 256}.{dev_id % 256}"
+    tag = f"[INFO] [THREAD({thread})]"
+    groups = [
+        [f"{tag} CExecuter::CExecuter() ID: {dev_id}"],
+        [f"{tag} dev id: {dev_id}, ip: {ip}."],
+        [f"{tag} Begin to login device DevID={dev_id}, DevIP ={ip}, AdaptName=H3C_V7"],
+        [f"{tag} Device login type is {rnd.choice('122')}, dev_id: {dev_id}"],
+        [f"{tag} spawn ssh pid: {rnd.randint(2000, 65000)} "],
+    ]
+    r = rnd.random()
+    if r < ssh_v1:
+        groups.append([f"{tag} Protocol major versions differ: 1 vs. 2 version 2 required by our configuration",
+                       f"{tag}    iDevID = '{dev_id:08x}'"])
+    elif r < ssh_v1 + cli_fail:
+        groups.append([f"{tag} Failed to execute by cli method",
+                       f"{tag} InputParam cmd=display version",
+                       f"{tag}    iDevID = '{dev_id:08x}'"])
+    groups.append([f"{tag} version = 7.1.0{rnd.randint(40, 70)}"])
+
+    output = [f"{tag} Finished, result: 0", f"{PARSE_USER}@{ip}'s password:", ""]
+    if rnd.random() < not_authz:
+        output.append(NOT_AUTHZ)
+    output += ["<switch>display version", ""]
+    groups.append(output)
+    return groups
+
+
+def generate(fp: TextIO, sessions: int, threads: int = 20, devices: int = 9000, ssh_v1: float = 0.15,
+             cli_fail: float = 0.15, not_authz: float = 0.2, seed: int = 1, crlf: bool = False) -> int:
+    '''Write a log with sessions device jobs to fp and return the number of lines written.
+
+    Args:
+        fp (TextIO): file open for writing
+        sessions (int): number of device jobs
+        threads (int, optional): concurrent threads (sessions in progress at once). Defaults to 20.
+        devices (int, optional): dev ids are picked from FIRST_DEV_ID to FIRST_DEV_ID + devices. Defaults to 9000.
+        ssh_v1 (float, optional): fraction of sessions that fail as the device requires SSHv1. Defaults to 0.15.
+        cli_fail (float, optional): fraction of sessions that fail to execute by cli method. Defaults to 0.15.
+        not_authz (float, optional): fraction of sessions with a command authorization failure in the output. Defaults to 0.2.
+        seed (int, optional): random seed, the same arguments always produce the same log. Defaults to 1.
+        crlf (bool, optional): use \\r\\n line endings. Defaults to False.
+    '''
+    rnd = random.Random(seed)
+    eol = "\r\n" if crlf else "\n"
+    free_threads = list(range(100 + threads - 1, 99, -1))
+    active = []  # [thread, remaining line groups (last group first)]
+    started, lines, ts = 0, 0, 8 * 3600 * 1000
+    while started < sessions or active:
+        while free_threads and started < sessions:
+            thread = free_threads.pop()
+            dev_id = FIRST_DEV_ID + rnd.randrange(devices)
+            active.append([thread, _session(rnd, thread, dev_id, ssh_v1, cli_fail, not_authz)[::-1]])
+            started += 1
+
+        pos = rnd.randrange(len(active))
+        thread, groups = active[pos]
+        ts += rnd.randint(0, 40)
+        # the date rolls over past midnight so the log stays in time order (logparser --since/--until)
+        stamp = (START + timedelta(milliseconds=ts)).isoformat(" ", "milliseconds")
+        group = groups.pop()
+        # tagged lines get the timestamp, device output is logged as is
+        fp.write(eol.join(f"{stamp} {line}" if line.startswith("[") else line for line in group) + eol)
+        lines += len(group)
+        if not groups:
+            active.pop(pos)
+            free_threads.append(thread)
+    return lines
+
+
+def write_log(path: Union[str, Path], sessions: int, **kwargs) -> int:
+    '''Write a generated log to path, kwargs are passed to generate().'''
+    with Path(path).open("w", newline="") as fp:
+        return generate(fp, sessions, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic imcupgdm log")
+    parser.add_argument("file", type=Path)
+    parser.add_argument("--sessions", type=int, default=10000, help="number of device jobs (~12 lines each)")
+    parser.add_argument("--threads", type=int, default=20, help="concurrent threads")
+    parser.add_argument("--devices", type=int, default=9000, help="number of distinct device ids")
+    parser.add_argument("--ssh-v1", type=float, default=0.15, help="fraction of sessions with the SSHv1 error")
+    parser.add_argument("--cli-fail", type=float, default=0.15, help="fraction of sessions that fail by cli method")
+    parser.add_argument("--not-authz", type=float, default=0.2, help="fraction of sessions with command authz failures")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--crlf", action="store_true", help="use \\r\\n line endings")
+    args = parser.parse_args()
+    lines = write_log(args.file, args.sessions, threads=args.threads, devices=args.devices, ssh_v1=args.ssh_v1,
+                      cli_fail=args.cli_fail, not_authz=args.not_authz, seed=args.seed, crlf=args.crlf)
+    print(f"{lines} lines written to {args.file} ({args.file.stat().st_size / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Local mock of the IMC REST API endpoints used by imcapicli.plat.
+
+Serves the paginated device inventory (/imcrs/plat/res/device), single device details
+(/imcrs/plat/res/device/<id>) and Config Center (/imcrs/icc/deviceCfg/configurationCenter)
+for a generated set of devices.  Every other path returns an empty json object.
+
+    python -m bench.mockimc --port 8080 --devices 9000
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+from .genlog import FIRST_DEV_ID
+
+DEVICE_URL = "/imcrs/plat/res/device"
+ICC_URL = "/imcrs/icc/deviceCfg/configurationCenter"
+DEV_DETAIL_RE = re.compile(rf"^{DEVICE_URL}/(\d+)$")
+
+
+def make_devices(count: int) -> list:
+    '''Return count device records in the shape IMC returns them (all values are strings).'''
+    return [
+        {
+            "id": str(dev_id),
+            "label": f"sw{dev_id}",
+            "ip": f"10.{dev_id // 65536 % 256}.{dev_id // 256 % 256}.{dev_id % 256}",
+            "mask": "255.255.255.0",
+            "status": "1",
+            "statusDesc": "Normal",
+            "sysName": f"sw{dev_id}",
+            "contact": "netops",
+            "location": f"bldg{dev_id % 40}",
+            "sysOid": "1.3.6.1.4.1.25506.11.1.178",
+            "runTime": "120 days 3 hours",
+            "devCategoryImgSrc": "switch",
+            "topoIconName": "iconswitch",
+            "categoryId": "1" if dev_id % 10 else "2",
+            "symbolId": str(dev_id + 1000),
+            "symbolName": f"sw{dev_id}",
+            "symbolType": "3",
+            "symbolDesc": "Normal",
+            "symbolLevel": "2",
+            "parentId": "1",
+            "typeName": f"HPE {5130 + dev_id % 7 * 10}",
+            "mac": f"00:00:5e:{dev_id // 65536 % 256:02x}:{dev_id // 256 % 256:02x}:{dev_id % 256:02x}",
+            "deviceModel": f"Model{dev_id % 7}",
+            "currentVersion": f"7.1.0{40 + dev_id % 30}",
+            "link": {"@op": "GET", "@rel": "self", "@href": f"http://imc{DEVICE_URL}/{dev_id}"},
+        }
+        for dev_id in range(FIRST_DEV_ID, FIRST_DEV_ID + count)
+    ]
+
+
+class MockImc:
+    '''Mock IMC server running in a background thread.
+
+    Args:
+        devices (int, optional): number of devices in the inventory. Defaults to 9000.
+        port (int, optional): port to listen on (0 picks a free port). Defaults to 0.
+        latency (float, optional): seconds added to every response (simulates a remote IMC). Defaults to 0.
+    '''
+    def __init__(self, devices: int = 9000, port: int = 0, latency: float = 0):
+        self.devices = make_devices(devices)
+        self.by_id = {int(dev["id"]): dev for dev in self.devices}
+        self.latency = latency
+        self.requests: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self) -> "MockImc":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, path: str, size: int) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.bytes_sent += size
+
+    def device_page(self, query: dict) -> dict:
+        start = int(query.get("start", ["0"])[0])
+        size = int(query.get("size", ["1000"])[0])
+        page = self.devices[start:start + size]
+        body = {"device": page[0] if len(page) == 1 else page}  # IMC doesn't use a list for a single device
+        if start + size < len(self.devices):
+            nxt = (f"{self.url}{DEVICE_URL}?resPrivilegeFilter=false&start={start + size}&size={size}"
+                   "&orderBy=id&desc=false&total=false")
+            body["link"] = [{"@op": "GET", "@rel": "self", "@href": "."}, {"@op": "GET", "@rel": "next", "@href": nxt}]
+        else:
+            body["link"] = {"@op": "GET", "@rel": "self", "@href": "."}
+        if query.get("total", ["false"])[0] == "true":
+            body["@total"] = str(len(self.devices))
+        return body
+
+    def config_center(self) -> dict:
+        return {"deviceInfo": [
+            {"deviceId": dev["id"], "deviceName": dev["sysName"], "deviceModel": dev["deviceModel"],
+             "softwareVersion": dev["currentVersion"], "lastBackupTime": "2020-11-16 02:00:00"}
+            for dev in self.devices
+        ]}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if mock.latency:
+                    time.sleep(mock.latency)
+                detail = DEV_DETAIL_RE.match(url.path)
+                if url.path == DEVICE_URL:
+                    body = mock.device_page(parse_qs(url.query))
+                elif detail:
+                    body = mock.by_id.get(int(detail.group(1)))
+                    if body is None:
+                        return self._send(404, b"")
+                elif url.path == ICC_URL:
+                    body = mock.config_center()
+                else:
+                    body = {}
+                self._send(200, json.dumps(body).encode())
+
+            def _send(self, status: int, data: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                mock._count(urlparse(self.path).path, len(data))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock IMC REST API server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--devices", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0, help="seconds added to each response")
+    args = parser.parse_args()
+    mock = MockImc(args.devices, port=args.port, latency=args.latency)
+    print(f"Mock IMC with {args.devices} devices listening on {mock.url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
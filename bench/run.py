@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Repeatable benchmarks for logparser and imcapicli.plat.
+
+A workspace is set up in a temp dir with a generated log, a copy of logparser.py (linked
+to this repo's imcapicli) and a config.yaml pointing at a mock IMC, then each stage is
+run repeat times in a fresh process.  Throughput is from the best run, peak memory is the
+largest peak rss seen for the stage.
+
+    python -m bench.run --sessions 100000 --devices 20000 --repeat 3
+    python -m bench.run --stage sshv1 --stage get_all_devs --json out/bench.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+from tabulate import tabulate
+
+from . import genlog
+from .driver import STAGES
+from .mockimc import MockImc
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+CONFIG = """---
+imc:
+  user: bench
+  pass: bench
+  address: 127.0.0.1
+  port: '{port}'
+  ssl: false
+  workers: {workers}
+  logparse:
+    user: {user}
+    file: {log}
+"""
+
+
+def setup_workspace(workspace: Path, log: Path, port: int, workers: int) -> None:
+    '''Populate workspace so the driver runs logparser against log and the mock IMC.'''
+    for sub in ["logs", "out"]:
+        (workspace / sub).mkdir(exist_ok=True)
+    shutil.copy(REPO_DIR / "logparser.py", workspace / "logparser.py")
+    shutil.copy(Path(__file__).parent / "driver.py", workspace / "bench_driver.py")
+    try:
+        os.symlink(REPO_DIR / "imcapicli", workspace / "imcapicli", target_is_directory=True)
+    except OSError:  # windows without symlink privilege
+        shutil.copytree(REPO_DIR / "imcapicli", workspace / "imcapicli")
+    (workspace / "config.yaml").write_text(
+        CONFIG.format(port=port, workers=workers, user=genlog.PARSE_USER, log=log.resolve())
+    )
+
+
+def run_stage(workspace: Path, stage: str) -> dict:
+    '''Run stage once in a new process and return its result.'''
+    result_file = workspace / "out" / f"{stage}.json"
+    env = {**os.environ, "PAGER": "cat"}
+    proc = subprocess.run([sys.executable, "bench_driver.py", stage, str(result_file)], cwd=workspace, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{stage} failed\n{proc.stderr}")
+    return json.loads(result_file.read_text())
+
+
+def summarize(stage: str, runs: List[dict]) -> dict:
+    elapsed = [r["elapsed"] for r in runs]
+    peaks = [r["peak_mb"] for r in runs if r["peak_mb"] is not None]
+    count, unit = runs[0]["count"], runs[0]["unit"]
+    return {
+        "stage": stage,
+        "count": count,
+        "unit": unit,
+        "runs": len(runs),
+        "best": min(elapsed),
+        "median": statistics.median(elapsed),
+        "rate": count / min(elapsed) if min(elapsed) else None,
+        "peak_mb": max(peaks) if peaks else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark logparser and imcapicli.plat")
+    parser.add_argument("--stage", action="append", choices=list(STAGES), help="stage(s) to run (default: all)")
+    parser.add_argument("--sessions", type=int, default=50000, help="device jobs in the generated log")
+    parser.add_argument("--threads", type=int, default=20, help="concurrent threads in the generated log")
+    parser.add_argument("--devices", type=int, default=9000, help="devices in the mock IMC inventory")
+    parser.add_argument("--workers", type=int, default=4, help="imc.workers used for the inventory collection")
+    parser.add_argument("--latency", type=float, default=0, help="seconds the mock IMC adds to each response")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage")
+    parser.add_argument("--log", type=Path, help="benchmark this log instead of generating one")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the workspace (its path is printed)")
+    args = parser.parse_args()
+
+    workspace = Path(tempfile.mkdtemp(prefix="imc-bench-"))
+    results = []
+    try:
+        log = args.log
+        if log is None:
+            log = workspace / "imcupgdm.log"
+            print(f"Generating log with {args.sessions} sessions...", end="", flush=True)
+            lines = genlog.write_log(log, args.sessions, threads=args.threads, devices=args.devices)
+            print(f"OK {lines} lines ({log.stat().st_size / 1024 / 1024:.1f} MB)")
+
+        with MockImc(args.devices, latency=args.latency) as mock:
+            setup_workspace(workspace, log, mock.port, args.workers)
+            for stage in args.stage or list(STAGES):
+                print(f"Running {stage} x {args.repeat}...", end="", flush=True)
+                runs = [run_stage(workspace, stage) for _ in range(args.repeat)]
+                results.append(summarize(stage, runs))
+                print("OK")
+            requests = sum(mock.requests.values())
+            print(f"Mock IMC served {requests} requests ({mock.bytes_sent / 1024 / 1024:.1f} MB)\n")
+    finally:
+        if args.keep:
+            print(f"workspace: {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    rows = [
+        (r["stage"], f'{r["count"]} {r["unit"]}', f'{r["best"]:.3f}', f'{r["median"]:.3f}',
+         "--" if r["rate"] is None else f'{r["rate"]:,.0f} {r["unit"]}/s', r["peak_mb"] or "--")
+        for r in results
+    ]
+    print(tabulate(rows, headers=["Stage", "Size", "Best (s)", "Median (s)", "Throughput", "Peak RSS (MB)"]))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import atexit
 import logging
 import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any, Union
-import urllib3
 from .config import Config
+from .profiling import profiler
 import sys
 from pathlib import Path
 
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
 
 # class Response():
 #     def __init__(self, ok: bool, output=None, error=None, status_code=None, state=None,  **kwargs):
@@ -24,9 +26,22 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 #         else:
 #             self.json = None
 
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "exception": logging.ERROR,
+    "critical": logging.CRITICAL,
+    "fatal": logging.CRITICAL,
+}
+DEDUPE_WINDOW = 1000  # max distinct messages held for display
+
+
 class MyLogger:
     def __init__(self, log_file: Union[str, Path], debug: bool = False, show: bool = False):
-        self.log_msgs = []
+        self.log_msgs = {}  # messages logged since the last display (dict as an ordered set)
+        self._msgs_lock = threading.Lock()  # plat calls log from AsyncImc worker threads
         self.DEBUG = debug
         self.verbose = False
         if isinstance(log_file, Path):
@@ -44,35 +59,49 @@ class MyLogger:
             raise AttributeError(f"'MyLogger' object has no attribute '{name}'")
 
     def get_logger(self):
-        '''Return custom log object.'''
+        '''Return custom log object.
+
+        Records are queued and written to the log file by a background thread, so callers
+        don't wait on file I/O.
+        '''
         fmtStr = "%(asctime)s [%(process)d][%(levelname)s]: %(message)s"
         dateStr = "%m/%d/%Y %I:%M:%S %p"
-        logging.basicConfig(filename=self.log_file.absolute(),
+        file_handler = logging.FileHandler(self.log_file.absolute())
+        file_handler.setFormatter(logging.Formatter(fmtStr, dateStr))
+        log_queue = queue.SimpleQueue()
+        self._listener = QueueListener(log_queue, file_handler)
+        self._listener.start()
+        atexit.register(self._listener.stop)  # flushes what's still queued
+        # format here only merges args into the message, the file handler applies fmtStr
+        logging.basicConfig(handlers=[QueueHandler(log_queue)],
                             level=logging.DEBUG if self.DEBUG else logging.INFO,
-                            format=fmtStr,
-                            datefmt=dateStr)
+                            format="%(message)s")
         log =  logging.getLogger(self.log_file.stem)
         log.setLevel(logging.DEBUG if self.DEBUG else logging.INFO)  # was returning NOTSET(0) despite above
         return log
 
     def log_print(self, msgs, log: bool = False, show: bool = False, level: str = 'info', *args, **kwargs):
+        # below the logger's level nothing is logged or shown, don't build the messages
+        if not self._log.isEnabledFor(LEVELS.get(level, logging.INFO)):
+            return
+
         msgs = [msgs] if not isinstance(msgs, list) else msgs
-        _msgs = []
-        _logged = []
-        for i in msgs:
-            i = str(i)
-            if log and i not in _logged:
-                getattr(self._log, level)(i, *args, **kwargs)
-                _logged.append(i)
-                if i and i not in self.log_msgs:
-                    _msgs.append(i)
-
-        if show:
-            if logging._nameToLevel.get(level.upper()) >= self.level:
-                self.log_msgs += _msgs
+        _logged = set()
+        with self._msgs_lock:
+            for i in msgs:
+                i = str(i)
+                if log and i not in _logged:
+                    getattr(self._log, level)(i, *args, **kwargs)
+                    _logged.add(i)
+                    if i and i not in self.log_msgs:
+                        if len(self.log_msgs) >= DEDUPE_WINDOW:
+                            del self.log_msgs[next(iter(self.log_msgs))]
+                        self.log_msgs[i] = None
+
+            if show:
                 for m in self.log_msgs:
                     print(m)
-                self.log_msgs = []
+                self.log_msgs.clear()
 
     def show(self, msgs: Union[list, str], log: bool = False, show: bool = True, *args, **kwargs) -> None:
         self.log_print(msgs, show=show, log=log, *args, **kwargs)
@@ -133,7 +162,9 @@ class Response:
     '''
     def __init__(self, function, *args: Any, **kwargs: Any) -> Any:
         self.url = '' if not args else args[0]
-        log.debug(f"request url: {self.url}\nkwargs: {kwargs}")
+        if log.isEnabledFor(logging.DEBUG):
+            _kwargs = {k: v for k, v in kwargs.items() if k != "auth"}  # keep credentials out of the log
+            log.debug(f"request url: {self.url}\nkwargs: {_kwargs}")
         try:
             r = function(*args, **kwargs)
             self.ok = r.ok
@@ -149,6 +180,7 @@ class Response:
             self.error = f"Exception occurred {e.__class__}\n\t{e}"
             self.status_code = 418
         if not self.ok:
+            profiler.count("imc api errors")
             log.error(f"API Call Returned Failure ({self.status_code})\n\toutput: {self.output}\n\terror: {self.error}")
 
     def __bool__(self):
@@ -194,22 +226,56 @@ class Response:
         pass
 
 
-from .plat import device, icc
+_session = None
+
+
+def get_session() -> "ImcSession":
+    '''Return the pooled keep-alive session shared by all imc.device / imc.icc calls.
+
+    Created on first use, so requests/urllib3/pyhpeimc are only imported by commands that call IMC.
+    '''
+    global _session
+    if _session is None:
+        import urllib3
+        from .client import ImcSession
+
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        _session = ImcSession.from_config(config)
+    return _session
+
+
+def __getattr__(name: str) -> Any:
+    # from imcapicli import session (plat modules)
+    if name == "session":
+        return get_session()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
 class Imc:
-    def __init__(self):
-        self.auth = config.imc
-        self.device = device
-        self.icc = icc
+    '''imc.auth, imc.session, imc.device and imc.icc, each loaded on first access.'''
+    @property
+    def auth(self):
+        return config.imc
+
+    @property
+    def session(self):
+        return get_session()
+
+    @property
+    def device(self):
+        from .plat import device
+        return device
+
+    @property
+    def icc(self):
+        from .plat import icc
+        return icc
 
 imc = Imc()
 
-# vscode input field argument handler (vscode sends as one string break into multiple args)
-if os.environ.get("TERM_PROGRAM", "") == "vscode":
-    _ = sys.argv[1:][-1].split(" ")
-    sys.argv = [sys.argv[0], *_]
-    log.debug(f"cli Arguments: {sys.argv}", show=True if config.debug else False)
 
-    # update launch.json default if launched by vscode debugger
+def _update_vscode_launch() -> None:
+    '''Store the cli arguments as the default in .vscode/launch.json for the next debug run.'''
     try:
         launch_file = config.base_dir / ".vscode" / "launch.json"
         launch_file_bak = config.base_dir / ".vscode" / "launch.json.bak"
@@ -237,3 +303,13 @@ if os.environ.get("TERM_PROGRAM", "") == "vscode":
 
     except Exception as e:
         log.exception(f"Exception in vscode arg handler (launch.json update) {e.__class__}.{e}", show=True)
+
+
+# vscode input field argument handler (vscode sends as one string break into multiple args)
+if os.environ.get("TERM_PROGRAM", "") == "vscode":
+    _ = sys.argv[1:][-1].split(" ")
+    sys.argv = [sys.argv[0], *_]
+    log.debug(f"cli Arguments: {sys.argv}", show=True if config.debug else False)
+
+    # update launch.json default if launched by vscode debugger, done on the way out to keep it off startup
+    atexit.register(_update_vscode_launch)
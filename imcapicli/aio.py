@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+asyncio interface to the imcapicli.plat calls.
+
+The plat calls are coroutines (plat.device.*_async, plat.icc.*_async): pagination and the
+per device lookups run as tasks on the event loop and only each HTTP request is handed to
+the loop's executor (requests, on the shared pooled session).  Calls awaited together run
+concurrently, at most `limit` at a time, so independent bulk calls cost roughly the
+slowest call instead of the sum.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, List
+
+from .plat import device, icc
+from .profiling import profiler
+
+
+class AsyncImc:
+    '''Concurrent access to the IMC API.
+
+    Args:
+        auth (requests.auth.AuthBase): IMCAuth.creds
+        url (str): Base url for IMC i.e. 'https://imc.consolepi.org:443'
+        limit (int, optional): Max number of calls in flight at once. Defaults to 4.
+
+    Example:
+        aimc = AsyncImc(config.imc.creds, config.imc.url)
+        devs, icc_data = aimc.run(aimc.get_all_devs(by_id=True), aimc.get_config_center_dict())
+    '''
+    def __init__(self, auth, url: str, limit: int = 4):
+        self.auth = auth
+        self.url = url
+        self.limit = limit
+        self._sem = None
+
+    async def call(self, name: str, call: Awaitable) -> Any:
+        '''Await call (a plat coroutine) once one of the limit slots is free, its time is added to profiler stage imc name.'''
+        if self._sem is None:
+            # created here so it belongs to the running loop
+            self._sem = asyncio.Semaphore(self.limit)
+        async with self._sem:
+            # profiler.stage() times by thread, these calls all run on the loop's thread
+            start = time.perf_counter()
+            try:
+                return await call
+            finally:
+                if profiler.enabled:
+                    profiler.add_time(f"imc {name}", time.perf_counter() - start)
+
+    async def get_all_devs(self, **kwargs: Any) -> Any:
+        '''plat.device.get_all_devs_async, kwargs are passed through.'''
+        return await self.call("get_all_devs", device.get_all_devs_async(self.auth, self.url, **kwargs))
+
+    async def get_devs_by_id(self, dev_ids: list, **kwargs: Any) -> Any:
+        '''plat.device.get_devs_by_id_async, kwargs are passed through.'''
+        return await self.call("get_devs_by_id", device.get_devs_by_id_async(self.auth, self.url, dev_ids, **kwargs))
+
+    async def get_config_center_dict(self, **kwargs: Any) -> Any:
+        '''plat.icc.get_config_center_dict_async, kwargs are passed through.'''
+        return await self.call("get_config_center_dict", icc.get_config_center_dict_async(self.auth, self.url, **kwargs))
+
+    def run(self, *calls: Awaitable) -> List[Any]:
+        '''Run calls concurrently in a new event loop and return their results in the order provided.'''
+        async def _gather():
+            return await asyncio.gather(*calls)
+
+        self._sem = None
+        return asyncio.run(_gather())
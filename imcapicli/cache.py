@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Local sqlite cache of data collected from IMC (device inventory, Config Center).
+
+Each device row carries the time it was collected, so staleness is tracked per device
+as well as for the last full collection of a source.
+"""
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+DEVICE = "device"  # plat.device.get_all_devs
+ICC = "icc"        # icc.get_config_center_dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    source TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (source, id)
+);
+CREATE TABLE IF NOT EXISTS collections (
+    source TEXT PRIMARY KEY,
+    updated REAL NOT NULL
+);
+"""
+
+
+class ImcCache:
+    '''Cache of per device data keyed by source and IMC device id.
+
+    Args:
+        db_file (Path): sqlite database file, created if it doesn't exist.
+        ttl (int, optional): seconds data is considered fresh. Defaults to 3600.
+    '''
+    def __init__(self, db_file: Union[str, Path], ttl: int = 3600):
+        self.db_file = Path(db_file)
+        self.ttl = ttl
+        self.db = sqlite3.connect(str(self.db_file))
+        self.db.executescript(SCHEMA)
+
+    def __repr__(self):
+        return f"<{self.__module__}.{type(self).__name__} {self.db_file} ttl: {self.ttl}>"
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ImcCache":
+        '''Return ImcCache for out/imc_cache.db with ttl from imc.cache_ttl in config.yaml.'''
+        cfg = config.get("imc") or {}
+        return cls(config.base_dir / "out" / "imc_cache.db", ttl=cfg.get("cache_ttl", 3600))
+
+    def close(self) -> None:
+        self.db.close()
+
+    @property
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl
+
+    def collected(self, source: str) -> Optional[float]:
+        '''Return the time of the last full collection of source.'''
+        row = self.db.execute("SELECT updated FROM collections WHERE source = ?", (source,)).fetchone()
+        return None if row is None else row[0]
+
+    def get(self, source: str) -> Optional[Dict[int, dict]]:
+        '''Return {dev_id: data} for every device in source if the last full collection is within ttl.'''
+        updated = self.collected(source)
+        if updated is None or updated < self._cutoff:
+            return None
+        rows = self.db.execute("SELECT id, data FROM devices WHERE source = ?", (source,))
+        return {dev_id: json.loads(data) for dev_id, data in rows}
+
+    def get_devs(self, source: str, dev_ids: Iterable[int]) -> Dict[int, dict]:
+        '''Return {dev_id: data} for the dev_ids that are cached and fresh (missing and stale ids are left out).'''
+        dev_ids = list(dev_ids)
+        found = {}
+        for pos in range(0, len(dev_ids), 500):  # stay under sqlite's max host parameters
+            chunk = dev_ids[pos:pos + 500]
+            rows = self.db.execute(
+                f"SELECT id, data FROM devices WHERE source = ? AND updated >= ? AND id IN ({','.join('?' * len(chunk))})",
+                (source, self._cutoff, *chunk),
+            )
+            found.update({dev_id: json.loads(data) for dev_id, data in rows})
+        return found
+
+    def stale(self, source: str, dev_ids: Iterable[int]) -> List[int]:
+        '''Return the dev_ids that are not cached or are older than ttl.'''
+        dev_ids = list(dev_ids)
+        fresh = self.get_devs(source, dev_ids)
+        return [dev_id for dev_id in dev_ids if dev_id not in fresh]
+
+    def put(self, source: str, data: Dict[int, dict]) -> None:
+        '''Replace everything cached for source with a full collection.'''
+        now = time.time()
+        with self.db:
+            self.db.execute("DELETE FROM devices WHERE source = ?", (source,))
+            self.db.executemany("INSERT INTO devices VALUES (?, ?, ?, ?)",
+                                ((source, int(dev_id), json.dumps(v), now) for dev_id, v in data.items()))
+            self.db.execute("INSERT OR REPLACE INTO collections VALUES (?, ?)", (source, now))
+
+    def update(self, source: str, data: Dict[int, dict]) -> None:
+        '''Add/refresh individual devices without touching the rest of source.'''
+        now = time.time()
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?)",
+                                ((source, int(dev_id), json.dumps(v), now) for dev_id, v in data.items()))
+
+    def clear(self, source: str = None) -> None:
+        with self.db:
+            if source is None:
+                self.db.execute("DELETE FROM devices")
+                self.db.execute("DELETE FROM collections")
+            else:
+                self.db.execute("DELETE FROM devices WHERE source = ?", (source,))
+                self.db.execute("DELETE FROM collections WHERE source = ?", (source,))
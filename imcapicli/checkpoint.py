@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Byte offset checkpoints so a log that is still being written can be parsed incrementally.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Union
+
+HEAD_SIZE = 4096  # max bytes hashed to detect the log being replaced/rotated
+
+
+class Checkpoint:
+    '''Parser state saved with the byte offset it is valid up to.
+
+    The checkpoint is discarded if it was saved for a different log, or if the log has
+    been truncated or replaced (size below the saved offset or first bytes changed).
+
+    Args:
+        file (Path): The checkpoint file (json).
+        log_path (Path): The log file the checkpoint tracks.
+    '''
+    def __init__(self, file: Union[str, Path], log_path: Union[str, Path]):
+        self.file = Path(file)
+        self.log_path = Path(log_path).resolve()
+        self.offset = 0
+        self.state = {}
+
+    def __bool__(self):
+        return self.offset > 0
+
+    def _head(self, offset: int) -> str:
+        with self.log_path.open("rb") as f:
+            return hashlib.sha1(f.read(min(offset, HEAD_SIZE))).hexdigest()
+
+    def load(self) -> "Checkpoint":
+        '''Load offset and state from file, both are reset if the checkpoint doesn't apply to the log.'''
+        self.offset, self.state = 0, {}
+        if not self.file.is_file():
+            return self
+        try:
+            data = json.loads(self.file.read_text())
+        except ValueError:
+            return self
+
+        offset = data.get("offset", 0)
+        if data.get("log") != str(self.log_path) or offset > self.log_path.stat().st_size:
+            return self
+        if data.get("head") != self._head(offset):
+            return self
+
+        self.offset, self.state = data["offset"], data.get("state", {})
+        return self
+
+    def save(self, offset: int, state: dict) -> None:
+        self.offset, self.state = offset, state
+        data = {"log": str(self.log_path), "head": self._head(offset), "offset": offset, "state": state}
+        self.file.write_text(json.dumps(data))
+
+    def clear(self) -> None:
+        self.offset, self.state = 0, {}
+        if self.file.is_file():
+            self.file.unlink()
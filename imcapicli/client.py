@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Shared HTTP session for all calls to the IMC API.
+
+Connections are pooled and kept alive, so calls after the first skip the TCP/TLS
+handshake, and the digest auth nonce is reused instead of renegotiated per call.
+requests is blocking, the async plat calls await each request in the event loop's
+default executor (in_executor) so the session, its digest auth and retries are shared.
+"""
+
+import asyncio
+from functools import partial
+from typing import Any, Callable
+
+import requests
+from pyhpeimc.auth import HEADERS
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .profiling import profiler
+
+RETRY_STATUS = (500, 502, 503, 504)
+
+
+class ImcSession(requests.Session):
+    '''requests.Session with a connection pool sized for concurrent calls and retry/backoff.
+
+    Args:
+        auth (requests.auth.AuthBase, optional): auth used for every request (IMCAuth.creds). Defaults to None.
+        pool_size (int, optional): connections kept open per host. Defaults to 10.
+        retries (int, optional): retries for connection errors, resets and 5xx responses. Defaults to 3.
+        backoff (float, optional): backoff factor between retries (0.5 -> 0.5s, 1s, 2s...). Defaults to 0.5.
+        verify (bool, optional): verify the IMC server certificate. Defaults to False.
+    '''
+    def __init__(self, auth: requests.auth.AuthBase = None, pool_size: int = 10, retries: int = 3,
+                 backoff: float = 0.5, verify: bool = False):
+        super().__init__()
+        self.auth = auth
+        self.verify = verify
+        self.headers.update(HEADERS)
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                      status_forcelist=RETRY_STATUS, allowed_methods=frozenset(["GET"]), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> requests.Response:
+        with profiler.stage("imc http requests"):
+            response = super().request(method, url, *args, **kwargs)
+        if profiler.enabled:
+            profiler.count("imc requests")
+            profiler.count("imc bytes received", len(response.content))
+        return response
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ImcSession":
+        '''Return ImcSession using auth and pool/retry settings from imcapicli Config.'''
+        cfg = config.get("imc") or {}
+        # pool needs to be at least as large as the number of concurrent requests or connections get discarded
+        pool_size = max(cfg.get("pool_size", 10), cfg.get("workers", 4))
+        return cls(
+            auth=None if not config.imc else config.imc.creds,
+            pool_size=pool_size,
+            retries=cfg.get("retries", 3),
+            backoff=cfg.get("backoff", 0.5),
+        )
+
+
+async def in_executor(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    '''Await blocking func(*args, **kwargs) (a request on the session) in the running loop's default executor.'''
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args, **kwargs))
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Compressed (archived) imcupgdm logs.
+
+gzip, xz and zstd logs are detected by their magic bytes and decompressed as a stream,
+a chunk at a time, straight into the parsers (LogFile greps each chunk as it comes), so
+only a chunk (or a window of blocks) of the plaintext is in memory and nothing is written
+to disk.  Only the random access LogFile can't do on a stream (i.e. seek_time() for
+--since/--until, context lines, the sidecar index) uses read(), which decompresses the
+log to an anonymous (already unlinked) temp file in TMPDIR and maps it.
+
+When the format records where each independently compressed block ends the blocks are
+decompressed in parallel threads (zlib and zstandard release the GIL):
+    - gzip written as BGZF (bgzip), each member has its compressed size in the header
+    - zstd with more than one frame (pzstd, or logs compressed in parts and concatenated)
+Any other gzip, xz and single frame zstd is decompressed as a single stream.  zstd needs
+the zstandard package.
+"""
+
+import gzip
+import lzma
+import mmap
+import struct
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+from .profiling import profiler
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK = 4 * 1024 * 1024
+GROUP_SIZE = 1024 * 1024  # compressed bytes per task, BGZF blocks are at most 64KB
+MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+ZSTD_MAGIC = 0xFD2FB528
+ZSTD_SKIPPABLE = range(0x184D2A50, 0x184D2A60)
+# raised for corrupt or truncated input
+DECODE_ERRORS = (ValueError, EOFError, gzip.BadGzipFile, zlib.error, lzma.LZMAError, struct.error, IndexError,
+                 *([zstandard.ZstdError] if zstandard is not None else []))
+
+
+def detect(path: Union[str, Path]) -> Optional[str]:
+    '''Return the compression used for path ("gzip", "xz" or "zstd"), None if it isn't compressed.'''
+    with Path(path).open("rb") as f:
+        head = f.read(6)
+    if len(head) >= 4 and struct.unpack_from("<I", head)[0] in ZSTD_SKIPPABLE:
+        return "zstd"
+    return next((fmt for magic, fmt in MAGIC.items() if head.startswith(magic)), None)
+
+
+def _bgzf_blocks(data: mmap.mmap) -> Optional[List[Tuple[int, int]]]:
+    '''Return (start, end) of each gzip member, None unless every member is a BGZF block.'''
+    blocks, pos = [], 0
+    try:
+        while pos < len(data):
+            # magic, deflate, FEXTRA set ... XLEN then subfields, BC holds the member size - 1
+            if data[pos:pos + 4] != b"\x1f\x8b\x08\x04":
+                return None
+            xlen = struct.unpack_from("<H", data, pos + 10)[0]
+            extra, bsize = pos + 12, None
+            while extra < pos + 12 + xlen:
+                slen = struct.unpack_from("<H", data, extra + 2)[0]
+                if data[extra:extra + 2] == b"BC" and slen == 2:
+                    bsize = struct.unpack_from("<H", data, extra + 4)[0]
+                extra += 4 + slen
+            if bsize is None:
+                return None
+            blocks.append((pos, pos + bsize + 1))
+            pos += bsize + 1
+    except struct.error:  # truncated
+        return None
+    return blocks
+
+
+def _zstd_frames(data: mmap.mmap) -> List[Tuple[int, int]]:
+    '''Return (start, end) of each zstd frame, found from the frame and block headers (skippable frames are left out).'''
+    frames, pos = [], 0
+    while pos < len(data):
+        magic = struct.unpack_from("<I", data, pos)[0]
+        if magic in ZSTD_SKIPPABLE:
+            pos += 8 + struct.unpack_from("<I", data, pos + 4)[0]
+            continue
+        if magic != ZSTD_MAGIC:
+            raise ValueError(f"no zstd frame at byte {pos}")
+        descriptor = data[pos + 4]
+        single_segment = descriptor >> 5 & 1
+        # descriptor, window descriptor (unless single segment), dictionary id, content size
+        end = (pos + 5 + (not single_segment) + (0, 1, 2, 4)[descriptor & 3]
+               + (single_segment, 2, 4, 8)[descriptor >> 6])
+        last = False
+        while not last:
+            if end + 3 > len(data):
+                raise ValueError(f"truncated zstd frame at byte {pos}")
+            header = int.from_bytes(data[end:end + 3], "little")
+            last, block_type, size = header & 1, header >> 1 & 3, header >> 3
+            end += 3 + (1 if block_type == 1 else size)  # RLE blocks hold a single byte
+        end += 4 if descriptor >> 2 & 1 else 0  # content checksum
+        if end > len(data):
+            raise ValueError(f"truncated zstd frame at byte {pos}")
+        frames.append((pos, end))
+        pos = end
+    return frames
+
+
+def _gunzip_blocks(data: bytes) -> bytes:
+    '''Decompress one or more complete gzip members.'''
+    out = []
+    while data:
+        d = zlib.decompressobj(wbits=31)
+        out.append(d.decompress(data))
+        data = d.unused_data
+    return b"".join(out)
+
+
+def _unzstd(data: bytes) -> bytes:
+    '''Decompress one or more complete zstd frames.'''
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data) if len(data) else b""
+
+
+def _group(blocks: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    '''Merge adjacent blocks into ranges of about GROUP_SIZE so each task is worth handing to a thread.'''
+    groups = []
+    for start, end in blocks:
+        if groups and end - groups[-1][0] <= GROUP_SIZE:
+            groups[-1] = (groups[-1][0], end)
+        else:
+            groups.append((start, end))
+    return groups
+
+
+def _parallel(func: Callable[[bytes], bytes], data: mmap.mmap, blocks: List[Tuple[int, int]],
+              jobs: int) -> Iterator[bytes]:
+    '''Yield the blocks decompressed with func in jobs threads in order, a window of jobs * 2 blocks is in flight at a time.'''
+    groups = _group(blocks) if func is _gunzip_blocks else blocks
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        try:
+            for start, end in groups:
+                if len(pending) >= jobs * 2:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, data[start:end]))
+            while pending:
+                yield pending.popleft().result()
+        finally:  # consumer stopped early
+            for future in pending:
+                future.cancel()
+
+
+def _stream(path: Path, fmt: str) -> Iterator[bytes]:
+    '''Yield path decompressed a CHUNK at a time.'''
+    with path.open("rb") as fh:
+        if fmt == "zstd":
+            f = zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True)
+        else:
+            f = gzip.open(fh, "rb") if fmt == "gzip" else lzma.open(fh, "rb")
+        with f:
+            yield from iter(partial(f.read, CHUNK), b"")
+
+
+def check(path: Union[str, Path]) -> str:
+    '''Return the compression used for path (see detect), raising if it can't be decompressed here.
+
+    Raises:
+        ImportError: the log is zstd compressed and zstandard isn't installed.
+        ValueError: the log isn't compressed.
+    '''
+    fmt = detect(path)
+    if fmt is None:
+        raise ValueError(f"{path} is not gzip, xz or zstd compressed")
+    if fmt == "zstd" and zstandard is None:
+        raise ImportError(f"{path} is zstd compressed, zstandard is required (pip install zstandard)")
+    return fmt
+
+
+def stream(path: Union[str, Path], jobs: int = 1) -> Iterator[bytes]:
+    '''Yield the decompressed contents of the compressed log at path a chunk at a time (not on line boundaries).
+
+    Args:
+        path (Path): gzip, xz or zstd compressed log.
+        jobs (int, optional): threads used when the blocks can be decompressed independently. Defaults to 1.
+
+    Raises:
+        ImportError: the log is zstd compressed and zstandard isn't installed.
+        ValueError: the log isn't compressed or is corrupt/truncated.
+    '''
+    path = Path(path)
+    fmt = check(path)
+    jobs, size = jobs or 1, 0
+    try:
+        with path.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if fmt == "zstd":
+                frames = _zstd_frames(data)  # also catches truncation, which the stream reader doesn't report
+                blocks = frames if jobs > 1 and len(frames) > 1 else None
+                func = _unzstd
+            else:
+                blocks = _bgzf_blocks(data) if fmt == "gzip" and jobs > 1 else None
+                func = _gunzip_blocks
+            for chunk in _parallel(func, data, blocks, jobs) if blocks else _stream(path, fmt):
+                size += len(chunk)
+                yield chunk
+    except DECODE_ERRORS as e:
+        raise ValueError(f"{path} is not a valid {fmt} file: {e}") from e
+    finally:
+        profiler.count("log bytes decompressed", size)
+
+
+def read(path: Union[str, Path], jobs: int = 1) -> Union[mmap.mmap, bytes]:
+    '''Return the decompressed contents of the compressed log at path, mapped from an anonymous temp file.
+
+    Only for random access, a log parsed in one pass is stream()ed.  The caller closes the mapping,
+    the temp file is gone once it's closed.  An empty log is returned as b"".  Args and Raises are
+    the same as stream().
+    '''
+    path = Path(path)
+    with profiler.stage("decompress log"), tempfile.TemporaryFile(prefix=f"{path.name}.") as out:
+        for chunk in stream(path, jobs=jobs):
+            out.write(chunk)
+        size = out.tell()
+        out.flush()
+        # the mapping keeps its own handle on the file, so it outlives out
+        return mmap.mmap(out.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
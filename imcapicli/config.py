@@ -2,12 +2,15 @@
 #
 # Author: Wade Wells github/Pack3tL0ss
 
+from functools import cached_property
 from pathlib import Path
-from typing import Any
-from pyhpeimc.auth import IMCAuth
+from typing import TYPE_CHECKING, Any
 import yaml
 import os
 
+if TYPE_CHECKING:
+    from pyhpeimc.auth import IMCAuth
+
 REQUIRED_CONFIG = ["user", "pass", "address"]
 
 
@@ -17,7 +20,11 @@ class Config:
         self.yaml_config = self.base_dir.joinpath('config.yaml')
         self.config = self.get_yaml_file(self.yaml_config) or {}
         self.debug = self.config.get("debug", os.getenv("DEBUG", False))
-        self.imc = self.get_imc_auth()
+
+    @cached_property
+    def imc(self) -> "IMCAuth":
+        '''IMCAuth built on first use, commands that only parse logs never import pyhpeimc.'''
+        return self.get_imc_auth()
 
     def __bool__(self):
         return len(self.config) > 0
@@ -38,7 +45,7 @@ class Config:
                 except ValueError as e:
                     print(f'Unable to load configuration from {yaml_config}\n\t{e}')
 
-    def get_imc_auth(self) -> IMCAuth:
+    def get_imc_auth(self) -> "IMCAuth":
         '''Return IMCAuth object using Configuration from config file
 
         Returns:
@@ -78,5 +85,6 @@ class Config:
             # def __init__(self, h_url, server, port, username, password):
                 proto_str = f"{proto_str}://"
                 address = config["address"].replace(f"{proto_str}://", "")
+                from pyhpeimc.auth import IMCAuth
                 return IMCAuth(proto_str, address, port, config["user"], config["pass"])
 
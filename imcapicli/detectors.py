@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Error detectors for imcupgdm logs (logparser errors).
+
+Each error signature is a small Detector: the marker(s) it needs lines for, a trigger that
+starts a capture and the capture state that follows until the device the error is for is
+known.  ErrorScanner greps the log once for the markers of every detector, feeds each
+matching line to the detectors and fills in the dev id / ip the detector didn't find
+from the "dev id: ..., ip: ..." lines, so adding a signature doesn't add a pass over
+the log.
+
+New signatures are added by subclassing Detector and decorating it with @register.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+from .linematch import LineMatcher
+from .logsource import Line, LogFile
+
+ID_MAP_MATCH = "dev id:"
+IP_MAP_MATCH = "ip:"
+DEV_ID_MATCH = "iDevID"
+THREAD_MATCH = "THREAD"
+FINISHED_MATCH = "Finished, result:"
+
+
+class Hit(NamedTuple):
+    detector: str
+    ts: str                  # timestamp of the trigger line
+    thread: str              # thread of the trigger line
+    dev_id: Optional[int]
+    dev_ip: Optional[str]
+    offset: int              # byte offset of the trigger line
+    detail: Optional[str] = None
+
+
+class Detector(ABC):
+    '''One error signature, instances hold the capture state for one pass over a log.
+
+    Attributes:
+        name (str): name the detector is registered as.
+        help (str): one line description.
+        markers (Tuple[str]): every marker the detector needs lines for, the scanner only
+            decodes lines with one of them.
+        triggered (int): number of times the trigger was seen.
+    '''
+    name = ""
+    help = ""
+    markers: Tuple[str, ...] = ()
+
+    def __init__(self, **options):
+        self.triggered = 0
+
+    @abstractmethod
+    def feed(self, line: Line, log_file: LogFile) -> Optional[Hit]:
+        '''Return a Hit if line completes an error, line is any line with one of the scanner's markers.'''
+
+
+class CaptureDetector(Detector):
+    '''An error logged on a THREAD line with the device id on the next iDevID line.
+
+    A trigger while capturing is counted but the capture continues (the next iDevID line
+    is for both), the same as the sshv1 parse always did.
+    '''
+    trigger = ""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.capture: Optional[Tuple[str, str, int]] = None  # ts, thread, offset of the trigger line
+        self.markers = (self.trigger, DEV_ID_MATCH, *self.markers)
+
+    def on_trigger(self, line: Line) -> None:
+        self.triggered += 1
+        self.capture = (LineMatcher.timestamp(line.text), LineMatcher.thread(line.text), line.offset)
+
+    def on_line(self, line: Line) -> None:
+        '''Called for the other lines while capturing.'''
+
+    def detail(self) -> Optional[str]:
+        return None
+
+    def feed(self, line: Line, log_file: LogFile) -> Optional[Hit]:
+        text = line.text
+        if THREAD_MATCH in text and self.trigger in text:
+            self.on_trigger(line)
+        elif self.capture is not None:
+            self.on_line(line)
+            if DEV_ID_MATCH in text:
+                ts, thread, offset = self.capture
+                dev_id = int.from_bytes(bytes.fromhex(text.strip().split("'")[1]), "big")
+                hit = Hit(self.name, ts, thread, dev_id, None, offset, self.detail())
+                self.capture = None
+                return hit
+
+
+DETECTORS: Dict[str, Type[Detector]] = {}
+
+
+def register(cls: Type[Detector]) -> Type[Detector]:
+    '''Class decorator adding a Detector to DETECTORS (errors runs every registered detector by default).'''
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+@register
+class SshV1(CaptureDetector):
+    name = "sshv1"
+    help = "device only supports SSHv1"
+    trigger = "version 2 required by our configuration"
+
+
+@register
+class CliFailed(CaptureDetector):
+    name = "cli_failed"
+    help = "command failed to execute by cli, detail is the last InputParam line"
+    trigger = "Failed to execute by cli method"
+    markers = ("InputParam ",)
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.input_params = ""
+
+    def on_line(self, line: Line) -> None:
+        if "InputParam " in line.text:
+            self.input_params = line.text.strip()
+
+    def detail(self) -> Optional[str]:
+        detail, self.input_params = self.input_params or None, ""
+        return detail
+
+
+@register
+class NotAuthorized(Detector):
+    '''"Not authorized to run this command" in the device (cli) output.
+
+    The output follows a "Finished, result:" line up to the next [THREAD line, the device ip is
+    from the last "<user>@" (prompt) line in it.  Only the two markers are grepped for, the end
+    of the output and the prompt are found in the raw bytes when the error is.
+
+    Args:
+        user (str): user IMC logs into the devices with (imc.logparse.user), without it the
+            dev ip isn't known.
+    '''
+    name = "not_authorized"
+    help = "command authorization failure in the device output"
+    error = "Not authorized to run this command"
+    markers = (FINISHED_MATCH, error)
+
+    def __init__(self, user: str = None, **options):
+        super().__init__(**options)
+        self.prompt = None if not user else f"{user}@".encode()
+        self.output: Optional[Line] = None  # the Finished line the output being read follows
+
+    def feed(self, line: Line, log_file: LogFile) -> Optional[Hit]:
+        text = line.text
+        if "[THREAD" in text:
+            self.output = line if FINISHED_MATCH in text else None
+            return None
+        if self.output is None or self.error not in text:
+            return None
+
+        finished, self.output = self.output, None  # one hit per block of output
+        start = log_file.line_end(finished.offset)
+        if log_file.find(b"[THREAD", start, line.offset) >= 0:
+            return None
+        self.triggered += 1
+        dev_ip = None
+        if self.prompt is not None:
+            end = log_file.find(b"[THREAD", line.offset)
+            end = log_file.end if end < 0 else log_file.line_end(end)
+            pos = log_file.rfind(self.prompt, start, end)
+            if pos >= 0:
+                pos = log_file.line_start(pos)
+                dev_ip = log_file.text(pos, log_file.line_end(pos)).split("@")[1].split("'")[0]
+        return Hit(self.name, LineMatcher.timestamp(finished.text), LineMatcher.thread(finished.text), None, dev_ip,
+                   finished.offset)
+
+
+class ErrorScanner:
+    '''Runs detectors over a log in one pass.
+
+    Args:
+        detectors (Iterable[Detector]): detector instances, each keeps its own capture state.
+        id_map (Dict[int, str], optional): {dev id: ip} carried over from earlier logs/passes.
+    '''
+    def __init__(self, detectors: Iterable[Detector], id_map: Dict[int, str] = None):
+        self.detectors = list(detectors)
+        self.id_map = {} if id_map is None else id_map
+        self.ip_map = {ip: dev_id for dev_id, ip in self.id_map.items()}
+        markers = dict.fromkeys([ID_MAP_MATCH, *[m for d in self.detectors for m in d.markers]])
+        self.markers = tuple(m.encode() for m in markers)
+
+    def _map_ip(self, text: str) -> None:
+        # same as split(...)[-1] / split(...)[0] without building the lists, this runs for every "dev id:" line
+        _ip = text.rpartition("ip: ")[2].partition(" ")[0].strip().rstrip(".")
+        dev_id = int(text.rpartition("dev id: ")[2].partition(",")[0])
+        self.id_map[dev_id] = _ip
+        self.ip_map[_ip] = dev_id
+
+    def scan(self, log_file: LogFile, start: int = None, end: int = None) -> Iterator[Hit]:
+        '''Yield a Hit for each error found by any of the detectors, in log order.
+
+        The dev ip for a hit with only the dev id is from the last "dev id:" line for the device
+        seen so far, the dev id for a hit with only the dev ip from the last one for the ip.
+        '''
+        detectors, id_map = self.detectors, self.id_map
+        for line in log_file.grep(*self.markers, start=start, end=end, count=False):
+            text = line.text
+            if ID_MAP_MATCH in text and IP_MAP_MATCH in text:
+                self._map_ip(text)
+            for detector in detectors:
+                hit = detector.feed(line, log_file)
+                if hit is None:
+                    continue
+                name, ts, thread, dev_id, dev_ip, offset, detail = hit
+                if dev_ip is None and dev_id is not None:
+                    hit = Hit(name, ts, thread, dev_id, id_map.get(dev_id), offset, detail)
+                elif dev_id is None and dev_ip is not None:
+                    hit = Hit(name, ts, thread, self.ip_map.get(dev_ip), dev_ip, offset, detail)
+                yield hit
+
+
+def create(names: Iterable[str] = None, **options) -> List[Detector]:
+    '''Return an instance of each detector in names (all registered detectors by default).
+
+    Raises:
+        ValueError: a name isn't a registered detector.
+    '''
+    names = list(names or DETECTORS)
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"unknown detector {', '.join(unknown)}, valid: {', '.join(DETECTORS)}")
+    return [DETECTORS[name](**options) for name in names]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Column oriented store for per device data collected from IMC (inventory, Config Center).
+
+Values are held in one list per field with a dev id -> row index, so joining sources and
+projecting a few fields for output doesn't build (or copy) a dict per device.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+
+class DevStore:
+    '''Per device data keyed by IMC device id.
+
+    A field a device has no value for is None in that field's column.
+
+    Args:
+        ids (Iterable[int], optional): device ids, one row each. Defaults to ().
+        columns (Dict[str, list], optional): field -> values in row order. Defaults to None.
+    '''
+    __slots__ = ("ids", "columns", "_index")
+
+    def __init__(self, ids: Iterable[int] = (), columns: Dict[str, list] = None):
+        self.ids = array("q", (int(dev_id) for dev_id in ids))
+        self.columns = {} if columns is None else columns
+        self._index = {dev_id: row for row, dev_id in enumerate(self.ids)}
+
+    def __repr__(self):
+        return f"<{self.__module__}.{type(self).__name__} devices: {len(self)} fields: {len(self.columns)}>"
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, dev_id: int):
+        return dev_id in self._index
+
+    @classmethod
+    def from_dict(cls, data: Dict[int, dict], fields: Sequence[str] = None) -> "DevStore":
+        '''Return DevStore from {dev_id: {field: value}} (as returned by get_all_devs(by_id=True)).
+
+        Columns are ordered by first appearance, only fields are kept if provided.
+        '''
+        store = cls(data.keys())
+        fields = None if fields is None else frozenset(fields)
+        columns, size = store.columns, len(store)
+        for row, dev in enumerate(data.values()):
+            for k, v in dev.items():
+                if fields is not None and k not in fields:
+                    continue
+                col = columns.get(k)
+                if col is None:
+                    col = columns[k] = [None] * size
+                col[row] = v
+        return store
+
+    def column(self, field: str, default: Any = None) -> list:
+        col = self.columns.get(field)
+        if col is None:
+            return [default] * len(self)
+        return col if default is None else [default if v is None else v for v in col]
+
+    def get(self, dev_id: int, field: str, default: Any = None) -> Any:
+        row, col = self._index.get(dev_id), self.columns.get(field)
+        if row is None or col is None or col[row] is None:
+            return default
+        return col[row]
+
+    def where(self, field: str, value: Any) -> List[int]:
+        '''Return ids of the devices with field == value.'''
+        return [dev_id for dev_id, v in zip(self.ids, self.column(field)) if v == value]
+
+    def join(self, other: "DevStore", ids: Iterable[int] = None) -> "DevStore":
+        '''Return a new store with a row for each of ids (defaults to every device in this store).
+
+        The result has the columns of both stores, where both have a value for a device the value
+        from other wins (the same as {**self_row, **other_row}).  Ids in neither store get an empty
+        row, duplicate ids get one row.
+        '''
+        store = DevStore(self.ids if ids is None else dict.fromkeys(int(dev_id) for dev_id in ids))
+        size = len(store)
+        rows = [self._index.get(dev_id) for dev_id in store.ids]
+        other_rows = [other._index.get(dev_id) for dev_id in store.ids]
+        for field in dict.fromkeys([*self.columns, *other.columns]):
+            src = self.columns.get(field)
+            col = [None] * size if src is None else [None if row is None else src[row] for row in rows]
+            src = other.columns.get(field)
+            if src is not None:
+                col = [v if row is None or src[row] is None else src[row] for v, row in zip(col, other_rows)]
+            store.columns[field] = col
+        return store
+
+    def rows(self, *fields: str, default: Any = None) -> Iterator[tuple]:
+        '''Yield a tuple of the values of fields for each device in row order.'''
+        return zip(*(self.column(field, default=default) for field in fields))
+
+    def group_by(self, *fields: str, default: Any = None) -> Dict[tuple, List[int]]:
+        '''Return {(values of fields): [dev ids]} in order of first appearance.'''
+        groups = {}
+        for dev_id, key in zip(self.ids, self.rows(*fields, default=default)):
+            groups.setdefault(key, []).append(dev_id)
+        return groups
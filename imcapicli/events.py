@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Local sqlite store of the events parsed from imcupgdm logs (logparser query).
+
+A log is parsed once into normalized events (timestamp, thread, dev id, dev ip, event type,
+byte offset of the line) and the store is indexed on type/time and device, so filtered and
+aggregated questions are answered without rescanning the log.  A log is reloaded when its
+size or mtime changes.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .detectors import Detector, Hit
+from .linematch import LineAttrs, LineMatcher
+from .logsource import Line, LogFile
+
+BATCH_SIZE = 10000
+NOT_AUTHZ_MATCH = "Not authorized to run this command"
+# event type: marker, checked in order on THREAD lines, the first found is the line's event
+TAGGED_EVENTS = {
+    "start": "CExecuter::CExecuter()",
+    "login": "Begin to login device",
+    "sshv1": "version 2 required by our configuration",
+    "cli_failed": "Failed to execute by cli method",
+    "finished": "Finished, result:",
+}
+EVENT_TYPES = [*TAGGED_EVENTS, "not_authorized"]  # not_authorized is found in the device (cli) output
+
+# query fields, any other field is looked up in the cached IMC inventory (i.e. deviceModel)
+FIELDS = {
+    "ts": "e.ts",
+    "day": "substr(e.ts, 1, 10)",
+    "hour": "substr(e.ts, 1, 13)",
+    "type": "e.type",
+    "thread": "e.thread",
+    "dev_id": "e.dev_id",
+    "dev_ip": "e.dev_ip",
+    "detail": "e.detail",
+    "log": "l.path",
+    "offset": "e.offset",
+}
+ROW_FIELDS = ["ts", "type", "thread", "dev_id", "dev_ip", "detail", "log", "offset"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    loaded REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    log INTEGER NOT NULL,
+    ts TEXT,
+    thread TEXT,
+    dev_id INTEGER,
+    dev_ip TEXT,
+    type TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    detail TEXT
+);
+"""
+# kept to what query filters on, every index adds to the time it takes to load a log
+INDEXES = {
+    "events_type_ts": "events (type, ts)",
+    "events_dev_ts": "events (dev_id, ts)",
+    "events_ts": "events (ts)",
+}
+
+Event = Tuple[str, str, Optional[int], Optional[str], str, int, Optional[str]]  # ts, thread, dev_id, dev_ip, type, offset, detail
+
+
+class EventParser:
+    '''Turns a log into events, keeping the device each thread is working on.
+
+    Only lines with an event or a dev id are decoded.  Lines without a THREAD tag are device
+    (cli) output, which belongs to the session whose "Finished, result:" line came before it
+    as long as no [THREAD line was logged in between.
+
+    Args:
+        matcher (LineMatcher): extracts dev id / ip.
+    '''
+    def __init__(self, matcher: LineMatcher):
+        self.matcher = matcher
+        self.markers = (*TAGGED_EVENTS.values(), *matcher.id_match, NOT_AUTHZ_MATCH)
+        self.devs: Dict[str, Tuple[Optional[int], Optional[str]]] = {}  # thread: (dev id, dev ip)
+        self._output = None  # (ts, thread, dev id, dev ip) of the session the device output belongs to
+        self._output_start = None  # offset the device output starts at
+        self.lines = 0
+
+    def parse(self, log_file: LogFile, start: int = None, end: int = None) -> Iterator[Event]:
+        '''Yield (ts, thread, dev_id, dev_ip, type, offset, detail) for each event in log_file.'''
+        markers = tuple(m.encode() for m in self.markers)
+        for line in log_file.grep(*markers, start=start, end=end, count=False):
+            yield from self.feed(line, log_file)
+
+    def feed(self, line: Line, log_file: LogFile) -> Iterator[Event]:
+        '''Yield the event(s) for line, every line of the log with one of markers has to be fed in order.'''
+        text = line.text
+        if not any(m in text for m in self.markers):  # a line another parse grepped for
+            return
+        self.lines += 1
+        if "[THREAD" not in text:
+            if (self._output is not None and NOT_AUTHZ_MATCH in text
+                    and log_file.find(b"[THREAD", self._output_start, line.offset) < 0):
+                yield (*self._output, "not_authorized", line.offset, None)
+            return
+
+        self._output = None
+        devs = self.devs
+        try:
+            attrs = self.matcher.match(text)
+        except ValueError:
+            attrs = LineAttrs(LineMatcher.thread(text))
+        dev_id, dev_ip = devs.get(attrs.thread, (None, None))
+        if attrs.dev_id is not None and (attrs.dev_id != dev_id or attrs.dev_ip is not None):
+            # a different device means a new session on the thread, its ip isn't known yet
+            dev_ip = attrs.dev_ip or (dev_ip if attrs.dev_id == dev_id else None)
+            dev_id = attrs.dev_id
+            devs[attrs.thread] = (dev_id, dev_ip)
+
+        for event, marker in TAGGED_EVENTS.items():
+            if marker in text:
+                ts = LineMatcher.timestamp(text)
+                detail = None
+                if event == "finished":
+                    detail = text.split(marker)[-1].strip()
+                    self._output = (ts, attrs.thread, dev_id, dev_ip)
+                    self._output_start = log_file.line_end(line.offset)
+                yield ts, attrs.thread, dev_id, dev_ip, event, line.offset, detail
+                break
+
+
+class EventLoader:
+    '''Inserts the events added for one log in batches, see EventStore.loader().'''
+    def __init__(self, db: sqlite3.Connection, log_id: int):
+        self.db = db
+        self.log_id = log_id
+        self.batch: List[Event] = []
+        self.cnt = 0
+
+    def add(self, event: Event) -> None:
+        self.batch.append(event)
+        if len(self.batch) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            ((self.log_id, *event) for event in self.batch))
+        self.cnt += len(self.batch)
+        self.batch = []
+
+
+class EventTap(Detector):
+    '''Feeds the lines another parse of a log reads to an EventParser and its events to an EventLoader.
+
+    Run with the detectors of an ErrorScanner (or by SessionParser.parse_log) the log's events are
+    loaded in the same pass as the parse, instead of the log being scanned again for them.  It never
+    returns a Hit.
+
+    Args:
+        matcher (LineMatcher): extracts dev id / ip.
+        loader (EventLoader): from EventStore.loader() for the log being parsed.
+    '''
+    name = "events"
+    help = "loads the events of the log into the event store"
+
+    def __init__(self, matcher: LineMatcher, loader: EventLoader, **options):
+        super().__init__(**options)
+        self.parser = EventParser(matcher)
+        self.markers = self.parser.markers
+        self.loader = loader
+
+    def feed(self, line: Line, log_file: LogFile) -> Optional[Hit]:
+        for event in self.parser.feed(line, log_file):
+            self.loader.add(event)
+        return None
+
+
+class EventStore:
+    '''Events parsed from one or more logs.
+
+    Args:
+        db_file (Path): sqlite database file, created if it doesn't exist.
+    '''
+    def __init__(self, db_file: Union[str, Path]):
+        self.db_file = Path(db_file)
+        self.db = sqlite3.connect(str(self.db_file))
+        self.db.executescript(SCHEMA)
+        self._create_indexes()
+
+    def __repr__(self):
+        return f"<{self.__module__}.{type(self).__name__} {self.db_file}>"
+
+    @classmethod
+    def from_config(cls, config: Any) -> "EventStore":
+        '''Return EventStore for out/events.db.'''
+        return cls(config.base_dir / "out" / "events.db")
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _create_indexes(self) -> None:
+        for name, on in INDEXES.items():
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {on}")
+
+    @staticmethod
+    def _stamp(path: Path) -> Tuple[str, int, int]:
+        stat = path.stat()
+        return str(path.resolve()), stat.st_size, stat.st_mtime_ns
+
+    def logs(self) -> List[str]:
+        '''Return the path of every log loaded.'''
+        return [path for path, in self.db.execute("SELECT path FROM logs ORDER BY path")]
+
+    def is_current(self, path: Union[str, Path]) -> bool:
+        '''Return True if the events for the log at path are loaded and the log hasn't changed since.'''
+        path, size, mtime = self._stamp(Path(path))
+        row = self.db.execute("SELECT size, mtime FROM logs WHERE path = ?", (path,)).fetchone()
+        return row == (size, mtime)
+
+    @contextmanager
+    def loader(self, path: Union[str, Path]) -> Iterator[EventLoader]:
+        '''Replace the events stored for the log at path with the ones added to the EventLoader yielded.
+
+        Events are inserted in batches as they are added, all in one transaction, so an interrupted
+        load (an exception in the with block) leaves the previous events for the log in place.
+        '''
+        path, size, mtime = self._stamp(Path(path))
+        with self.db:
+            # loading into an empty store it's quicker to build the indexes once all the events are in
+            bulk = self.db.execute("SELECT 1 FROM events LIMIT 1").fetchone() is None
+            if bulk:
+                for name in INDEXES:
+                    self.db.execute(f"DROP INDEX IF EXISTS {name}")
+            row = self.db.execute("SELECT id FROM logs WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                log_id = row[0]
+                self.db.execute("DELETE FROM events WHERE log = ?", (log_id,))
+                self.db.execute("UPDATE logs SET size = ?, mtime = ?, loaded = ? WHERE id = ?",
+                                (size, mtime, time.time(), log_id))
+            else:
+                log_id = self.db.execute("INSERT INTO logs (path, size, mtime, loaded) VALUES (?, ?, ?, ?)",
+                                         (path, size, mtime, time.time())).lastrowid
+            loader = EventLoader(self.db, log_id)
+            yield loader
+            loader.flush()
+            if bulk:
+                self._create_indexes()
+
+    def load(self, path: Union[str, Path], events: Iterable[Event]) -> int:
+        '''Replace the events stored for the log at path, returns the number of events stored.'''
+        with self.loader(path) as loader:
+            for event in events:
+                loader.add(event)
+        return loader.cnt
+
+    def query(self, types: Sequence[str] = None, dev_ids: Sequence[int] = None, dev_ips: Sequence[str] = None,
+              since: str = None, until: str = None, logs: Sequence[Union[str, Path]] = None,
+              by: Sequence[str] = None, limit: int = None,
+              inventory: Union[str, Path] = None) -> Tuple[List[str], List[tuple]]:
+        '''Return (headers, rows) for the events matching all of the filters provided.
+
+        Without by each event is a row (ROW_FIELDS) in time order.  With by the events are grouped
+        on the by fields and each row ends with the number of events and distinct devices, most
+        events first.  by fields other than FIELDS are taken from the cached IMC inventory.
+
+        Args:
+            types (Sequence[str], optional): event types (EVENT_TYPES).
+            dev_ids (Sequence[int], optional): IMC device ids.
+            dev_ips (Sequence[str], optional): device ips.
+            since (str, optional): events at or after this timestamp (i.e. "2020-11-17" or "2020-11-17 08:00").
+            until (str, optional): events before this timestamp.
+            logs (Sequence[Path], optional): only events from these logs.
+            by (Sequence[str], optional): fields to group on.
+            limit (int, optional): max rows returned.
+            inventory (Path, optional): imc_cache.db (ImcCache), required for inventory fields.
+
+        Raises:
+            ValueError: a by field is neither an event field nor a field of any device in the inventory
+                (or the inventory isn't available).
+        '''
+        where, params = [], []
+        for field, values in (("e.type", types), ("e.dev_id", dev_ids), ("e.dev_ip", dev_ips)):
+            if values:
+                where.append(f"{field} IN ({','.join('?' * len(values))})")
+                params += list(values)
+        if since:
+            where.append("e.ts >= ?")
+            params.append(since)
+        if until:
+            where.append("e.ts < ?")
+            params.append(until)
+        if logs:
+            paths = [str(Path(p).resolve()) for p in logs]
+            where.append(f"l.path IN ({','.join('?' * len(paths))})")
+            params += paths
+
+        joins = "JOIN logs l ON l.id = e.log"
+        select, select_params = [], []
+        inv_fields = [f for f in by or [] if f not in FIELDS]
+        if inv_fields:
+            if inventory is None or not Path(inventory).is_file():
+                raise ValueError(f"{', '.join(inv_fields)} aren't event fields ({', '.join(FIELDS)}), "
+                                 "the IMC inventory they would be taken from hasn't been cached yet (run sshv1)")
+            self.db.execute("ATTACH DATABASE ? AS inv", (str(inventory),))
+            unknown = [f for f in inv_fields if self.db.execute(
+                "SELECT 1 FROM inv.devices d, json_each(d.data) j WHERE d.source = 'device' AND j.key = ? LIMIT 1", (f,)
+            ).fetchone() is None]
+            if unknown:
+                self.db.execute("DETACH DATABASE inv")
+                raise ValueError(f"Unknown field {', '.join(unknown)}, valid: {', '.join(FIELDS)} "
+                                 "or a field of the cached IMC inventory i.e. deviceModel")
+            joins += " LEFT JOIN inv.devices d ON d.source = 'device' AND d.id = e.dev_id"
+        for field in by or ROW_FIELDS:
+            if field in FIELDS:
+                select.append(FIELDS[field])
+            else:
+                select.append("json_extract(d.data, ?)")
+                select_params.append(f"$.{field}")
+
+        sql = f"SELECT {', '.join(select)}"
+        if by:
+            sql += ", COUNT(*), COUNT(DISTINCT e.dev_id)"
+        sql += f" FROM events e {joins}"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        if by:
+            sql += f" GROUP BY {', '.join(str(i) for i in range(1, len(by) + 1))} ORDER BY {len(by) + 1} DESC"
+        else:
+            sql += " ORDER BY e.ts, e.log, e.offset"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+        try:
+            rows = self.db.execute(sql, (*select_params, *params)).fetchall()
+        finally:
+            if inv_fields:
+                self.db.execute("DETACH DATABASE inv")
+        headers = [*by, "Events", "Devices"] if by else list(ROW_FIELDS)
+        return headers, rows
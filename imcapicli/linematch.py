@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Dev id / dev ip attribute extraction for imcupgdm log lines.
+
+A line is scanned once: the dev id markers are checked in priority order and the scan
+stops at the winning one, only then are the ip / adapter / login type markers looked
+for.  Values are sliced straight out of the line with partition() instead of split()ing
+the whole line for every marker that is present.  About half the THREAD lines have no
+dev id, their (thread only) result is built once per thread and reused.
+
+A compiled regex alternation of the markers was tried, on imcupgdm's short lines a
+findall() costs more than the whole extraction below for a line with no marker.
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+ADAPTER_MATCH = "AdaptName="
+LOGIN_TYPE_MATCH = "Device login type is "
+MAX_THREADS = 4096  # thread only results kept, a log has a few hundred threads
+
+
+class LineAttrs(NamedTuple):
+    thread: str
+    dev_id: Optional[int] = None
+    dev_ip: Optional[str] = None
+    adapter: Optional[str] = None
+    login_type: Optional[str] = None
+
+
+# skips the NamedTuple argument handling, match() is called for every THREAD( line
+_new_attrs = tuple.__new__
+
+
+def _self_overlaps(marker: str) -> bool:
+    '''Return True if marker can overlap itself (a proper prefix is also a suffix) i.e. " ID: "'''
+    return any(marker[:i] == marker[-i:] for i in range(1, len(marker)))
+
+
+class LineMatcher:
+    '''Matcher built once from the dev id and dev ip marker lists.
+
+    Extraction rules are the same ones logparser always used:
+        - The value for a marker is the first token (space or comma delimited) after the marker's last occurrence.
+        - When more than one id (or ip) marker is in the line, the one latest in the marker list wins.
+        - ip, adapter and login type are only extracted from lines that have a dev id.
+
+    Args:
+        id_match (List[str]): markers that precede a device id
+        ip_match (List[str]): markers that precede a device ip
+    '''
+    def __init__(self, id_match: List[str], ip_match: List[str]):
+        self.id_match = list(id_match)
+        self.ip_match = list(ip_match)
+        # checked last to first, the first marker found is the one that wins
+        self._id_order = tuple(self.id_match[::-1])
+        self._ip_order = tuple(self.ip_match[::-1])
+        self._overlaps = frozenset(m for m in [*self.id_match, *self.ip_match] if _self_overlaps(m))
+        self._no_dev: Dict[str, LineAttrs] = {}  # thread -> result for a line with no dev id
+
+    @staticmethod
+    def thread(line: str) -> str:
+        # same as split("THREAD(")[-1].split(")")[0] without building the lists
+        return line.rpartition("THREAD(")[2].partition(")")[0]
+
+    @staticmethod
+    def timestamp(line: str) -> str:
+        return line.split(" [", 1)[0].strip()
+
+    def has_dev_id(self, line: str) -> bool:
+        '''Return True if any dev id marker is in line.'''
+        for marker in self._id_order:
+            if marker in line:
+                return True
+        return False
+
+    def match(self, line: str) -> LineAttrs:
+        '''Return thread id, dev id, dev ip, adapter and login type from line.
+
+        Raises:
+            ValueError: if the winning dev id marker is not followed by an integer.
+        '''
+        thread = line.rpartition("THREAD(")[2].partition(")")[0]
+        for marker in self._id_order:
+            if marker in line:
+                break
+        else:
+            try:
+                return self._no_dev[thread]
+            except KeyError:
+                attrs = _new_attrs(LineAttrs, (thread, None, None, None, None))
+                if len(self._no_dev) < MAX_THREADS:
+                    self._no_dev[thread] = attrs
+                return attrs
+
+        # str.split() doesn't count overlapping matches, rpartition would
+        overlaps = self._overlaps
+        tail = line.split(marker)[-1] if marker in overlaps else line.rpartition(marker)[2]
+        dev_id = int(tail.lstrip().partition(" ")[0].partition(",")[0])  # int() strips the whitespace itself
+        dev_ip = None
+        for marker in self._ip_order:
+            if marker in line:
+                tail = line.split(marker)[-1] if marker in overlaps else line.rpartition(marker)[2]
+                dev_ip = tail.lstrip().partition(" ")[0].partition(",")[0].strip().rstrip(".")
+                break
+
+        adapter = login_type = None
+        if ADAPTER_MATCH in line:
+            adapter = line.rpartition(ADAPTER_MATCH)[2].strip()
+        if LOGIN_TYPE_MATCH in line:
+            login_type = line.rpartition(LOGIN_TYPE_MATCH)[2].partition(",")[0].strip()
+
+        return _new_attrs(LineAttrs, (thread, dev_id, dev_ip, adapter, login_type))
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Sidecar index of byte offsets for an imcupgdm log.
+
+Built with one scan of the log and saved next to it (<log>.idx).  The index is only
+used while the log's size and mtime match the values it was built from.
+
+The file is a json header line (stamp, byte order, number of samples) followed by the
+samples, then a second json header line (the length of every other offset array)
+followed by those arrays, each written with array.tofile().  The samples can be read
+without the rest.
+"""
+
+import json
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from .linematch import LineMatcher
+from .logsource import Line, LogFile
+
+INDEX_VERSION = 3  # 3: json headers + raw arrays (was pickled)
+SAMPLE_SIZE = 1024 * 1024  # line number checkpoint every SAMPLE_SIZE bytes
+# raised reading a missing, truncated or corrupt index file
+READ_ERRORS = (OSError, EOFError, ValueError, KeyError, TypeError)
+
+
+def _offsets() -> array:
+    return array("Q")
+
+
+def _read_array(f: BinaryIO, count: int, swap: bool) -> array:
+    offsets = _offsets()
+    offsets.fromfile(f, count)
+    if swap:
+        offsets.byteswap()
+    return offsets
+
+
+def _read_header(f: BinaryIO) -> dict:
+    header = json.loads(f.readline())
+    if not isinstance(header, dict):
+        raise ValueError("index header is not an object")
+    return header
+
+
+def sample_idx(samples: array, log_file: LogFile, offset: int) -> int:
+    '''Return the line number of the line starting at offset, counting only from the sample before it.'''
+    # offset can be the end of the log, which has no sample of its own when the size is a multiple of SAMPLE_SIZE
+    sample = min(offset // SAMPLE_SIZE, len(samples) - 1)
+    if sample < 0:  # empty log
+        return 0
+    return samples[sample] + log_file.count_lines(sample * SAMPLE_SIZE, offset)
+
+
+class LogIndex:
+    '''Offsets of interest in a log file.
+
+    Attributes:
+        threads (Dict[str, array]): thread id -> offsets of every line tagged with THREAD(id)
+        devs (Dict[int, array]): dev id -> offsets of every line with a dev id marker for that id
+        finished (array): offsets of "Finished, result:" lines
+        boundaries (array): offsets of "[THREAD" lines (these end a Finished block)
+        samples (array): number of lines before each SAMPLE_SIZE byte boundary
+    '''
+    def __init__(self, log_file: LogFile, threads: Dict[str, array], devs: Dict[int, array],
+                 finished: array, boundaries: array, samples: array):
+        self.log_file = log_file
+        self.threads = threads
+        self.devs = devs
+        self.finished = finished
+        self.boundaries = boundaries
+        self.samples = samples
+        self._last = (0, 0)  # (offset, idx) of the last line_idx() lookup
+
+    def __repr__(self):
+        return (f"<{self.__module__}.{type(self).__name__} {self.log_file.path.name} threads: {len(self.threads)} "
+                f"devs: {len(self.devs)} finished: {len(self.finished)}>")
+
+    @staticmethod
+    def index_file(log_file: LogFile) -> Path:
+        return log_file.path.parent / f"{log_file.path.name}.idx"
+
+    @staticmethod
+    def _stamp(log_file: LogFile) -> tuple:
+        stat = log_file.path.stat()
+        return INDEX_VERSION, stat.st_size, stat.st_mtime_ns
+
+    @classmethod
+    def build(cls, log_file: LogFile, matcher: LineMatcher) -> "LogIndex":
+        '''Scan log_file once and return a new index (not saved).'''
+        threads, devs = {}, {}
+        finished, boundaries = _offsets(), _offsets()
+        markers = [b"THREAD(", b"Finished, result:", *[m.encode() for m in matcher.id_match]]
+        for line in log_file.grep(*markers, start=0, end=log_file.size, count=False):
+            text = line.text
+            if "THREAD(" in text:
+                threads.setdefault(matcher.thread(text), _offsets()).append(line.offset)
+                if "[THREAD" in text:
+                    boundaries.append(line.offset)
+            if "Finished, result:" in text:
+                finished.append(line.offset)
+            try:
+                dev_id = matcher.match(text).dev_id
+            except ValueError:
+                dev_id = None
+            if dev_id is not None:
+                devs.setdefault(dev_id, _offsets()).append(line.offset)
+
+        samples, cnt = _offsets(), 0
+        for pos in range(0, log_file.size, SAMPLE_SIZE):
+            samples.append(cnt)
+            cnt += log_file.count_lines(pos, min(pos + SAMPLE_SIZE, log_file.size))
+
+        return cls(log_file, threads, devs, finished, boundaries, samples)
+
+    @classmethod
+    def _read(cls, log_file: LogFile, samples_only: bool = False) -> Optional[dict]:
+        idx_file = cls.index_file(log_file)
+        if not idx_file.is_file():
+            return None
+        try:
+            with idx_file.open("rb") as f:
+                head = _read_header(f)
+                if tuple(head["stamp"]) != cls._stamp(log_file):
+                    return None
+                swap = head["byteorder"] != sys.byteorder
+                data = {"samples": _read_array(f, head["samples"], swap)}
+                if not samples_only:
+                    rest = _read_header(f)
+                    data["finished"] = _read_array(f, rest["finished"], swap)
+                    data["boundaries"] = _read_array(f, rest["boundaries"], swap)
+                    data["threads"] = {thread: _read_array(f, cnt, swap) for thread, cnt in rest["threads"]}
+                    data["devs"] = {int(dev_id): _read_array(f, cnt, swap) for dev_id, cnt in rest["devs"]}
+        except READ_ERRORS:
+            return None
+        return data
+
+    @classmethod
+    def load(cls, log_file: LogFile) -> Optional["LogIndex"]:
+        '''Return the saved index for log_file or None if there isn't one or it's stale.'''
+        data = cls._read(log_file)
+        if data is None:
+            return None
+        return cls(log_file, data["threads"], data["devs"], data["finished"], data["boundaries"], data["samples"])
+
+    @classmethod
+    def load_samples(cls, log_file: LogFile) -> Optional[array]:
+        '''Return only the line number samples of the saved index for log_file (the rest isn't read), None if there isn't a current one.'''
+        data = cls._read(log_file, samples_only=True)
+        return None if data is None else data["samples"]
+
+    @classmethod
+    def get(cls, log_file: LogFile, matcher: LineMatcher, rebuild: bool = False) -> "LogIndex":
+        '''Return the saved index for log_file, building and saving it first if necessary.'''
+        index = None if rebuild else cls.load(log_file)
+        if index is None:
+            index = cls.build(log_file, matcher)
+            index.save()
+        return index
+
+    def save(self) -> Path:
+        idx_file = self.index_file(self.log_file)
+        head = {"stamp": self._stamp(self.log_file), "byteorder": sys.byteorder, "samples": len(self.samples)}
+        rest = {
+            "finished": len(self.finished),
+            "boundaries": len(self.boundaries),
+            "threads": [[thread, len(offsets)] for thread, offsets in self.threads.items()],
+            "devs": [[dev_id, len(offsets)] for dev_id, offsets in self.devs.items()],
+        }
+        with idx_file.open("wb") as f:
+            f.write(json.dumps(head).encode() + b"\n")
+            self.samples.tofile(f)
+            f.write(json.dumps(rest).encode() + b"\n")
+            for offsets in (self.finished, self.boundaries, *self.threads.values(), *self.devs.values()):
+                offsets.tofile(f)
+        return idx_file
+
+    def line_idx(self, offset: int) -> int:
+        '''Return the line number of the line starting at offset.
+
+        Counts from the nearest sample, or from the previous lookup when offsets are requested in order.
+        '''
+        sample = offset // SAMPLE_SIZE
+        last_offset, last_idx = self._last
+        if sample * SAMPLE_SIZE <= last_offset <= offset:
+            idx = last_idx + self.log_file.count_lines(last_offset, offset)
+        else:
+            idx = sample_idx(self.samples, self.log_file, offset)
+        self._last = (offset, idx)
+        return idx
+
+    def line(self, offset: int, idx: int = None) -> Line:
+        idx = self.line_idx(offset) if idx is None else idx
+        return Line(idx, offset, self.log_file.text(offset, self.log_file.line_end(offset, self.log_file.size)))
+
+    def next_boundary(self, offset: int) -> Optional[int]:
+        '''Return the offset of the first "[THREAD" line after offset.'''
+        pos = bisect_right(self.boundaries, offset)
+        if pos < len(self.boundaries):
+            return self.boundaries[pos]
+
+    def is_finished(self, offset: int) -> bool:
+        pos = bisect_left(self.finished, offset)
+        return pos < len(self.finished) and self.finished[pos] == offset
+
+    def output_offsets(self, finished: int) -> Iterator[int]:
+        '''Yield the offsets of the device (cli) output lines following the "Finished, result:" line at finished.
+
+        The output runs to the next "[THREAD" line (or the end of the log).
+        '''
+        end = self.next_boundary(finished)
+        end = self.log_file.size if end is None else end
+        pos = self.log_file.line_end(finished, end)
+        while pos < end:
+            yield pos
+            pos = self.log_file.line_end(pos, end)
+
+    def dev_offsets(self, dev_id: int) -> List[int]:
+        '''Return offsets of every line that belongs to dev_id.
+
+        That is every line with a dev id marker for dev_id, and for each of those lines that
+        is tagged with a thread, the lines of that thread through its next "Finished, result:"
+        and the device output that follows it.
+        '''
+        mentions = self.devs.get(dev_id)
+        if not mentions:
+            return []
+
+        offsets, covered = set(mentions), {}
+        for offset in mentions:
+            text = self.log_file.text(offset, self.log_file.line_end(offset, self.log_file.size))
+            if "THREAD(" not in text:
+                continue
+            thread = LineMatcher.thread(text)
+            if offset <= covered.get(thread, -1):
+                continue
+            thread_offsets = self.threads.get(thread, [])
+            for pos in range(bisect_left(thread_offsets, offset), len(thread_offsets)):
+                offset = thread_offsets[pos]
+                offsets.add(offset)
+                if self.is_finished(offset):
+                    offsets.update(self.output_offsets(offset))
+                    break
+            covered[thread] = offset
+
+        return sorted(offsets)
+
+    def dev_lines(self, dev_id: int) -> Iterator[Line]:
+        for offset in self.dev_offsets(dev_id):
+            yield self.line(offset)
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Memory mapped line source for imcupgdm logs.
+
+The log is never read into memory as a whole.  Marker bytes are searched for directly
+in the mapped file and only the lines that contain a marker are decoded.
+
+Compressed logs (gzip, xz, zstd) are streamed: grep(), grep_map() and lines() decompress
+and scan them a chunk of whole lines at a time (see compressed.py).  While a chunk is
+being scanned line_end(), line_start(), text(), find() ... are answered from it (it also
+holds LOOKAROUND bytes of lines either side), so parsers can look around the line
+they're on.  Anything else needs random access, i.e. seek_time() (--since/--until) or a
+lookup outside the chunk, and that decompresses the log to an anonymous temp file which
+is mapped and used from then on.  The size of a compressed log isn't known until it has
+been streamed to the end (or mapped).
+"""
+
+import mmap
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Generator, Iterator, List, NamedTuple, Optional, Pattern, Tuple, Union
+
+from . import compressed
+from .profiling import profiler
+
+COUNT_CHUNK = 16 * 1024 * 1024
+MIN_JOB_SIZE = 4 * 1024 * 1024  # ranges smaller than this are not worth a worker process
+JOB_SIZE = 8 * 1024 * 1024  # bytes a worker scans per task, with jobs tasks in flight memory stays flat
+GREP_WINDOW = 4 * 1024 * 1024  # bytes grep collects the marker hits for at a time
+LOOKAROUND = 1024 * 1024  # bytes of lines kept either side of the lines being scanned while streaming a compressed log
+# "2020-11-17 08:00:00.507 [INFO] ...", device (cli) output lines have no timestamp
+TIMESTAMP_RE = re.compile(rb"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\S*", re.MULTILINE)
+
+
+class Line(NamedTuple):
+    idx: Optional[int]  # 0 based line number (same numbering readlines() + enumerate gave), None if not counted
+    offset: int         # byte offset of the start of the line
+    text: str           # decoded line including the trailing newline
+
+
+_new_line = tuple.__new__  # Line(...) without the Python level NamedTuple __new__, for the grep loop
+
+
+def _grep_range(path: Path, markers: Tuple[bytes], count: bool, start: int, end: int) -> Tuple[List[tuple], int]:
+    '''Worker for LogFile.grep when jobs > 1.
+
+    Returns:
+        Tuple[List[tuple], int]: matching lines as plain (idx relative to start, offset, text) tuples
+            (a NamedTuple is much slower to pickle), number of lines in the range (idx None and 0 without count).
+    '''
+    with LogFile(path, start, end) as log_file:
+        lines = [tuple(line) for line in log_file._grep(markers, start, end, 0 if count else None)]
+        if not count:
+            return lines, 0
+        if not lines:
+            return lines, log_file.count_lines(start, end)
+        return lines, lines[-1][0] + log_file.count_lines(lines[-1][1], end)
+
+
+def _map_range(path: Path, func: Callable[[Line], Any], markers: Tuple[bytes], start: int, end: int) -> List[Any]:
+    '''Worker for LogFile.grep_map when jobs > 1, returns func(line) for each matching line.'''
+    with LogFile(path, start, end) as log_file:
+        return [func(line) for line in log_file._grep(markers, start, end, None)]
+
+
+def _compile(markers: Tuple[Union[bytes, Pattern]]) -> Pattern:
+    '''Return one regex matching any of markers (byte strings match literally).'''
+    parts = [m.pattern if isinstance(m, Pattern) else re.escape(m) for m in markers]
+    # ^ and $ match at line boundaries as the whole buffer is searched
+    return re.compile(b"|".join(b"(?:" + p + b")" for p in parts), re.MULTILINE)
+
+
+def _scan(buf: Union[mmap.mmap, bytes], base: int, start: int, end: int, idx: Optional[int], literals: List[bytes],
+          regex: Optional[Pattern]) -> Generator[Line, None, Optional[int]]:
+    '''Yield the lines between start and end (whole lines held by buf, buf[0] is at offset base) with a marker.
+
+    The hits of each marker are collected for the whole range, byte strings with buf.find (much faster than
+    a regex alternation) and regexes together, then taken in order, so the work done in Python is per
+    matching line.
+
+    Returns:
+        Optional[int]: line number of the line at end, None if idx is None (lines aren't counted).
+    '''
+    find, rfind = buf.find, buf.rfind
+    lo, hi = start - base, end - base
+    hits = []
+    for marker in literals:
+        hit = find(marker, lo, hi)
+        while hit >= 0:
+            hits.append(hit)
+            hit = find(marker, hit + 1, hi)
+    if regex is not None:
+        hits += [match.start() for match in regex.finditer(buf, lo, hi)]
+    if len(literals) + (regex is not None) > 1:
+        hits.sort()
+    pos = counted = lo
+    # line_start() / line_end() are inlined, this runs for every matching line
+    for hit in hits:
+        if hit < pos:  # another marker on a line already yielded
+            continue
+        line_start = max(rfind(b"\n", lo, hit) + 1, lo)
+        nl = find(b"\n", hit, hi)
+        pos = hi if nl < 0 else nl + 1
+        if idx is not None:
+            idx += buf[counted:line_start].count(b"\n")
+            counted = line_start
+        yield _new_line(Line, (idx, line_start + base, _decode(buf[line_start:pos])))
+    return None if idx is None else idx + buf[counted:hi].count(b"\n")
+
+
+def _each(buf: Union[mmap.mmap, bytes], base: int, start: int, end: int, idx: int) -> Generator[Line, None, int]:
+    '''Yield every line between start and end (held by buf, buf[0] is at offset base), returns the line number at end.'''
+    find, pos, end = buf.find, start - base, end - base
+    while pos < end:
+        nl = find(b"\n", pos, end)
+        nxt = end if nl < 0 else nl + 1
+        yield Line(idx, pos + base, _decode(buf[pos:nxt]))
+        idx += 1
+        pos = nxt
+    return idx
+
+
+def _split_markers(markers: Tuple[Union[bytes, Pattern]]) -> Tuple[List[bytes], Optional[Pattern]]:
+    '''Return (the byte string markers, one regex for the compiled ones or None if there aren't any).'''
+    patterns = [m for m in markers if isinstance(m, Pattern)]
+    return [m for m in markers if not isinstance(m, Pattern)], _compile(patterns) if patterns else None
+
+
+def _matched(lines: Iterator[Line]) -> Iterator[Line]:
+    '''Pass lines through, adding them to the "log lines matched" profiler counter.'''
+    cnt = 0
+    try:
+        for line in lines:
+            cnt += 1
+            yield line
+    finally:
+        profiler.count("log lines matched", cnt)
+
+
+def _decode(raw: bytes) -> str:
+    text = raw.decode("utf-8", errors="replace")
+    if text.endswith("\r\n"):
+        text = f"{text[:-2]}\n"
+    return text
+
+
+class LogFile:
+    '''Line oriented, memory mapped (or streamed, when compressed) view of a log file.
+
+    Args:
+        path (Path): The log file.
+        start (int, optional): byte offset to start at, must be the start of a line. Defaults to 0.
+        end (int, optional): byte offset to stop at, must be the start of a line. Defaults to EOF.
+        jobs (int, optional): number of worker processes grep() splits the file across, or threads used to
+            decompress a compressed log. Defaults to 1.
+
+    Raises:
+        ImportError: the log is zstd compressed and zstandard isn't installed.
+    '''
+    def __init__(self, path: Union[str, Path], start: int = 0, end: int = None, jobs: int = 1):
+        self.path = Path(path)
+        self.jobs = jobs or 1
+        self.compression = compressed.detect(self.path)
+        if self.compression:
+            compressed.check(self.path)
+        self._fh = None
+        self._buf = None
+        self._window = None  # (chunk, offset of chunk[0], offset chunk ends at) while a compressed log is streamed
+        # offsets are into the decompressed log, its size isn't known until it's been read
+        self._size = None if self.compression else self.path.stat().st_size
+        self.start = start
+        self._end = end if end is None or self._size is None else min(end, self._size)
+        self._start_idx = (0, 0)  # (start, line number of the line at start), see line_idx()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.lines():
+            yield line.text
+
+    def __repr__(self):
+        end = "" if self._end is None and self._size is None else self.end
+        return f"<{self.__module__}.{type(self).__name__} {self.path} [{self.start}:{end}]>"
+
+    @property
+    def buf(self) -> Union[mmap.mmap, bytes]:
+        '''The whole (decompressed) log, a compressed log is decompressed to a temp file the first time it's used.'''
+        if self._buf is None:
+            if self.compression:
+                self._buf = compressed.read(self.path, jobs=self.jobs)
+                self._size = len(self._buf)
+            else:
+                self._fh = self.path.open("rb")
+                self._buf = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buf
+
+    @property
+    def size(self) -> int:
+        '''Size of the (decompressed) log.  A compressed log that hasn't been streamed to the end is mapped (see buf).'''
+        if self._size is None:
+            self._size = len(self.buf)
+        return self._size
+
+    @property
+    def end(self) -> int:
+        return self.size if self._end is None else self._end
+
+    @end.setter
+    def end(self, end: int) -> None:
+        self._end = end
+
+    def close(self) -> None:
+        self._window = None
+        if self._buf is not None:
+            if isinstance(self._buf, mmap.mmap):  # an empty decompressed log is b""
+                self._buf.close()
+            if self._fh is not None:
+                self._fh.close()
+            self._buf = self._fh = None
+
+    def _span(self, start: int, end: int) -> Tuple[Union[mmap.mmap, bytes], int, int]:
+        '''Return (buffer, offset of buffer[0], offset buffer ends at) for a buffer that holds start to end.
+
+        That's the chunk being scanned while a compressed log is streamed if it holds them, otherwise the whole log.
+        '''
+        window = self._window
+        if window is not None and window[1] <= start and end <= window[2] and self._buf is None:
+            return window
+        buf = self.buf
+        return buf, 0, len(buf)
+
+    def count_lines(self, start: int, end: int) -> int:
+        '''Return the number of newlines between 2 byte offsets (chunked to keep memory flat).'''
+        buf, base, _ = self._span(start, end)
+        cnt = 0
+        for pos in range(start - base, end - base, COUNT_CHUNK):
+            cnt += buf[pos:min(pos + COUNT_CHUNK, end - base)].count(b"\n")
+        return cnt
+
+    def line_end(self, offset: int, end: int = None) -> int:
+        '''Return the offset of the start of the line following the one containing offset.'''
+        # a streamed chunk holds whole lines, the newline is in it unless it's the end of the log
+        buf, base, limit = self._span(offset, offset + 1)
+        if end is None:
+            end = limit if self._end is None else self._end
+        end = min(end, limit)
+        nl = buf.find(b"\n", offset - base, end - base)
+        return end if nl < 0 else nl + base + 1
+
+    def line_start(self, offset: int, start: int = None) -> int:
+        '''Return the offset of the start of the line containing offset.'''
+        start = self.start if start is None else start
+        # a streamed chunk starts at the start of a line
+        buf, base, _ = self._span(offset, offset)
+        return max(buf.rfind(b"\n", max(start - base, 0), offset - base) + base + 1, start)
+
+    def find(self, sub: bytes, start: int, end: int = None) -> int:
+        '''Return the offset of the first sub between start and end (default the end of this LogFile), -1 if there isn't one.'''
+        end = self._end if end is None else end  # None: the end of the log
+        buf, base, limit = self._span(start, start if end is None else end)
+        pos = buf.find(sub, start - base, limit - base if end is None else min(end, limit) - base)
+        if pos < 0 and buf is not self._buf and (end is None or end > limit) and limit != self._size:
+            # the rest isn't in the chunk
+            return self.buf.find(sub, start, self.end)
+        return pos if pos < 0 else pos + base
+
+    def rfind(self, sub: bytes, start: int, end: int) -> int:
+        '''Return the offset of the last sub between start and end, -1 if there isn't one.'''
+        buf, base, _ = self._span(start, end)
+        pos = buf.rfind(sub, start - base, end - base)
+        return pos if pos < 0 else pos + base
+
+    def line_idx(self, offset: int) -> int:
+        '''Return the line number of the line starting at offset.
+
+        Lines are counted from start, the line number at start is found once for each start.  For a
+        window (i.e. --since) that uses the line samples of the log's sidecar index when it has a
+        current one, so only the lines since the sample before start are counted instead of every
+        line before the window.
+        '''
+        if offset < self.start:
+            return self.count_lines(0, offset)
+        if self._start_idx[0] != self.start:
+            from .logindex import LogIndex, sample_idx  # logindex imports this module
+
+            samples = None if self.compression else LogIndex.load_samples(self)
+            idx = self.count_lines(0, self.start) if samples is None else sample_idx(samples, self, self.start)
+            self._start_idx = (self.start, idx)
+        return self._start_idx[1] + self.count_lines(self.start, offset)
+
+    def text(self, start: int, end: int) -> str:
+        buf, base, _ = self._span(start, end)
+        return _decode(buf[start - base:end - base])
+
+    def timestamp(self, offset: int = None) -> Optional[str]:
+        '''Return the timestamp of the first line starting at or after offset that has one.'''
+        match = TIMESTAMP_RE.search(self.buf, self.start if offset is None else offset, self.end)
+        return None if match is None else match.group().decode()
+
+    def seek_time(self, ts: str, start: int = None, end: int = None) -> int:
+        '''Return the offset of the first line logged at or after ts, end if there isn't one.
+
+        The log is written in time order so it's binary searched, each probe only decodes the
+        timestamp of the first line with one following the probe.  Lines without a timestamp
+        (device output) go with the line before them.  Timestamps are compared as strings so
+        ts can be partial i.e. "2020-11-17" or "2020-11-17 08:00".
+        '''
+        start = self.start if start is None else start
+        end = self.end if end is None else end
+        buf, target = self.buf, ts.encode()
+        lo, hi = start, end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            match = TIMESTAMP_RE.search(buf, mid, end)
+            if match is None or match.group() >= target:
+                hi = mid
+            else:
+                lo = match.start() + 1
+        match = TIMESTAMP_RE.search(buf, lo, end)
+        return end if match is None else match.start()
+
+    def time_range(self, since: str = None, until: str = None) -> Tuple[int, int]:
+        '''Return (start, end) offsets of the lines logged at or after since and before until.'''
+        start = self.start if since is None else self.seek_time(since)
+        end = self.end if until is None else self.seek_time(until, start=start)
+        return start, end
+
+    def _streams(self) -> bool:
+        '''Return True if a scan should stream the log (compressed, not mapped and no other scan streaming it).'''
+        return self.compression is not None and self._buf is None and self._window is None
+
+    def _chunks(self) -> Iterator[Tuple[bytes, int, int, int]]:
+        '''Yield (chunk, offset of chunk[0], start, end) for the compressed log decompressed a chunk of whole lines at a time.
+
+        start to end are the lines to scan, the chunk also holds up to LOOKAROUND bytes of the lines before
+        start and after end (those are scanned with the next chunk), and is the window line_end(), find() ...
+        use while it's the current one.  The size of the log is known once the last chunk is yielded.
+        '''
+        chunk, base, pos, pending = b"", 0, 0, b""  # pos: offset of the first line not scanned yet
+        try:
+            for data in compressed.stream(self.path, jobs=self.jobs):
+                pending += data
+                cut = pending.rfind(b"\n") + 1
+                if not cut:
+                    continue
+                chunk, pending = chunk + pending[:cut], pending[cut:]
+                # max(): a negative end would count back from the end of the chunk
+                end = chunk.rfind(b"\n", pos - base, max(len(chunk) - LOOKAROUND, 0)) + 1
+                if not end:  # not LOOKAROUND bytes past a line yet
+                    continue
+                self._window = (chunk, base, base + len(chunk))
+                yield chunk, base, pos, base + end
+                pos = base + end
+                drop = chunk.rfind(b"\n", 0, max(pos - base - LOOKAROUND, 0)) + 1
+                chunk, base = chunk[drop:], base + drop
+            chunk += pending  # last line without a newline
+            self._size = base + len(chunk)
+            if pos < self._size:
+                self._window = (chunk, base, self._size)
+                yield chunk, base, pos, self._size
+        finally:
+            self._window = None
+
+    def _stream(self, scan: Callable[..., Generator[Line, None, Optional[int]]], start: int, end: Optional[int],
+                idx: Optional[int], count_to_start: bool) -> Iterator[Line]:
+        '''Run scan(chunk, base, start, end, idx) over the part of each streamed chunk between start and end (None: EOF).
+
+        With count_to_start the lines before start are counted and idx is the line number of the line at offset 0.
+        '''
+        scanned = lines = 0
+        for chunk, base, pos, hi in self._chunks():
+            hi = hi if end is None else min(hi, end)
+            if count_to_start and pos < start:
+                idx += chunk[pos - base:min(start, hi) - base].count(b"\n")
+            lo = max(pos, start)
+            if lo < hi:
+                scanned += hi - lo
+                if profiler.enabled:
+                    lines += chunk[lo - base:hi - base].count(b"\n")
+                idx = yield from scan(chunk, base, lo, hi, idx)
+            if end is not None and hi >= end:
+                break
+        profiler.count("log bytes scanned", scanned)
+        profiler.count("log lines scanned", lines)
+
+    def lines(self, start: int = None, end: int = None, idx: int = None) -> Iterator[Line]:
+        '''Yield every line between start and end.
+
+        Args:
+            start (int, optional): byte offset (start of a line). Defaults to the start of this LogFile.
+            end (int, optional): byte offset. Defaults to the end of this LogFile.
+            idx (int, optional): line number of the line at start, calculated (see line_idx) if not provided.
+        '''
+        start = self.start if start is None else start
+        if self._streams():
+            end = self._end if end is None else end
+            return self._stream(_each, start, end, 0 if idx is None else idx, count_to_start=idx is None)
+        end = self.end if end is None else end
+        idx = self.line_idx(start) if idx is None else idx
+        if profiler.enabled:
+            return self._counted(self._lines(start, end, idx), start, end, matched=False)
+        return self._lines(start, end, idx)
+
+    def _lines(self, start: int, end: int, idx: int) -> Iterator[Line]:
+        buf, base, _ = self._span(start, end)
+        yield from _each(buf, base, start, end, idx)
+
+    def grep(self, *markers: Union[bytes, Pattern], start: int = None, end: int = None,
+             idx: int = None, count: bool = True) -> Iterator[Line]:
+        '''Yield only the lines that contain any of the provided markers.
+
+        Markers are searched for in the raw bytes, lines without a match are never decoded.
+
+        Args:
+            markers (Union[bytes, Pattern]): one or more byte strings or compiled bytes regexes to search for.
+            start (int, optional): byte offset (start of a line). Defaults to the start of this LogFile.
+            end (int, optional): byte offset. Defaults to the end of this LogFile.
+            idx (int, optional): line number of the line at start, calculated (see line_idx) if not provided.
+            count (bool, optional): number the lines, without it Line.idx is None and the lines between
+                matches aren't counted (only the markers are searched for). Defaults to True.
+        '''
+        start = self.start if start is None else start
+        if self._streams():
+            end = self._end if end is None else end
+            return self._stream_grep(markers, start, end, idx if count else None, count and idx is None)
+        end = self.end if end is None else end
+        idx = None if not count else self.line_idx(start) if idx is None else idx
+        # workers reopen the log, a compressed one would be decompressed again by each of them
+        if self.jobs > 1 and not self.compression and end - start >= MIN_JOB_SIZE * 2:
+            lines = self._grep_parallel(markers, start, end, idx)
+        else:
+            lines = self._grep(markers, start, end, idx)
+        return self._counted(lines, start, end) if profiler.enabled else lines
+
+    def _stream_grep(self, markers: Tuple[Union[bytes, Pattern]], start: int, end: Optional[int],
+                     idx: Optional[int], count_to_start: bool) -> Iterator[Line]:
+        literals, regex = _split_markers(markers)
+        lines = self._stream(partial(_scan, literals=literals, regex=regex), start, end,
+                             0 if count_to_start else idx, count_to_start)
+        return _matched(lines) if profiler.enabled else lines
+
+    def _counted(self, lines: Iterator[Line], start: int, end: int, matched: bool = True) -> Iterator[Line]:
+        '''Pass lines through, adding the lines/bytes scanned (and matched) to the profiler counters.'''
+        cnt, pos = 0, start
+        try:
+            for line in lines:
+                cnt += 1
+                pos = line.offset
+                yield line
+            pos = end
+        finally:
+            # skipped if the file was closed before the consumer was done with lines
+            if self._buf is not None:
+                # a consumer that stops early has scanned up to the end of the last line it got
+                pos = pos if pos == end else self.line_end(pos, end)
+                profiler.count("log bytes scanned", pos - start)
+                profiler.count("log lines scanned", self.count_lines(start, pos) if matched else cnt)
+                if matched:
+                    profiler.count("log lines matched", cnt)
+
+    def split(self, start: int, end: int, parts: int) -> List[Tuple[int, int]]:
+        '''Split a byte range into (start, end) ranges that begin and end on line boundaries.'''
+        size = max((end - start) // parts, MIN_JOB_SIZE)
+        bounds = [start]
+        for pos in range(start + size, end, size):
+            pos = self.line_end(pos - 1, end)
+            if bounds[-1] < pos < end:
+                bounds.append(pos)
+        bounds.append(end)
+        return list(zip(bounds, bounds[1:]))
+
+    def _parallel(self, worker: Callable[..., Any], *args, start: int, end: int) -> Iterator[Any]:
+        '''Yield worker(path, *args, start, end) for ranges of about JOB_SIZE run in worker processes, in file order.
+
+        Only jobs ranges are in flight at a time, so the results held don't grow with the size of the log.
+        '''
+        ranges = self.split(start, end, max(self.jobs, (end - start) // JOB_SIZE))
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(ranges))) as executor:
+            pending = deque()
+            try:
+                for r in ranges:
+                    if len(pending) >= self.jobs:
+                        yield pending.popleft().result()
+                    pending.append(executor.submit(worker, self.path, *args, *r))
+                while pending:
+                    yield pending.popleft().result()
+            finally:  # consumer stopped early
+                for future in pending:
+                    future.cancel()
+
+    def _grep_parallel(self, markers: Tuple[bytes], start: int, end: int, idx: Optional[int]) -> Iterator[Line]:
+        '''Scan ranges of the file in worker processes, matches are yielded in file order (idx None doesn't count lines).'''
+        count = idx is not None
+        for lines, line_cnt in self._parallel(_grep_range, markers, count, start=start, end=end):
+            for line_idx, offset, text in lines:
+                yield Line(line_idx + idx if count else None, offset, text)
+            if count:
+                idx += line_cnt
+
+    def grep_map(self, func: Callable[[Line], Any], *markers: Union[bytes, Pattern], start: int = None,
+                 end: int = None) -> Iterator[Any]:
+        '''Yield func(line) for each line grep() would, in file order.
+
+        With jobs > 1 func runs in the worker processes, so only what it extracts from a line is sent
+        back instead of the decoded line.  func must be picklable (a module level function or a partial
+        of one) and gets lines without line numbers (idx is None).
+        '''
+        start = self.start if start is None else start
+        if self._streams():
+            end = self._end if end is None else end
+            for line in self._stream_grep(markers, start, end, None, False):
+                yield func(line)
+            return
+        end = self.end if end is None else end
+        if self.jobs > 1 and not self.compression and end - start >= MIN_JOB_SIZE * 2:
+            for results in self._parallel(_map_range, func, markers, start=start, end=end):
+                yield from results
+        else:
+            for line in self._grep(markers, start, end, None):
+                yield func(line)
+        profiler.count("log bytes scanned", end - start)
+
+    def _grep(self, markers: Tuple[Union[bytes, Pattern]], start: int, end: int,
+              idx: Optional[int]) -> Iterator[Line]:
+        '''Yield the lines between start and end with one of markers, idx None doesn't count lines (Line.idx is None).
+
+        Scanned a GREP_WINDOW (of whole lines) at a time, see _scan.
+        '''
+        literals, regex = _split_markers(markers)
+        buf, base, _ = self._span(start, end)
+        pos = start
+        while pos < end:
+            nl = buf.find(b"\n", min(pos + GREP_WINDOW, end) - 1 - base, end - base)
+            window = end if nl < 0 else nl + base + 1
+            idx = yield from _scan(buf, base, pos, window, idx, literals, regex)
+            pos = window
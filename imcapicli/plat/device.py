@@ -6,62 +6,132 @@
 This module adds some new and override methods to the pyhpeimc module
 """
 
-from typing import Union
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional, Sequence, TypeVar, Union
 
 import requests
 import os
 
+from imcapicli import log, session as imc_session
+from imcapicli.client import in_executor
+from imcapicli.profiling import profiler
 from pyhpeimc.auth import HEADERS
 
 DEV_SYSTEM = os.getenv("NAME") == "wellswa6"
+T = TypeVar("T")
 
-def get_all_devs(auth, url, network_address=None, category=None, label=None, start: int = 0,
-                 size: int = None, order_by: str = "id", total: bool = False, by_id: bool = False,
-                 by_ip: bool = False, **kwargs) -> Union[list, dict]:
-    '''Get details for all devices managed by HPE IMC via API.
+def _get_page(f_url: str, auth, session: requests.Session, **kwargs) -> dict:
+    response = session.get(f_url, auth=auth, headers=HEADERS, **kwargs)
+    if response.status_code == 200:
+        return response.json()
+    return {}
+
+
+async def _get_page_async(f_url: str, auth, session: requests.Session, **kwargs) -> dict:
+    return await in_executor(_get_page, f_url, auth, session, **kwargs)
+
+
+def _iter_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    '''Yield the items of an async generator from sync code, run a step at a time on a loop of its own.'''
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:  # also when the caller stops early, the generator's pending requests are cancelled
+        loop.run_until_complete(agen.aclose())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+
+def _page_devs(page: dict) -> list:
+    devs = page.get("device", [])
+    # IMC returns a dict rather than a list of dicts when a page has a single device
+    return [devs] if isinstance(devs, dict) else devs
+
+
+def _project(devs: Iterable[dict], fields: Optional[Sequence[str]]) -> Iterator[dict]:
+    if not fields:
+        return iter(devs)
+    fields = frozenset(fields)
+    # keys keep the order IMC returned them in
+    return ({k: v for k, v in dev.items() if k in fields} for dev in devs)
+
+
+async def iter_devs_async(auth, url, network_address=None, category=None, label=None, start: int = 0,
+                          size: int = None, order_by: str = "id", total: bool = False, fields: Sequence[str] = None,
+                          workers: int = None, session: requests.Session = None, **kwargs) -> AsyncIterator[dict]:
+    '''Yield details for all devices managed by HPE IMC a page at a time.
+
+    Each page is decoded once and released as soon as its devices have been yielded, so memory
+    is bounded by the page size (plus up to workers pages in flight) rather than the inventory.
 
     Args:
-        auth (IMCAuth): IMCAuth object
-        url (str): Base url for IMC i.e. 'https://imc.consolepi.org:443'
-        network_address (str, optional): Return details for a specific device by ip. Defaults to None.
-        category (str, optional): Return details for all devices of a specific device category. Defaults to None.
-        label (str, optional): Return details for a specific device by device label. Defaults to None.
-        start (int, optional): The start record. Defaults to 0.
-        size (int, optional): The number of items to return. Defaults to None.
-        order_by (str, optional): What field the output is sorted by. Defaults to "id".
-        total (bool, optional): Return the total number of devices or not. Defaults to False.
-        by_id (bool, optional): If True will return a dict of dicts using dev id as key for each device. Defaults to False.
-        by_ip (bool, optional): If True will return a dict of dicts using dev ip as key for each device. Defaults to False.
+        See get_all_devs.
+        fields (Sequence[str], optional): Only keep these keys for each device. Defaults to None (all keys).
 
-    Returns:
-        dict: By default returns list of dicts with no key where attributes for each device are in the containing dict.
-            Use by_id or by_ip to get a dict keyed by device id or ip.
+    Yields:
+        dict: details for each device
     '''
+    session = session or imc_session
     base_url = "/imcrs/plat/res/device?resPrivilegeFilter=false"
+    page_size = size or (10 if DEV_SYSTEM else 1000)
     if DEV_SYSTEM:
         print("Running With DEV_SYSTEM = True")
-        end_url = f"&start={start}&size={size or 10}&orderBy={order_by}&desc=false&total={str(total).lower()}"
-    else:
-        end_url = f"&start={start}&size={size or 1000}&orderBy={order_by}&desc=false&total={str(total).lower()}"
+    total = total or bool(workers and workers > 1 and not size)
 
     network_address = '' if not network_address else f"&ip={str(network_address)}"
     label = '' if not label else f"&label={str(label)}"
     category = '' if not category else f"&category{category}"
 
-    f_url = url + base_url + str(network_address) + str(label) + str(category) + end_url
+    def _url(_start: int) -> str:
+        end_url = f"&start={_start}&size={page_size}&orderBy={order_by}&desc=false&total={str(total).lower()}"
+        return url + base_url + str(network_address) + str(label) + str(category) + end_url
 
-    dev_details, _link = None, None
-    cnt = 1
+    f_url = _url(start)
+    _link = None
+    cnt, dev_cnt = 1, 0
     try:
         print(f"Sending Request {cnt} to IMC...", end=""); cnt += 1
-        response = requests.get(f_url, auth=auth, headers=HEADERS, **kwargs)
-        if response.status_code == 200:
-            dev_details = response.json().get("device", {})
-            _link = response.json().get("link")
-            print(f"OK (details collected for {len(dev_details)} devices)")
+        page = await _get_page_async(f_url, auth, session, **kwargs)
+        _link, _total = page.get("link"), page.get("@total")
+        if page:
+            devs = _page_devs(page)
+            del page
+            dev_cnt += len(devs)
+            print(f"OK (details collected for {dev_cnt} devices)")
+            for dev in _project(devs, fields):
+                yield dev
 
         # if not called with return limits collect all devices via multiple calls if necessary
-        if not size:
+        if not size and _total and workers and workers > 1:
+            starts = list(range(start + page_size, int(_total), page_size))
+            if starts:
+                print(f"Sending {len(starts)} Requests to IMC ({workers} at a time)...", end="")
+                # pages are yielded in request order so device order matches the serial collection,
+                # at most workers pages beyond the one being consumed are fetched ahead
+                pending = deque()
+                try:
+                    for _start in starts:
+                        pending.append(asyncio.ensure_future(_get_page_async(_url(_start), auth, session, **kwargs)))
+                        if len(pending) > workers:
+                            devs = _page_devs(await pending.popleft())
+                            dev_cnt += len(devs)
+                            for dev in _project(devs, fields):
+                                yield dev
+                    while pending:
+                        devs = _page_devs(await pending.popleft())
+                        dev_cnt += len(devs)
+                        for dev in _project(devs, fields):
+                            yield dev
+                finally:  # consumer stopped early or a request failed
+                    for task in pending:
+                        task.cancel()
+                print(f"OK (details collected for {dev_cnt} devices)")
+        elif not size:
             while _link:
                 if isinstance(_link, dict):
                     if _link["@rel"] == "next":
@@ -74,24 +144,78 @@ def get_all_devs(auth, url, network_address=None, category=None, label=None, sta
                     print("link key in response is not as expected")
                     break
                 print(f"Sending Request {cnt} to IMC...", end=""); cnt += 1
-                response = requests.get(f_url, auth=auth, headers=HEADERS, **kwargs)
-                if response.status_code == 200:
-                    _link = response.json().get("link")
-                    dev_details = [*dev_details, *response.json().get("device", {})]
-                    print(f"OK (details collected for {len(dev_details)} devices)")
+                page = await _get_page_async(f_url, auth, session, **kwargs)
+                _link = page.get("link")
+                if page:
+                    devs = _page_devs(page)
+                    del page
+                    dev_cnt += len(devs)
+                    print(f"OK (details collected for {dev_cnt} devices)")
+                    for dev in _project(devs, fields):
+                        yield dev
 
     except Exception as e:
         # TODD Logging and exception
         print(f"Error\n{e}")
+    finally:
+        profiler.count("imc devices collected", dev_cnt)
+
+
+def iter_devs(*args, **kwargs) -> Iterator[dict]:
+    '''Blocking iter_devs_async (same args), pages are still requested only as the devices are consumed.'''
+    return _iter_sync(iter_devs_async(*args, **kwargs))
+
+
+async def get_all_devs_async(auth, url, network_address=None, category=None, label=None, start: int = 0,
+                             size: int = None, order_by: str = "id", total: bool = False, by_id: bool = False,
+                             by_ip: bool = False, fields: Sequence[str] = None, workers: int = None,
+                             session: requests.Session = None, **kwargs) -> Union[list, dict]:
+    '''Get details for all devices managed by HPE IMC via API.
+
+    Args:
+        auth (IMCAuth): IMCAuth object
+        url (str): Base url for IMC i.e. 'https://imc.consolepi.org:443'
+        network_address (str, optional): Return details for a specific device by ip. Defaults to None.
+        category (str, optional): Return details for all devices of a specific device category. Defaults to None.
+        label (str, optional): Return details for a specific device by device label. Defaults to None.
+        start (int, optional): The start record. Defaults to 0.
+        size (int, optional): The number of items to return. Defaults to None.
+        order_by (str, optional): What field the output is sorted by. Defaults to "id".
+        total (bool, optional): Return the total number of devices or not. Defaults to False.
+        by_id (bool, optional): If True will return a dict of dicts using dev id as key for each device. Defaults to False.
+        by_ip (bool, optional): If True will return a dict of dicts using dev ip as key for each device. Defaults to False.
+        fields (Sequence[str], optional): Only keep these keys for each device, "id"/"ip" are added when
+            needed for by_id/by_ip. Defaults to None (all keys).
+        workers (int, optional): Fetch the remaining pages concurrently using this many requests at a time.
+            The first request asks IMC for the total, so all page offsets are known up front. Defaults to None
+            (pages are collected one at a time following the next link).
+        session (requests.Session, optional): session used for the requests. Defaults to the shared pooled session.
+
+    Returns:
+        dict: By default returns list of dicts with no key where attributes for each device are in the containing dict.
+            Use by_id or by_ip to get a dict keyed by device id or ip.
+    '''
+    key = "id" if by_id else "ip" if by_ip else None
+    if fields and key and key not in fields:
+        fields = (key, *fields)
+    devs = iter_devs_async(auth, url, network_address=network_address, category=category, label=label, start=start,
+                           size=size, order_by=order_by, total=total, fields=fields, workers=workers,
+                           session=session, **kwargs)
 
     # TODO return my Response object
+    if by_id:
+        dev_details = {int(i["id"]): i async for i in devs}
+    elif by_ip:
+        dev_details = {i["ip"]: i async for i in devs}
+    else:
+        dev_details = [i async for i in devs]
     if dev_details:
-        if by_id:
-            return {int(i["id"]): i for i in dev_details}
-        elif by_ip:
-            return {i["ip"]: i for i in dev_details}
-        else:
-            return dev_details
+        return dev_details
+
+
+def get_all_devs(*args, **kwargs) -> Union[list, dict]:
+    '''Blocking get_all_devs_async (same args).'''
+    return asyncio.run(get_all_devs_async(*args, **kwargs))
 
 
 
@@ -106,4 +230,95 @@ def get_all_devs(auth, url, network_address=None, category=None, label=None, sta
     #         else:
     #             return dev_details['device']
     # except requests.exceptions.RequestException as error:
-    #     return "Error:\n" + str(error) + " get_dev_details: An Error has occured"
\ No newline at end of file
+    #     return "Error:\n" + str(error) + " get_dev_details: An Error has occured"
+
+
+async def get_dev_count_async(auth, url, session: requests.Session = None, **kwargs) -> Optional[int]:
+    '''Return the number of devices managed by IMC (a single 1 device page with total=true), None if IMC can't be reached.'''
+    session = session or imc_session
+    f_url = f"{url}/imcrs/plat/res/device?resPrivilegeFilter=false&start=0&size=1&total=true"
+    try:
+        total = (await _get_page_async(f_url, auth, session, **kwargs)).get("@total")
+    except requests.RequestException as e:
+        log.error(f"get_dev_count: Unable to get the device count from IMC\n{e}")
+        return None
+    return None if total is None else int(total)
+
+
+def get_dev_count(*args, **kwargs) -> Optional[int]:
+    '''Blocking get_dev_count_async (same args).'''
+    return asyncio.run(get_dev_count_async(*args, **kwargs))
+
+
+async def get_dev_details_async(auth, url, dev_id: int, fields: Sequence[str] = None,
+                                session: requests.Session = None, **kwargs) -> Optional[dict]:
+    '''Return details (only fields if provided) for a single device by IMC device id (None if IMC doesn't return it).'''
+    session = session or imc_session
+    try:
+        response = await in_executor(session.get, f"{url}/imcrs/plat/res/device/{dev_id}", auth=auth,
+                                     headers=HEADERS, **kwargs)
+    except requests.RequestException as e:
+        log.error(f"get_dev_details: Unable to get details for device {dev_id} from IMC\n{e}")
+        return None
+    if response.status_code == 200:
+        dev = response.json()
+        if dev:
+            return next(_project([dev], fields))
+
+
+def get_dev_details(*args, **kwargs) -> Optional[dict]:
+    '''Blocking get_dev_details_async (same args).'''
+    return asyncio.run(get_dev_details_async(*args, **kwargs))
+
+
+async def get_devs_by_id_async(auth, url, dev_ids: Iterable[int], threshold: float = 0.01, workers: int = 4,
+                               fields: Sequence[str] = None, session: requests.Session = None,
+                               **kwargs) -> Dict[int, dict]:
+    '''Get details for specific devices, using whichever strategy is cheaper.
+
+    When len(dev_ids) is at or below threshold * (number of devices in IMC) each device is
+    requested individually (workers at a time).  Above that the whole inventory is
+    collected with get_all_devs_async.
+
+    Args:
+        auth (IMCAuth): IMCAuth object
+        url (str): Base url for IMC i.e. 'https://imc.consolepi.org:443'
+        dev_ids (Iterable[int]): IMC device ids.
+        threshold (float, optional): crossover as a fraction of the inventory size. Defaults to 0.01.
+        workers (int, optional): concurrent requests. Defaults to 4.
+        fields (Sequence[str], optional): Only keep these keys for each device. Defaults to None (all keys).
+        session (requests.Session, optional): session used for the requests. Defaults to the shared pooled session.
+
+    Returns:
+        Dict[int, dict]: device details keyed by dev id.  Ids IMC doesn't return are left out,
+            after a bulk collection every device in IMC is included.
+    '''
+    session = session or imc_session
+    dev_ids = list(dict.fromkeys(int(dev_id) for dev_id in dev_ids))
+    if not dev_ids:
+        return {}
+
+    dev_count = await get_dev_count_async(auth, url, session=session, **kwargs)
+    crossover = None if dev_count is None else int(dev_count * threshold)
+    if crossover is not None and len(dev_ids) <= crossover:
+        log.debug(f"device lookup: targeted, {len(dev_ids)} of {dev_count} devices (crossover {crossover} @ {threshold})")
+        print(f"Sending {len(dev_ids)} device Requests to IMC ({workers} at a time)...", end="")
+        sem = asyncio.Semaphore(workers)
+
+        async def _details(dev_id: int) -> Optional[dict]:
+            async with sem:
+                return await get_dev_details_async(auth, url, dev_id, fields=fields, session=session, **kwargs)
+
+        details = await asyncio.gather(*[_details(dev_id) for dev_id in dev_ids])
+        devs = {dev_id: dev for dev_id, dev in zip(dev_ids, details) if dev}
+        print(f"OK (details collected for {len(devs)} devices)")
+        return devs
+
+    log.debug(f"device lookup: bulk, {len(dev_ids)} of {dev_count or '?'} devices (crossover {crossover} @ {threshold})")
+    return await get_all_devs_async(auth, url, by_id=True, fields=fields, workers=workers, session=session,
+                                    **kwargs) or {}
+
+
+def get_devs_by_id(*args, **kwargs) -> Dict[int, dict]:
+    '''Blocking get_devs_by_id_async (same args).'''
+    return asyncio.run(get_devs_by_id_async(*args, **kwargs))
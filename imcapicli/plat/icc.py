@@ -5,10 +5,13 @@
 """
 This module adds some new and override methods to the pyhpeimc module
 """
-from imcapicli import MyLogger, Response, log
+from imcapicli import MyLogger, Response, log, session as imc_session
+from imcapicli.client import in_executor
+from imcapicli.profiling import profiler
 from typing import List, Union
 # from . import Response
 
+import asyncio
 import requests
 import os
 import logging
@@ -19,8 +22,10 @@ from pyhpeimc.auth import HEADERS
 DEV_SYSTEM = os.getenv("NAME") == "wellswa6"
 
 # Note filter by dev_ids dev_ips not implemented yet
-def get_config_center_dict(auth, url, dev_ids: Union[List[str], str] = None,
-                           dev_ips: Union[List[str], str] = None, log: Union[MyLogger, logging.Logger] = log) -> Response:
+async def get_config_center_dict_async(auth, url, dev_ids: Union[List[str], str] = None,
+                                     dev_ips: Union[List[str], str] = None,
+                                     log: Union[MyLogger, logging.Logger] = log,
+                                     session: requests.Session = None) -> Response:
     """Get Configuration Center details for all devices in IMC.
 
     Optionally filter return to include specified list of dev_ids, or dev ips
@@ -30,6 +35,7 @@ def get_config_center_dict(auth, url, dev_ids: Union[List[str], str] = None,
         url (str): base url of imc
         dev_ids (List[str], optional): List of dev_ids to return. Defaults to None.
         dev_ips (List[str], optional): List of dev_ips to return. Defaults to None.
+        session (requests.Session, optional): session used for the request. Defaults to the shared pooled session.
 
     Returns:
         dict: CfgCenter data for each device (name, model, SW Version, last Backup, latest avail SW)
@@ -37,11 +43,16 @@ def get_config_center_dict(auth, url, dev_ids: Union[List[str], str] = None,
     """
     f_url = url + "/imcrs/icc/deviceCfg/configurationCenter"
     log.info("Collecting info from Config Center for all devices")
-    resp = Response(requests.get, f_url, auth=auth, headers=HEADERS, verify=False)
+    session = session or imc_session
+    resp = await in_executor(Response, session.get, f_url, auth=auth, headers=HEADERS, verify=False)
     if resp.ok:
         resp.output = {int(x["deviceId"]): {k: v for k, v in x.items() if k != "deviceId"} for x in  resp.output.get("deviceInfo", [])}
         log.debug(f"Collected Config Center Details for {len(resp.output)} devices")
+        profiler.count("imc config center devices", len(resp.output))
 
     return resp
 
 
+def get_config_center_dict(*args, **kwargs) -> Response:
+    """Blocking get_config_center_dict_async (same args)."""
+    return asyncio.run(get_config_center_dict_async(*args, **kwargs))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Per stage timing and counters (logparser --profile).
+
+Disabled by default, when disabled stages and count() return straight away, so the
+instrumentation can stay in place.  Stages are meant for coarse steps, not per line work.
+
+    from imcapicli.profiling import profiler
+
+    with profiler.stage("parse log"):
+        ...
+    profiler.count("lines matched", n)
+
+    @profiler.stage("report")
+    def report(): ...
+"""
+
+import cProfile
+import json
+import threading
+import time
+from contextlib import ContextDecorator
+from pathlib import Path
+from typing import Dict, List, Union
+
+
+class _Stage(ContextDecorator):
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self._start = threading.local()
+
+    def __enter__(self):
+        # checked here rather than in stage() as decorators are created before --profile is parsed
+        self._start.value = time.perf_counter() if self.profiler.enabled else None
+        return self
+
+    def __exit__(self, *exc):
+        if self._start.value is not None:
+            self.profiler.add_time(self.name, time.perf_counter() - self._start.value)
+        return False
+
+
+class Profiler:
+    '''Wall time per stage plus named counters.
+
+    Stages can be entered more than once (and from several threads), the time and number of
+    calls are accumulated.  Time for stages that run concurrently adds up to more than the
+    wall time of the command.
+    '''
+    def __init__(self):
+        self.enabled = False
+        self.stages: Dict[str, List[float]] = {}  # name: [calls, seconds]
+        self.counters: Dict[str, int] = {}
+        self._cprofile = None
+        self._start = None
+        self._lock = threading.Lock()
+
+    def enable(self, cprofile: bool = False) -> None:
+        self.enabled = True
+        self._start = time.perf_counter()
+        if cprofile:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def disable(self) -> None:
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.enabled = False
+
+    def stage(self, name: str) -> ContextDecorator:
+        '''Return a context manager / decorator that adds the time spent in it to stage name.'''
+        return _Stage(self, name)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stage = self.stages.setdefault(name, [0, 0.0])
+            stage[0] += 1
+            stage[1] += seconds
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def elapsed(self) -> float:
+        return 0.0 if self._start is None else time.perf_counter() - self._start
+
+    def as_dict(self) -> dict:
+        return {
+            "elapsed": self.elapsed,
+            "stages": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def report(self) -> str:
+        '''Return the stage breakdown and counters as text.'''
+        elapsed = self.elapsed
+        width = max([len(name) for name in [*self.stages, *self.counters]] + [len("total (wall)")])
+        lines = [f"{'Stage':{width}}  {'Calls':>6}  {'Seconds':>9}  {'%':>6}", f"{'-' * width}  ------  ---------  ------"]
+        for name, (calls, seconds) in self.stages.items():
+            pct = seconds / elapsed * 100 if elapsed else 0
+            lines.append(f"{name:{width}}  {calls:>6}  {seconds:>9.3f}  {pct:>5.1f}%")
+        lines.append(f"{'total (wall)':{width}}  {'':>6}  {elapsed:>9.3f}")
+        if self.counters:
+            lines += ["", f"{'Counter':{width}}  {'Value':>16}", f"{'-' * width}  ----------------"]
+            lines += [f"{name:{width}}  {value:>16,}" for name, value in self.counters.items()]
+        return "\n".join(lines)
+
+    def save(self, file: Union[str, Path]) -> Path:
+        '''Write the profile to file, a cProfile dump if cprofile was enabled, otherwise json.'''
+        file = Path(file)
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(str(file))
+        else:
+            file.write_text(json.dumps(self.as_dict(), indent=4))
+        return file
+
+
+profiler = Profiler()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Tiered dev id -> ip resolution (logparser sshv1).
+
+Tiers are asked in order, each only for the ids the tiers before it didn't resolve:
+    log    the "dev id: ..., ip: ..." lines parsed from the log(s), no I/O
+    cache  the device inventory cached locally (imc_cache.db), within imc.cache_ttl
+    imc    the inventory the caller collects from IMC for whatever is left (inventory_tier)
+so when the log has every device the ips are known without touching IMC.  The imc tier is
+only asked once the others missed, it is handed the caller's (memoized) collection so the
+devices it needs are collected with the rest of the IMC data instead of in a second round.
+"""
+
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .cache import DEVICE, ImcCache
+
+Lookup = Callable[[List[int]], Dict[int, str]]  # ids -> {id: ip} for the ids the tier has
+
+
+def log_tier(id_map: Dict[int, str]) -> Lookup:
+    '''Return a lookup over id_map ({dev id: ip} parsed from the log).'''
+    def lookup(dev_ids: List[int]) -> Dict[int, str]:
+        return {dev: id_map[dev] for dev in dev_ids if id_map.get(dev)}
+    return lookup
+
+
+def cache_tier(cache: ImcCache, source: str = DEVICE) -> Lookup:
+    '''Return a lookup over the devices cached (and fresh) for source.'''
+    def lookup(dev_ids: List[int]) -> Dict[int, str]:
+        return {dev: data["ip"] for dev, data in cache.get_devs(source, dev_ids).items() if data.get("ip")}
+    return lookup
+
+
+def inventory_tier(fetch: Callable[[], Dict[int, dict]]) -> Lookup:
+    '''Return a lookup over the inventory ({dev id: device}) fetch returns, fetch is only called if the tier is asked.'''
+    def lookup(dev_ids: List[int]) -> Dict[int, str]:
+        devs = fetch() or {}
+        return {dev: devs[dev]["ip"] for dev in dev_ids if (devs.get(dev) or {}).get("ip")}
+    return lookup
+
+
+class IpResolver:
+    '''Resolves dev ids to ips through tiers, keeping hit / miss counts for each.
+
+    Args:
+        tiers (Tuple[str, Lookup]): (name, lookup) in the order they are asked.
+    '''
+    def __init__(self, *tiers: Tuple[str, Lookup]):
+        self.tiers = list(tiers)
+        self.stats: Dict[str, List[int]] = {name: [0, 0] for name, _ in self.tiers}  # name: [hits, misses]
+
+    def __repr__(self):
+        return f"<{self.__module__}.{type(self).__name__} {' > '.join(name for name, _ in self.tiers)}>"
+
+    def resolve(self, dev_ids: Iterable[int]) -> Dict[int, str]:
+        '''Return {dev id: ip} for the dev_ids any tier resolved, tiers after the last miss aren't called.'''
+        missing, ips = list(dict.fromkeys(dev_ids)), {}
+        for name, lookup in self.tiers:
+            if not missing:
+                break
+            found = lookup(missing)
+            ips.update(found)
+            missing = [dev for dev in missing if dev not in found]
+            self.stats[name][0] += len(found)
+            self.stats[name][1] += len(missing)
+        return ips
+
+    def report(self) -> str:
+        '''Return "<tier> <hits> hits / <misses> misses" for each tier.'''
+        return ", ".join(f"{name} {hits} hits / {misses} misses" for name, (hits, misses) in self.stats.items())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Memoized parse results (logparser sshv1, errors, sessions).
+
+A result is stored under a key made from the identity of the log (size, mtime and a hash
+of a few sampled blocks of its content), the kind of parse and its options, so parsing an
+unchanged (i.e. archived) log again is a file read.  Results are pickled, one file per key,
+and the least recently used are removed once the cache is over its size limit.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Optional, Tuple, Union
+
+from .profiling import profiler
+
+RESULT_VERSION = 2  # bump when a cached result's format or the parse producing it changes
+SAMPLE_SIZE = 64 * 1024
+SAMPLES = 3  # head, middle and tail
+
+
+def fingerprint(path: Union[str, Path]) -> Tuple[int, int, str]:
+    '''Return (size, mtime, hash of SAMPLES blocks spread across the file) for path.'''
+    path = Path(path)
+    stat = path.stat()
+    sha = hashlib.sha1()
+    with path.open("rb") as f:
+        for i in range(SAMPLES):
+            f.seek(max(stat.st_size - SAMPLE_SIZE, 0) * i // (SAMPLES - 1))
+            sha.update(f.read(SAMPLE_SIZE))
+    return stat.st_size, stat.st_mtime_ns, sha.hexdigest()
+
+
+class ResultCache:
+    '''Parse results on disk with LRU eviction by total size.
+
+    get() and put() do nothing when the cache is disabled (logparser --no-cache).
+
+    Args:
+        cache_dir (Path): directory results are stored in, created when the first result is.
+        max_size (int, optional): bytes kept, least recently used results are removed past it. Defaults to 256MB.
+    '''
+    def __init__(self, cache_dir: Union[str, Path], max_size: int = 256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.enabled = True
+
+    def __repr__(self):
+        return f"<{self.__module__}.{type(self).__name__} {self.cache_dir} max: {self.max_size}>"
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ResultCache":
+        '''Return ResultCache for out/results with the size from imc.logparse.result_cache_mb in config.yaml.'''
+        cfg = (config.get("imc") or {}).get("logparse") or {}
+        return cls(config.base_dir / "out" / "results", max_size=int(cfg.get("result_cache_mb", 256) * 1024 * 1024))
+
+    def key(self, path: Union[str, Path], kind: str, **options) -> Optional[str]:
+        '''Return the key for the kind of parse of the log at path with options (json serializable), None if disabled.'''
+        if not self.enabled:
+            return None
+        data = json.dumps([RESULT_VERSION, kind, fingerprint(path), options], sort_keys=True)
+        return hashlib.sha1(data.encode()).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl"
+
+    def get(self, key: Optional[str]) -> Optional[Any]:
+        '''Return the result stored for key, None if there isn't one.'''
+        if not self.enabled or key is None:
+            return None
+        file = self._file(key)
+        try:
+            with file.open("rb") as f:
+                value = pickle.load(f)
+        except Exception:  # not cached, or damaged (it's replaced by the next put)
+            return None
+        os.utime(file)  # mtime is the last use
+        profiler.count("parse results from cache")
+        return value
+
+    def put(self, key: Optional[str], value: Any) -> None:
+        '''Store value for key then evict least recently used results until the cache fits max_size.'''
+        if not self.enabled or key is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        file = self._file(key)
+        tmp = file.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(file)  # readers never see a partial result
+        self.evict(keep=file)
+
+    def evict(self, keep: Path = None) -> int:
+        '''Remove least recently used results until the cache fits max_size, returns the number removed.'''
+        entries = []
+        for file in self.cache_dir.glob("*.pkl"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, file))
+        total, removed = sum(size for _, size, _ in entries), 0
+        for _, size, file in sorted(entries):
+            if total <= self.max_size:
+                break
+            if file == keep:
+                continue
+            file.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for file in self.cache_dir.glob("*.pkl"):
+            file.unlink(missing_ok=True)
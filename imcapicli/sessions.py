@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+#
+# Author: Wade Wells github/Pack3tL0ss
+"""
+Per thread session reconstruction for imcupgdm logs.
+
+IMC runs each device job on a worker thread, every line the job logs is tagged with
+THREAD(<id>) and the job ends with a "Finished, result:" line followed by the device
+(cli) output up to the next [THREAD line.  SessionParser follows the THREAD( lines in
+one pass keeping the open session for each thread, so the work per line is constant
+no matter how many threads/devices are in the log.  What the parser needs from a line
+is reduced to a LineEvent first, which is done in worker processes for a log scanned
+with jobs > 1.
+"""
+
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .detectors import Detector
+from .linematch import LineAttrs, LineMatcher
+from .logsource import Line, LogFile
+
+EXECUTER_MATCH = "CExecuter::CExecuter()"
+FINISHED_MATCH = "Finished, result:"
+SPAWN_MATCH = "pid:"
+VERSION_MATCH = "version = "
+# kind of a LineEvent
+RESULT, STEP, PID, VERSION = "result", "step", "pid", "version"
+LineEvent = Tuple[int, str, str, Optional[int], Optional[str], Optional[str], Optional[str], bool, bool,
+                  Optional[str], Union[str, int, None]]
+
+
+class Session:
+    '''One device job on one thread.
+
+    Attributes:
+        thread (str): thread id
+        start (int): byte offset of the first line of the session
+        start_time (str): timestamp of the first line
+        dev_id (int): IMC device id
+        dev_ip (str): device ip
+        adapter (str): IMC adapter used for the device
+        login_type (str): IMC login type ("2" is ssh)
+        steps (List[str]): "Begin ..." steps logged
+        pids (List[int]): pids spawned (ssh/telnet)
+        versions (List[str]): versions logged
+        finished (int): byte offset of the "Finished, result:" line (None if the session didn't finish)
+        end_time (str): timestamp of the "Finished, result:" line
+        result (str): value following "Finished, result:"
+        end (int): byte offset of the [THREAD line following the cli output (None if it runs to the end of the log)
+    '''
+    __slots__ = ("thread", "start", "start_time", "dev_id", "dev_ip", "adapter", "login_type", "steps",
+                 "pids", "versions", "finished", "end_time", "result", "end")
+
+    def __init__(self, thread: str, start: int, start_time: str = None):
+        self.thread = thread
+        self.start = start
+        self.start_time = start_time
+        self.dev_id = None
+        self.dev_ip = None
+        self.adapter = None
+        self.login_type = None
+        self.steps = []
+        self.pids = []
+        self.versions = []
+        self.finished = None
+        self.end_time = None
+        self.result = None
+        self.end = None
+
+    def __repr__(self):
+        return (f"<{self.__module__}.{type(self).__name__} thread: {self.thread} dev id: {self.dev_id} "
+                f"result: {self.result}>")
+
+    @property
+    def ssh(self) -> Optional[bool]:
+        return None if self.login_type is None else self.login_type == "2"
+
+
+def line_event(matcher: LineMatcher, line: Line) -> LineEvent:
+    '''Return what SessionParser uses from a THREAD( line, extracted without any parser state.
+
+    A plain tuple (offset, timestamp, thread, dev id, dev ip, adapter, login type, "[THREAD" in the line,
+    CExecuter line, kind, value) as it's pickled by the workers for every line, kind is RESULT, STEP,
+    PID, VERSION or None.
+    '''
+    text = line.text
+    try:
+        attrs = matcher.match(text)
+    except ValueError:
+        attrs = LineAttrs(LineMatcher.thread(text))
+    kind = value = None
+    if FINISHED_MATCH in text:
+        kind, value = RESULT, text.split(FINISHED_MATCH)[-1].strip()
+    elif "Begin" in text:
+        kind, value = STEP, " ".join(text.split("]")[2:]).strip()
+    elif "spawn" in text and SPAWN_MATCH in text:
+        pid = text.split(SPAWN_MATCH)[1].split()
+        if pid:
+            kind, value = PID, int(pid[0]) if pid[0].isdigit() else pid[0]
+    elif VERSION_MATCH in text:
+        kind, value = VERSION, text.split(VERSION_MATCH)[-1].strip()
+    return (line.offset, LineMatcher.timestamp(text), *attrs, "[THREAD" in text, EXECUTER_MATCH in text, kind, value)
+
+
+class SessionParser:
+    '''Groups THREAD( lines into per thread Sessions.
+
+    A session starts with a CExecuter::CExecuter() line (or the first line seen for a thread) and
+    is complete once the device output following its "Finished, result:" line ends.  A session
+    that is replaced before it finishes (the thread moved on to another device) is returned as is.
+
+    Args:
+        matcher (LineMatcher): extracts dev id / ip / adapter / login type.
+    '''
+    def __init__(self, matcher: LineMatcher):
+        self.matcher = matcher
+        self.open: Dict[str, Session] = {}
+        self._done: Optional[Session] = None  # finished, its cli output runs until the next [THREAD line
+        self.lines = 0
+
+    def parse(self, lines: Iterable[Line]) -> Iterator[Session]:
+        '''Yield each session as it completes.
+
+        lines only needs to include the THREAD( lines (i.e. LogFile.grep(b"THREAD(")).
+        Sessions still open when lines runs out are kept, use close() to get them.
+        '''
+        return self.feed(line_event(self.matcher, line) for line in lines)
+
+    def feed(self, events: Iterable[LineEvent]) -> Iterator[Session]:
+        '''parse() for lines already reduced to LineEvents (line_event() tuples, i.e. from LogFile.grep_map workers).'''
+        sessions = self.open
+        for offset, ts, thread, dev_id, dev_ip, adapter, login_type, thread_line, executer, kind, value in events:
+            self.lines += 1
+            if thread_line and self._done is not None:
+                self._done.end = offset
+                yield self._done
+                self._done = None
+
+            session = sessions.get(thread)
+            if session is None or executer or (
+                dev_id is not None and session.dev_id is not None and dev_id != session.dev_id
+            ):
+                if session is not None:
+                    yield session
+                session = sessions[thread] = Session(thread, offset, ts)
+
+            if dev_id is not None:
+                if session.dev_id is None:
+                    session.dev_id = dev_id
+                if session.dev_ip is None:
+                    session.dev_ip = dev_ip
+                if adapter is not None:
+                    session.adapter = adapter
+                if login_type is not None:
+                    session.login_type = login_type
+
+            if kind is None:
+                continue
+            if kind == RESULT:
+                session.finished = offset
+                session.end_time = ts
+                session.result = value
+                del sessions[thread]
+                if self._done is not None:  # no [THREAD line between the two Finished lines
+                    yield self._done
+                self._done = session
+            elif kind == STEP:
+                session.steps.append(value)
+            elif kind == PID:
+                session.pids.append(value)
+            else:
+                session.versions.append(value)
+
+    def parse_log(self, log_file: LogFile, start: int = None, end: int = None,
+                  taps: Sequence[Detector] = ()) -> Iterator[Session]:
+        '''parse_all() over the THREAD( lines of log_file, extracted in its worker processes when it has jobs > 1.
+
+        taps (i.e. an events.EventTap) are fed every line with one of their markers in the same pass,
+        the lines are then decoded here rather than reduced to LineEvents by the workers.
+        '''
+        if taps:
+            events = self._tap(log_file, taps, start, end)
+        else:
+            events = log_file.grep_map(partial(line_event, self.matcher), b"THREAD(", start=start, end=end)
+        yield from self.feed(events)
+        yield from self.close()
+
+    def _tap(self, log_file: LogFile, taps: Sequence[Detector], start: Optional[int],
+             end: Optional[int]) -> Iterator[LineEvent]:
+        markers = dict.fromkeys([b"THREAD(", *(m.encode() for tap in taps for m in tap.markers)])
+        for line in log_file.grep(*markers, start=start, end=end, count=False):
+            for tap in taps:
+                tap.feed(line, log_file)
+            if "THREAD(" in line.text:
+                yield line_event(self.matcher, line)
+
+    def parse_all(self, lines: Iterable[Line]) -> Iterator[Session]:
+        '''Yield every session in lines, the ones still in progress when lines runs out last.'''
+        yield from self.parse(lines)
+        yield from self.close()  # only once lines are exhausted
+
+    def close(self) -> List[Session]:
+        '''Return the sessions still in progress at the end of the log (finished one first) and reset.'''
+        sessions = [] if self._done is None else [self._done]
+        sessions += sorted(self.open.values(), key=lambda s: s.start)
+        self.open, self._done = {}, None
+        return sessions
@@ -6,24 +6,109 @@
 
 
 import logging
-from typer.params import Option
-from imcapicli import Response, config, imc, log
+from imcapicli import config, log
+from imcapicli.cache import DEVICE, ICC, ImcCache
+from imcapicli.checkpoint import Checkpoint
+from imcapicli.detectors import DETECTORS, CliFailed, Detector, ErrorScanner, Hit, NotAuthorized, SshV1, create as create_detectors
+from imcapicli.devstore import DevStore
+from imcapicli.events import EVENT_TYPES, FIELDS as EVENT_FIELDS, EventParser, EventStore, EventTap
+from imcapicli.linematch import LineAttrs, LineMatcher
+from imcapicli.logindex import LogIndex
+from imcapicli.logsource import LogFile
+from imcapicli.profiling import profiler
+from imcapicli.resolver import IpResolver, cache_tier, inventory_tier, log_tier
+from imcapicli.resultcache import ResultCache
+from imcapicli.sessions import Session, SessionParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from contextlib import contextmanager
+from itertools import chain, islice
+from enum import Enum
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 import typer
+import glob
 import json
-from tabulate import tabulate
+import os
+import re
+import time
 
 app = typer.Typer()
 
 
-DEVICES = {}
+class ProfileFormat(str, Enum):
+    json = "json"
+    cprofile = "cprofile"
+
+
+def _profile_report(command: str, profile_out: ProfileFormat = None) -> None:
+    profiler.disable()
+    typer.echo(f"\n-- Profile ({command}) --\n{profiler.report()}", err=True)
+    if profile_out:
+        ext = "prof" if profile_out == ProfileFormat.cprofile else "json"
+        out_file = log.log_file.parent / f"profile-{command}-{time.strftime('%Y%m%d-%H%M%S')}.{ext}"
+        typer.echo(f"Profile saved to {profiler.save(out_file)}", err=True)
+
+
+@app.callback()
+def main(ctx: typer.Context,
+         profile: bool = typer.Option(False, "--profile", help="Show the time spent in each stage when the command completes"),
+         profile_out: ProfileFormat = typer.Option(None, "--profile-out", help="Also save the profile to logs/ (implies --profile)"),
+         no_cache: bool = typer.Option(False, "--no-cache", help="Parse the log(s) again, memoized parse results are neither used nor saved")) -> None:
+    result_cache.enabled = not no_cache
+    if profile or profile_out:
+        profiler.enable(cprofile=profile_out == ProfileFormat.cprofile)
+        ctx.call_on_close(partial(_profile_report, ctx.invoked_subcommand, profile_out))
+
+
 DEV_ID_MATCH = ["dev_id:", " ID: ", "DevID=", ",devID=", "Device Id:", "dev id: "]
 DEV_IP_MATCH = ["ip: ", "DevIP =", "dev_ip ="]
+MATCHER = LineMatcher(DEV_ID_MATCH, DEV_IP_MATCH)
+result_cache = ResultCache.from_config(config)  # memoized parse results keyed by log fingerprint + options
+# inventory fields used by sshv1 (categoryId is only needed for developer mode)
+DEV_FIELDS = ("id", "ip", "sysName", "location", "deviceModel", "currentVersion", "categoryId")
 ERR_STR = typer.style("ERROR:", fg=typer.colors.RED)
 WAR_STR = typer.style("WARNING:", fg=typer.colors.YELLOW)
-
-def get_lines(file: Path = None):
+LOG_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")  # imcupgdm.YYYY-MM-DD.txt
+IN_HELP = "The logfile to parse, a directory or glob (quoted) parses every log in it (overrides value if provided in config)"
+TIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}([ T]\d{2}(:\d{2}(:\d{2}(\.\d+)?)?)?)?|\d{2}:\d{2}(:\d{2}(\.\d+)?)?")
+SINCE_HELP = 'Only parse lines logged at or after this time i.e. "2020-11-17 08:00", a time alone ("08:00") is on the day of the log'
+UNTIL_HELP = "Only parse lines logged before this time"
+
+
+def _time_option(value: str) -> str:
+    '''--since / --until callback, returns value in the format of the log timestamps.
+
+    The format is checked with TIME_RE and the date / time with strptime, so "2020-13-45" or
+    "25:00" are rejected rather than compared as strings.
+    '''
+    if value is None:
+        return value
+    if not TIME_RE.fullmatch(value):
+        raise typer.BadParameter(f'{value} is not "YYYY-MM-DD[ HH[:MM[:SS]]]" or "HH:MM[:SS]"')
+    value = value.replace("T", " ")
+    date, clock = (value[:10], value[11:]) if value[4:5] == "-" else ("", value)
+    try:
+        if date:
+            datetime.strptime(date, "%Y-%m-%d")
+        if clock:
+            datetime.strptime(clock.split(".")[0], ("%H", "%H:%M", "%H:%M:%S")[clock.count(":")])
+    except ValueError as e:
+        raise typer.BadParameter(f"{value} is not a valid date / time ({e})")
+    return value
+
+
+def _date_time_option(value: str) -> str:
+    '''query --since / --until callback, _time_option but a time must be on a date (events from many logs are queried).'''
+    value = _time_option(value)
+    if value is not None and value[4:5] != "-":
+        raise typer.BadParameter(f'{value} has no date, use "YYYY-MM-DD[ HH[:MM[:SS]]]"')
+    return value
+
+
+def _find_log(file: Path = None) -> Path:
+    '''Return the path for file (default from config), which may be relative to the script dir or the in dir.'''
     if file is None:
         file = config.config.get("imc", {}).get("logparse", {}).get("file")
         if not file:
@@ -36,122 +121,90 @@ def get_lines(file: Path = None):
 
     # allow file relative to where script ran from or relative to
     # script dir automatically add 'in' if not in root of script dir
-    if not f.is_file():
-        if Path(Path(__file__).parent / file).is_file():
+    if not f.exists():
+        if Path(Path(__file__).parent / file).exists():
             f = Path(__file__).parent / file
-        elif Path(Path(__file__).parent / "in" / file).is_file():
+        elif Path(Path(__file__).parent / "in" / file).exists():
             f = Path(__file__).parent / "in" / file
 
+    return f
+
+def _window(log_file: LogFile, since: str = None, until: str = None) -> LogFile:
+    '''Narrow log_file to the lines logged at or after since and before until (found by binary search).
+
+    A time without a date is on the date of the first line of the log.
+    '''
+    if since or until:
+        day = (log_file.timestamp(0) or "")[:11]  # "YYYY-MM-DD "
+        since, until = [t if t is None or "-" in t else f"{day}{t}" for t in (since, until)]
+        log_file.start, log_file.end = log_file.time_range(since, until)
+    return log_file
+
+def open_log(path: Path, jobs: int = 1, since: str = None, until: str = None) -> LogFile:
+    '''Return LogFile for path, exits with the reason if it's a compressed log that can't be read.'''
+    try:
+        return _window(LogFile(path, jobs=jobs), since, until)
+    except (ImportError, ValueError) as e:
+        typer.echo(f"{ERR_STR} {e}")
+        raise typer.Exit(code=1)
+
+def get_lines(file: Path = None, jobs: int = 1, since: str = None, until: str = None) -> LogFile:
+    f = _find_log(file)
     if f.is_file() and f.stat().st_size > 0:
-        with f.open() as _f:
-            lines = _f.readlines()
-        return lines
+        return open_log(f, jobs=jobs, since=since, until=until)
     else:
         typer.echo(f"{f} File Not Found or empty")
         raise typer.Exit(code=1)
 
+def _log_date(path: Path) -> str:
+    '''Return the date of the log (YYYY-MM-DD) from its name, or its modification time if the name has none.'''
+    match = LOG_DATE_RE.search(path.name)
+    return match.group() if match else time.strftime("%Y-%m-%d", time.localtime(path.stat().st_mtime))
+
+def get_log_files(file: Path = None) -> List[Path]:
+    '''Return the log file(s) for file, a single log, a directory of logs or a glob i.e. "in/imcupgdm.*.txt".
+
+    Empty files and sidecar indexes are skipped, logs are sorted by date (see _log_date) then name.
+    '''
+    f = _find_log(file)
+    if f.is_file():
+        files = [f]
+    elif f.is_dir():
+        files = [p for p in f.iterdir() if p.is_file() and not p.name.startswith(".")]
+    else:
+        # glob relative to where script ran from, the script dir or the in dir (first with a match)
+        for base in [Path(), Path(__file__).parent, Path(__file__).parent / "in"]:
+            files = [Path(p) for p in glob.glob(str(base / f)) if Path(p).is_file()]
+            if files:
+                break
+
+    files = [p for p in files if p.suffix != ".idx" and p.stat().st_size > 0]
+    if not files:
+        typer.echo(f"{f} File Not Found or empty")
+        raise typer.Exit(code=1)
+    return sorted(files, key=lambda p: (_log_date(p), p.name))
 
-class ImcDev:
-    def __init__(self, dev_id: int = None, dev_ip: str = None, steps: list = [], start: str = None,
-                 pid: Union[int, list] = [], children: list = [], adapter: str = None, login_type: str = None):
-        print("__init__")
-        self._user = None
-        self._userip = None
-        self.dev_id = dev_id
-        self.dev_ip = dev_ip
-        self.steps = steps
-        self.start = start
-        if pid and isinstance(pid, (str, int)):
-            pid = [int(pid)]
-        elif pid is None:
-            pid = []
-        self.pid = pid
-        self.children = children
-        self.version = []
-        self.adapter = adapter
-        self.login_type = login_type
-        if login_type:
-            self.login_type = "ssh" if login_type == "2" else "!!NOT SSH!!"
-
-
-
-    # def __call__(self, *args, **kwargs):
-    #     self.update(*args, **kwargs)
-
-    def __call__(self, dev_id: int = None, dev_ip: str = None, steps: list = [], start: str = None,
-                 pid: int = [], children: list = [],  adapter: str = None, login_type: str = None,
-                 **kwargs):
-        print("__call__")
-        self.dev_id = dev_id
-        self.dev_ip = dev_ip
-        self.steps = steps
-        self.start = start
-        if pid and isinstance(pid, (str, int)):
-            pid = [int(pid)]
-
-        _pid = [p for p in [*self.pid, *pid] if p not in self.pid]
-        self.pid = _pid
-        self.children = children
-        self.version = []
-        self.adapter = adapter
-        if login_type:
-            self.login_type = "ssh" if login_type == "2" else "!!NOT SSH!!"
-
-        return self
-
-
-    # def update(self, dev_id: int = None, dev_ip: str = None, steps: list = [], start: str = None,
-    #            pid: int = [], children: list = [],  adapter: str = None, login_type: str = None,
-    #            **kwargs):
-    #     self.dev_id = dev_id
-    #     self.dev_ip = dev_ip
-    #     self.steps = steps
-    #     self.start = start
-    #     if pid and isinstance(pid, (str, int)):
-    #         pid = [int(pid)]
-
-    #     self.pid = [p for p in [*self.pid, *pid] if p not in self.pid]
-    #     self.children = children
-    #     self.version = []
-    #     self.adapter = adapter
-    #     self.login_type = "ssh" if login_type and login_type == "2" else "!!NOT SSH!!"
-
-
-
-    @property
-    def user(self):
-        if hasattr(self, "_user"):
-            return self._user
-
-    @user.setter
-    def user(self, new_value):
-        self._user = self._hex_to_str(new_value)
-        return self._user
-
-    def _hex_to_str(var: Union[str, hex]):
-        if var:
-            return var if not isinstance(var, hex) else bytes.fromhex(var).decode("UTF-8")
-
-    def __str__(self):
-        return "\n".join(f"\t{k}: {v}" for k, v in self.__dict__)
-
-    def __iter__(self):
-        for k, v in self.__dict__:
-            yield f"\t{k}: {v}"
 
 # cli script output
 def get_cli_output():
-    lines = get_lines()
+    log_file = get_lines()
     _print = False
-    for line in lines:
-        if _print and line.strip() != "":
-            if "[THREAD" in line:
+    for line in log_file.grep(b"Finished, result:", b"[THREAD", count=False):
+        if _print:
+            if "[THREAD" in line.text:
                 _print = False
+                for _line in log_file.lines(block_start, line.offset, idx=0):
+                    if _line.text.strip() != "":
+                        print(_line.text, end="")
                 print("\n -------------- \n")
-            else:
-                print(line, end="")
-        elif "Finished, result:" in line:
+        elif "Finished, result:" in line.text:
             _print = True
+            block_start = log_file.line_end(line.offset)
+
+    if _print:
+        for _line in log_file.lines(block_start, idx=0):
+            if _line.text.strip() != "":
+                print(_line.text, end="")
 
 # @app.command()
 def get_device_errors(error: str = typer.Argument(None)):
@@ -161,33 +214,27 @@ def get_device_errors(error: str = typer.Argument(None)):
         typer.echo("imc, logparse, user is missing in config, this is the user IMC uses to log into devices")
         raise typer.Exit(code=1)
 
-    lines = get_lines()
-    _print = False
-    dev_ip = ''
-    dev_lines = []
+    log_file = get_lines()
+    not_authz = NotAuthorized.error
     dev_ips = []
-    _error = None
-    for idx, line in enumerate(lines):
-        if f"{parse_user}@" in line:
-            dev_ip = line.split("@")[1].split("'")[0]
-        if _print and line.strip() != "":
-            if "[THREAD" in line:
-                _print = False
-                dev_lines.insert(0, f"\n -------{dev_ip}------- \n")
-                if _error:
-                    typer.echo("".join(dev_lines))
-                    dev_ips.append(dev_ip)
-                    _error = None
-                dev_lines = []
-            else:
-                if "Not authorized to run this command" in line:
-                    _error = "cmd_authz"
+    pos = log_file.start
+    idx = log_file.line_idx(pos)
+    # one hit for each block of device output (between "Finished, result:" and the next [THREAD line) with the error
+    for hit in ErrorScanner(create_detectors([NotAuthorized.name], user=parse_user)).scan(log_file):
+        block_start = log_file.line_end(hit.offset)
+        block_end = log_file.find(b"[THREAD", block_start)
+        block_end = log_file.end if block_end < 0 else log_file.line_start(block_end)
+        idx += log_file.count_lines(pos, block_start)
+        pos = block_start
+        dev_ip = hit.dev_ip or ''
+        dev_lines = [f"\n -------{dev_ip}------- \n"]
+        for _line in log_file.lines(block_start, block_end, idx=idx):
+            if _line.text.strip() != "":
                 dev_lines.append(
-                    f'{idx}.  {line.replace("Not authorized to run this command", typer.style("Not authorized to run this command", fg=typer.colors.RED))}'
+                    f'{_line.idx}.  {_line.text.replace(not_authz, typer.style(not_authz, fg=typer.colors.RED))}'
                     )
-        elif "Finished, result:" in line:
-            _print = True
-            dev_ip = ''
+        typer.echo("".join(dev_lines))
+        dev_ips.append(dev_ip)
 
     typer.secho("Devices with Comand Authorization Failures:", fg=typer.colors.MAGENTA)
     typer.echo("\n".join(dev_ips))
@@ -196,8 +243,8 @@ def get_threads() -> list:
     cur_thread = 0
     threads = []
     children = []
-    lines = get_lines()
-    for line in lines:
+    for line in get_lines().grep(b"THREAD(", count=False):
+        line = line.text
         if "THREAD(" in line:
             _thread = line.split("THREAD(")[-1].split(")")[0]
             if cur_thread != _thread:
@@ -210,203 +257,427 @@ def get_threads() -> list:
     return threads
 
 def _id_in_line(dev_id: Union[str, int], line: str) -> bool:
-    return [True for _ in DEV_ID_MATCH if _ in line and str(dev_id) in line]
-
-
-def get_attrs_from_line(line: str, dev: ImcDev = None) -> int:
-    # class Line:
-    #     def __init__(self, dev_id: str = None, dev_ip: str = None):
-    #         self.dev_id = dev_id
-    #         self.dev_ip = dev_ip
-
-    #     def __bool__(self):
-    #         return self.dev_id is not None
-
-    _id, _ip, _adapter, _login_type, _start = None, None, None, None, None
-    _thread = line.split("THREAD(")[-1].split(")")[0]
-    for _ in DEV_ID_MATCH:
-        if _ in line:
-            _id = int(line.split(_)[-1].lstrip().split(" ")[0].split(",")[0].strip())
-            for _ in DEV_IP_MATCH:
-                if _ in line:
-                    _ip = line.split(_)[-1].lstrip().split(" ")[0].split(",")[0].strip().rstrip(".")
-
-            if "AdaptName=" in line:
-                _adapter = line.split("AdaptName=")[-1].strip()
-            if "Device login type is " in line:
-                _login_type = line.split("Device login type is ")[-1].split(",")[0].strip()
-
-    kwargs = {
-        "dev_id": _id,
-        "dev_ip": _ip,
-        "start": _start,
-        "pid": _thread,
-        "adapter": _adapter,
-        "login_type": _login_type
-    }
-
-    if dev is None:
-        if _id is not None and DEVICES.get(_id):
-            dev = DEVICES[_id](**kwargs)
-        else:
-            dev = ImcDev(**kwargs)
-
-    if dev.dev_id:
-        return dev
+    return str(dev_id) in line and MATCHER.has_dev_id(line)
 
 
-def get_id_from_line(line: str) -> int:
-    for _ in DEV_ID_MATCH:
-        if _ in line:
-            return int(line.split("dev id:")[-1].lstrip().split(" ")[0].split(",")[0].strip())
-
-def get_error_by_dev(dev_ip: str = None, dev_id: str = None) -> list:
-    cur_thread = "999999"
-    _dev_id = None
-    _thread = 0
-    threads = []
-    children = []
-    dev_results = None
-    lines = get_lines()
-    for idx, line in enumerate(lines):
-        if "THREAD(" in line:
-            _thread = line.split("THREAD(")[-1].split(")")[0]
-            this_dev = get_attrs_from_line(line)
-            if this_dev:
-                _dev_id = this_dev.dev_id
-                if this_dev.pid:
-                    cur_thread = this_dev.pid[-1]
-                DEVICES[_dev_id] = this_dev
-            #     if _dev_id not in DEVICES:
-            #         cur_thread = _thread
-            #         DEVICES[_dev_id] = this_dev
-            #         # ImcDev(dev_id=this_dev.dev_id, pid=_thread, dev_ip=this_dev.dev_ip)
-            #     # elif this_dev.dev_ip and not DEVICES[_dev_id].dev_ip:
-            #     #     DEVICES[_dev_id].dev_ip = this_dev.dev_ip
-            # elif "CExecuter::CExecuter()" in line and "ID:" in line:
-            #     _dev_id = line.split("ID:")[-1].strip()
-            #     _start = line.split("[")[0].strip()
-            #     if _dev_id not in DEVICES:
-            #         cur_thread = _thread
-            #         DEVICES[_dev_id] = ImcDev(dev_id=_dev_id, pid=_thread, start=_start)
-                # DEVICES[_dev_id](dev_id=_dev_id, pid=_thread, start=_start)
-            elif f"THREAD({cur_thread})" in line or (this_dev and _id_in_line(this_dev.dev_id, line)):
-                if not _dev_id or _dev_id not in DEVICES:
-                    print(f"Skipped line {idx} no key [{_dev_id}]:\n\t{line}")
-                else:
-                    if "Begin" in line:
-                        DEVICES[_dev_id].steps += [" ".join(line.split("]")[2:]).strip()]
-                    # elif "dev id: 6013, ip: 10.145.248.52"
-                    if "spawn" in line and "pid:" in line:
-                        DEVICES[_dev_id](pid=line.split("pid:")[1].split(" ")[0].strip())
-                    elif "version = " in line:
-                        DEVICES[_dev_id].version.append(line.split("version = ")[-1].strip())
-
-        print(f"end parsing line {idx}")
-
-
-
-    return DEVICES
-
-def _init_DEVICES(lines: list) -> list:
-    for line in lines:
-        if "CExecuter::CExecuter()" in line and "ID:" in line:
-            _thread = line.split("THREAD(")[-1].split(")")[0]
-            _start = line.split("[")[0].strip()
-            _id = line.split("ID:")[-1].strip()
-            DEVICES[_id] = ImcDev(dev_id=_id, pid=_thread, start=_start)
+def get_attrs_from_line(line: str) -> Optional[LineAttrs]:
+    '''Return the device attributes in line (see LineMatcher.match), None if it has no dev id.'''
+    attrs = MATCHER.match(line)
+    if attrs.dev_id:
+        return attrs
 
-    return DEVICES
 
-@app.command()
-def get_all_lines(include: str = None, exclude: str = None):
-    lines = get_lines()
-    if exclude and include:
-        typer.echo_via_pager("".join([f'{idx}. {line}' for idx, line in enumerate(lines) if line.strip() != ""
-                             and exclude not in line and include in line]))
-    elif include:
-        typer.echo_via_pager("".join([f'{idx}. {line}' for idx, line in enumerate(lines) if line.strip() != ""
-                            and include in line]))
-    elif exclude:
-        typer.echo_via_pager("".join([f'{idx}. {line}' for idx, line in enumerate(lines) if line.strip() != ""
-                             and exclude not in line]))
+def get_id_from_line(line: str) -> int:
+    return MATCHER.match(line).dev_id
+
+def get_error_by_dev(dev_ip: str = None, dev_id: str = None) -> Dict[int, List[Session]]:
+    '''Return {dev_id: [Session, ...]} for every device job in the log (optionally only for dev_ip / dev_id).'''
+    log_file = get_lines()
+    index = LogIndex.load(log_file) if dev_id else None
+    # with a current index only the lines that belong to dev_id are read
+    if index:
+        parser = SessionParser(MATCHER)
+        lines = (line for line in index.dev_lines(int(dev_id)) if "THREAD(" in line.text)
+        sessions = parser.parse_all(lines)
     else:
-        if not include and not exclude:
-            typer.echo_via_pager("".join([f'{idx}. {line}' for idx, line in enumerate(lines) if line.strip() != ""]))
-
-@app.command("sshv1")
-def get_v1_devs(developer_mode: bool = typer.Option(False, "--dev", hidden=True),
-                debug: bool = typer.Option(False, hidden=True),
-                logfile: Path = typer.Option(None, "--in", help="The logfile to parse (overrides value if provided in config)")) -> None:
-
-    outfile = Path(__file__).parent.joinpath("out", "ssh_v1_devices.cfg")
+        sessions, _ = _parse_sessions(log_file.path, log_file=log_file)
+
+    devs = {}
+    for session in sessions:
+        if dev_id is not None and session.dev_id != int(dev_id):
+            continue
+        if dev_ip is not None and session.dev_ip != dev_ip:
+            continue
+        devs.setdefault(session.dev_id, []).append(session)
+
+    return devs
+
+def _matching_lines(log_file: LogFile, include: List[str] = None, exclude: List[str] = None, regex: bool = False,
+                    before: int = 0, after: int = 0, max_count: int = None) -> Iterator[str]:
+    '''Return an iterator of the numbered (non blank) lines containing any include and none of the exclude patterns.
+
+    Matches are "<idx>. <line>", context lines are "<idx>- <line>" and "--" separates non adjacent groups
+    when context is requested.  Stops after max_count matches.  The lines are found as they are iterated,
+    the patterns are checked up front.
+
+    Raises:
+        typer.BadParameter: regex and a pattern isn't a valid regular expression.
+    '''
+    if regex:
+        try:
+            include = [re.compile(p.encode()) for p in include or []]
+            exclude = [re.compile(p) for p in exclude or []]
+        except re.error as e:
+            pattern = e.pattern.decode() if isinstance(e.pattern, bytes) else e.pattern
+            raise typer.BadParameter(f'"{pattern}" is not a valid regular expression: {e}',
+                                     param_hint="'--include' / '--exclude'")
+
+        def _excluded(text: str) -> bool:
+            return any(p.search(text) for p in exclude)
+    else:
+        include = [p.encode() for p in include or []]
+        exclude = list(exclude or [])
+
+        def _excluded(text: str) -> bool:
+            return any(p in text for p in exclude)
+
+    def _lines() -> Iterator[str]:
+        # with include only lines that match an include pattern are decoded
+        lines = log_file.grep(*include) if include else log_file.lines()
+        context = before or after
+        shown, shown_idx = None, None  # offset / idx of the line following the last line output
+        ctx_end = None  # offset where after context of the last match ends
+        cnt = 0
+
+        def _context(start: int, end: int, idx: int) -> Iterator[str]:
+            for _idx, _, text in log_file.lines(start, end, idx=idx):
+                if text.strip() != "":
+                    yield f"{_idx}- {text}"
+
+        for idx, offset, text in lines:
+            if text.strip() == "" or (exclude and _excluded(text)):
+                continue
+            if context:
+                if ctx_end is not None and shown < offset:
+                    _end = min(ctx_end, offset)
+                    yield from _context(shown, _end, shown_idx)
+                    shown_idx += log_file.count_lines(shown, _end)
+                    shown = _end
+                ctx_start, ctx_idx = offset, idx
+                while ctx_idx > idx - before and ctx_start > log_file.start and (shown is None or ctx_start > shown):
+                    ctx_start, ctx_idx = log_file.line_start(ctx_start - 1), ctx_idx - 1
+                if shown is not None and ctx_start > shown:
+                    yield "--\n"
+                yield from _context(ctx_start, offset, ctx_idx)
+                shown, shown_idx = log_file.line_end(offset), idx + 1
+                ctx_end = shown
+                for _ in range(after):
+                    ctx_end = log_file.line_end(ctx_end)
+            yield f"{idx}. {text}"
+            cnt += 1
+            if max_count and cnt >= max_count:
+                break
+
+        if context and ctx_end is not None and shown < ctx_end:
+            yield from _context(shown, ctx_end, shown_idx)
+
+    return _lines()
 
-    if debug:
-        config.debug = log.DEBUG = log.show = debug
-        log.setLevel(logging.DEBUG)
 
-    _capture = False
-    id_map = {}
-    v1_devs = []
-    v1_cnt = 0
+@app.command()
+def get_all_lines(include: List[str] = typer.Option(None, "--include", "-i", help="Only show lines with this pattern (multiple allowed)"),
+                  exclude: List[str] = typer.Option(None, "--exclude", "-x", help="Don't show lines with this pattern (multiple allowed)"),
+                  regex: bool = typer.Option(False, "--regex", "-E", help="Patterns are regular expressions (default is substring)"),
+                  after: int = typer.Option(0, "--after-context", "-A", help="Show this many lines after each match"),
+                  before: int = typer.Option(0, "--before-context", "-B", help="Show this many lines before each match"),
+                  context: int = typer.Option(0, "--context", "-C", help="Show this many lines before and after each match"),
+                  max_count: int = typer.Option(None, "--max-count", "-m", help="Stop after this many matching lines"),
+                  jobs: int = typer.Option(1, "--jobs", "-j", help="Number of processes used to scan the log (used with --include)"),
+                  since: str = typer.Option(None, "--since", help=SINCE_HELP, callback=_time_option),
+                  until: str = typer.Option(None, "--until", help=UNTIL_HELP, callback=_time_option)):
+    log_file = get_lines(jobs=jobs, since=since, until=until)
+    lines = _matching_lines(log_file, include, exclude, regex=regex, before=before or context,
+                            after=after or context, max_count=max_count)
+    # lines are fed to the pager as they are found, a few at a time as each write to the pager has a cost
+    typer.echo_via_pager("".join(chunk) for chunk in iter(lambda: list(islice(lines, 64)), []))
+
+@app.command("index")
+def build_index(logfile: Path = typer.Option(None, "--in", help=IN_HELP),
+                rebuild: bool = typer.Option(False, "--rebuild", help="Rebuild the index even if it's current")) -> None:
+    """Build the sidecar offset index (<log>.idx) used to answer lookups without rescanning the log"""
+    for log_path in get_log_files(logfile):
+        log_file = open_log(log_path)
+        print(f"Indexing {log_path.name}...", end="")
+        index = LogIndex.get(log_file, MATCHER, rebuild=rebuild)
+        print(f"OK {len(index.threads)} threads, {len(index.devs)} devices, {len(index.finished)} results")
+        typer.echo(f"Index saved to {LogIndex.index_file(log_file)}")
+        log_file.close()
+
+
+@app.command("dev")
+def get_dev_lines(dev_id: int = typer.Argument(..., help="IMC device id"),
+                  logfile: Path = typer.Option(None, "--in", help=IN_HELP),
+                  since: str = typer.Option(None, "--since", help=SINCE_HELP, callback=_time_option),
+                  until: str = typer.Option(None, "--until", help=UNTIL_HELP, callback=_time_option)) -> None:
+    """Show every log line for a device (builds the sidecar index if needed)"""
+    log_paths = get_log_files(logfile)
+    lines = []
+    for log_path in log_paths:
+        log_file = open_log(log_path, since=since, until=until)
+        index = LogIndex.get(log_file, MATCHER)
+        dev_lines = [f'{idx}. {line}' for idx, offset, line in index.dev_lines(dev_id)
+                     if log_file.start <= offset < log_file.end]
+        # with multiple logs each one's lines are headed by its name
+        if dev_lines and len(log_paths) > 1:
+            dev_lines.insert(0, f"\n -------------- {log_path.name} -------------- \n")
+        lines += dev_lines
+        log_file.close()
+    if not lines:
+        typer.echo(f"{WAR_STR} dev id {dev_id} not found in {logfile or log_paths[0]}")
+        raise typer.Exit(code=1)
+    typer.echo_via_pager("".join(lines))
+
+
+def _table(rows: List[tuple], headers: Tuple[str]) -> Iterator[str]:
+    '''Yield rows as lines of a plain text table.
+
+    tabulate infers a type for every cell, which takes minutes for a full day's worth of sessions.
+    '''
+    rows = [tuple(str(v) for v in row) for row in rows]
+    widths = [max(len(v) for v in col) for col in zip(headers, *rows)]
+    fmt = "  ".join(f"{{:{w}}}" for w in widths)
+    yield fmt.format(*headers).rstrip() + "\n"
+    yield "  ".join("-" * w for w in widths) + "\n"
+    for row in rows:
+        yield fmt.format(*row).rstrip() + "\n"
+
+
+def _load_events(store: EventStore, log_paths: List[Path], jobs: int = 1, reload: bool = False) -> None:
+    '''Load the events from each log into store, logs already loaded (and unchanged since) are skipped unless reload.
+
+    This is a pass over each log for its events alone, commands that parse the whole log anyway load
+    them in that pass with _event_taps.
+    '''
+    for log_path in log_paths:
+        if not reload and store.is_current(log_path):
+            continue
+        print(f"Loading events from {log_path.name}...", end="")
+        log_file = open_log(log_path, jobs=jobs)
+        with profiler.stage("load events"):
+            cnt = store.load(log_path, EventParser(MATCHER).parse(log_file))
+        log_file.close()
+        print(f"OK {cnt} events")
+
+
+@contextmanager
+def _event_taps(store: Optional[EventStore], log_path: Path) -> Iterator[List[EventTap]]:
+    '''Yield the taps (see SessionParser.parse_log and ErrorScanner) loading the events of the log at path into store.
+
+    No taps without a store, the events are stored once the with block completes (all or none of them).
+    '''
+    if store is None:
+        yield []
+        return
+    with store.loader(log_path) as loader:
+        yield [EventTap(MATCHER, loader)]
+
+
+@app.command("query")
+def query_events(types: List[str] = typer.Option(None, "--type", "-t", help=f"Only events of this type (multiple allowed): {', '.join(EVENT_TYPES)}"),
+                 dev_ids: List[int] = typer.Option(None, "--dev", "-d", help="Only events for this IMC device id (multiple allowed)"),
+                 dev_ips: List[str] = typer.Option(None, "--ip", help="Only events for this device ip (multiple allowed)"),
+                 since: str = typer.Option(None, "--since", help='Only events at or after this time i.e. "2020-11-17" or "2020-11-17 08:00"', callback=_date_time_option),
+                 until: str = typer.Option(None, "--until", help="Only events before this time", callback=_date_time_option),
+                 by: List[str] = typer.Option(None, "--by", "-b", help=f"Count events grouped by this field (multiple allowed): {', '.join(EVENT_FIELDS)} or a cached IMC inventory field i.e. deviceModel"),
+                 limit: int = typer.Option(None, "--limit", "-n", help="Show at most this many rows"),
+                 logfile: Path = typer.Option(None, "--in", help="Only query events from this log, directory or glob (default every log loaded, the configured log is loaded first)"),
+                 reload: bool = typer.Option(False, "--reload", help="Parse the log(s) again even if their events are current"),
+                 jobs: int = typer.Option(1, "--jobs", "-j", help="Number of processes used to scan the log")) -> None:
+    """Query the events parsed from the log(s) (loaded into out/events.db the first time, or when a log changes)"""
+    unknown = [t for t in types or [] if t not in EVENT_TYPES]
+    if unknown:
+        typer.echo(f"{ERR_STR} Unknown event type {', '.join(unknown)}, valid types: {', '.join(EVENT_TYPES)}")
+        raise typer.Exit(code=1)
 
-    lines = get_lines(logfile)
-    print("Parsing Log File...", end="")
-    for line in lines:
-        if "dev id:" in line and "ip:" in line:
-            _ip = line.split("ip: ")[-1].split(" ")[0].rstrip(".")
-            id_map[int(line.split("dev id: ")[-1].split(",")[0])] = _ip
+    store = EventStore.from_config(config)
+    log_paths = get_log_files(logfile)
+    _load_events(store, log_paths, jobs=jobs, reload=reload)
+
+    cache = ImcCache.from_config(config)
+    try:
+        with profiler.stage("query"):
+            headers, rows = store.query(types, dev_ids, dev_ips, since=since, until=until,
+                                        logs=None if logfile is None else log_paths, by=by, limit=limit,
+                                        inventory=cache.db_file)
+    except ValueError as e:
+        typer.echo(f"{ERR_STR} {e}")
+        raise typer.Exit(code=1)
+    finally:
+        cache.close()
+        store.close()
 
-        if "THREAD" in line and "version 2 required by our configuration" in line:
-            _capture = True
-            _thread = line.split("THREAD(")[-1].split(")")[0]
-            v1_cnt += 1
-        elif _capture and "iDevID" in line:
-            v1_devs.append(int.from_bytes(bytes.fromhex(line.strip().split("'")[1]), "big"))
-            _capture = False
+    if not rows:
+        typer.echo(f"{WAR_STR} No matching events found")
+        raise typer.Exit(code=1)
+    typer.echo_via_pager(_table([tuple("--" if v is None else v for v in row) for row in rows], headers))
+
+
+def _parse_sessions(log_path: Path, jobs: int = 1, since: str = None, until: str = None,
+                    log_file: LogFile = None, store: EventStore = None) -> Tuple[List[Session], int]:
+    '''Return (sessions, THREAD lines parsed) for the log at path, memoized in the result cache.
+
+    With store (sessions --store) the parse of the whole log also loads its events into store, the
+    log is parsed even if the result is cached unless store already has them.
+    '''
+    key = result_cache.key(log_path, "sessions", since=since, until=until)
+    if store is not None and (since or until or store.is_current(log_path)):
+        store = None
+    parsed = None if store is not None else result_cache.get(key)
+    if parsed is None:
+        log_file = log_file or open_log(log_path, jobs=jobs, since=since, until=until)
+        parser = SessionParser(MATCHER)
+        with _event_taps(store, log_path) as taps:
+            sessions = list(parser.parse_log(log_file, taps=taps))
+        log_file.close()
+        parsed = (sessions, parser.lines)
+        result_cache.put(key, parsed)
+    return parsed
+
+
+@app.command("sessions")
+def get_sessions(dev_id: int = typer.Argument(None, help="Only show sessions for this IMC device id"),
+                 unfinished: bool = typer.Option(False, "--unfinished", help="Only show sessions that never logged a result"),
+                 logfile: Path = typer.Option(None, "--in", help=IN_HELP),
+                 jobs: int = typer.Option(1, "--jobs", "-j", help="Number of processes used to scan the log"),
+                 store_events: bool = typer.Option(False, "--store", help="Also load the log's events into the event store (see query)"),
+                 since: str = typer.Option(None, "--since", help=f"{SINCE_HELP}, sessions running at since/until are partial", callback=_time_option),
+                 until: str = typer.Option(None, "--until", help=UNTIL_HELP, callback=_time_option)) -> None:
+    """Show each device job (session) run by IMC, rebuilt per thread in one pass of the log"""
+    log_paths = get_log_files(logfile)
+    store = EventStore.from_config(config) if store_events else None
+    rows, results, line_cnt = [], {}, 0
+    # each log is parsed on its own, sessions are never carried over from one log to the next
+    for log_path in log_paths:
+        sessions, lines = _parse_sessions(log_path, jobs=jobs, since=since, until=until, store=store)
+        for s in sessions:
+            result = "--" if s.result is None else s.result
+            results[result] = results.get(result, 0) + 1
+            if (dev_id is not None and s.dev_id != dev_id) or (unfinished and s.result is not None):
+                continue
+            rows.append((
+                s.start_time, s.end_time or "--", s.thread, s.dev_id or "--", s.dev_ip or "--", s.adapter or "--",
+                "--" if s.ssh is None else "ssh" if s.ssh else "!!NOT SSH!!", len(s.steps),
+                " ".join(str(pid) for pid in s.pids), " ".join(dict.fromkeys(s.versions)), result
+            ))
+        line_cnt += lines
+
+    if store is not None:  # the parse of a --since/--until window doesn't load the log's events
+        _load_events(store, log_paths, jobs=jobs)
+        store.close()
+
+    if not rows:
+        typer.echo(f"{WAR_STR} No matching sessions found in {logfile or log_paths[0]}")
+        raise typer.Exit(code=1)
 
-    print(f"OK {v1_cnt} (SSHv1 devices found)")
+    headers = ("Start", "Finished", "Thread", "Dev ID", "Dev IP", "Adapter", "Login", "Steps", "PIDs", "Versions", "Result")
+    summary = ", ".join(f"{cnt} result {res}" for res, cnt in sorted(results.items()))
+    logs = "" if len(log_paths) == 1 else f" in {len(log_paths)} logs"
+    typer.echo_via_pager(chain(
+        _table(rows, headers),
+        [f"\n{sum(results.values())} sessions from {line_cnt} lines{logs} ({summary})\n"]
+    ))
+
+
+def _parse_logs(kind: str, func: Callable[..., Any], paths: List[Path], jobs: int = None, **options) -> List[Any]:
+    '''Return [func(path, **options) for path in paths], memoized in the result cache as kind.
+
+    The logs that aren't cached are parsed concurrently in jobs processes (default one per CPU).
+    '''
+    keys = [result_cache.key(path, kind, **options) for path in paths]
+    parsed = [result_cache.get(key) for key in keys]
+    todo = [i for i, value in enumerate(parsed) if value is None]
+    if todo:
+        jobs = min(jobs or os.cpu_count() or 1, len(todo))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for i, value in zip(todo, executor.map(partial(func, **options), [paths[i] for i in todo])):
+                parsed[i] = value
+                result_cache.put(keys[i], value)
+    return parsed
+
+
+def _parse_v1_devs(log_file: LogFile, state: dict, start: int = None, taps: Sequence[Detector] = ()) -> dict:
+    '''Update state with the SSHv1 failures found in log_file from byte offset start on.
+
+    state keys: capture (bool), id_map ({dev_id: ip}), v1_devs (list of dev ids), v1_cnt (int)
+    taps (see _event_taps) are run by the same scan.
+    '''
+    detector = SshV1()
+    detector.triggered = state.get("v1_cnt", 0)
+    if state.get("capture"):
+        detector.capture = ("", "", start or 0)  # only the dev id is kept from a capture carried over
+    scanner = ErrorScanner([detector, *taps], id_map=state.get("id_map", {}))
+    v1_devs = state.get("v1_devs", [])
+    v1_devs += [hit.dev_id for hit in scanner.scan(log_file, start=start)]
+
+    return {"capture": detector.capture is not None, "id_map": scanner.id_map, "v1_devs": v1_devs,
+            "v1_cnt": detector.triggered}
+
+
+def _parse_v1_file(path: Path, since: str = None, until: str = None) -> dict:
+    '''Return the SSHv1 failures found in the log at path (run in a worker process for each file).'''
+    with _window(LogFile(path), since, until) as log_file:
+        return _parse_v1_devs(log_file, {})
+
+
+def _parse_v1_files(paths: List[Path], jobs: int = None, since: str = None,
+                    until: str = None) -> Tuple[dict, Dict[int, Tuple[str, str]]]:
+    '''Parse paths (oldest first) concurrently and merge the results.
+
+    Returns (state, seen), state as returned by _parse_v1_devs with each device once in v1_devs,
+    seen is {dev_id: (first seen, last seen)} using the date of each log.
+    '''
+    id_map, v1_devs, v1_cnt, seen = {}, {}, 0, {}
+    for path, state in zip(paths, _parse_logs("sshv1", _parse_v1_file, paths, jobs=jobs, since=since, until=until)):
+        day = _log_date(path)
+        id_map.update(state["id_map"])  # newer logs win
+        v1_cnt += state["v1_cnt"]
+        for dev in state["v1_devs"]:
+            v1_devs[dev] = None
+            seen[dev] = (seen.get(dev, (day,))[0], day)
+
+    return {"capture": False, "id_map": id_map, "v1_devs": list(v1_devs), "v1_cnt": v1_cnt}, seen
+
+
+def _report_v1_devs(v1_devs: list, v1_cnt: int, imc_dev_dict: dict, imc_icc_dict: dict,
+                    developer_mode: bool = False, seen: Dict[int, Tuple[str, str]] = None,
+                    ips: Dict[int, str] = None) -> None:
+    '''Write out/ssh_v1_devices.cfg and the csv, and display details for v1_devs.
+
+    With seen ({dev_id: (first seen, last seen)}, multiple logs) the dates are added to the details.
+    ips ({dev_id: ip}, see _resolve_ips) are used for the cfg ahead of the ip in the inventory.
+    '''
+    from tabulate import tabulate  # slow import, only this report uses it
 
-    # Gather Additional data from imc for each dev_id from log
+    outfile = Path(__file__).parent.joinpath("out", "ssh_v1_devices.cfg")
     out_keys = ["id", "sysName", "location", "deviceModel", "currentVersion"]
-    imc_dev_dict = imc.device.get_all_devs(config.imc.creds, config.imc.url, by_id=True, verify=False)
-    imc_icc_dict = imc.icc.get_config_center_dict(config.imc.creds, config.imc.url)
 
+    devs = DevStore.from_dict(imc_dev_dict)
     # developer override so dev_ids map to stuff actually in my system
     if developer_mode:
-        v1_devs = [k for k in imc_dev_dict.keys() if imc_dev_dict[k].get("categoryId", "") == "1"]
+        v1_devs = devs.where("categoryId", "1")
         typer.secho("dev mode: ssh_v1_parse data overwritten for testing\n", fg="red")
 
-    # Build combined dict from 2 imc dicts {int(dev_id): dict(dev_data)}
-    new_dict = {dev: {**imc_dev_dict.get(dev, {}), **imc_icc_dict.get(dev, {})} for dev in v1_devs}
-
-    # -- // Write ssh_v1_devs file \\ --
-    with outfile.open("w+") as f:
-        file_data = f.readlines()
-        new_fdata = [imc_dev_dict.get(dev, {}).get('ip', f"Error: ip for device with id {dev} not found.") for dev in v1_devs]
-        f.writelines("\n".join([line for line in set([*file_data, *new_fdata])]))
-
-    # remove unuseful items from output data
-    tty_out, csv_out, ver_list = [], [], []
-    ver_list2 = [("Version", "Model")]
-    for dev in new_dict:
-        tty_out += [{k: v for k, v in new_dict[dev].items() if k in out_keys}]  # convert dict to list of dicts for tabulate
-        # ver_list += [f"{new_dict[dev]['currentVersion']:30}{new_dict[dev]['deviceModel']}\n"]
-        ver_list2 += [(new_dict[dev].get('currentVersion', '--'), new_dict[dev].get('deviceModel', '--'))]
-        csv_out += [",".join([v for k, v in new_dict[dev].items() if k in out_keys])]
-
-    csv_out.insert(0, ",".join([k for k in tty_out[-1].keys()]))
-
-    # Output data to screen
-    typer.echo("\n-- Details for all devices parsed from logs with SSHv1 Error --")
-    typer.echo(tabulate(tty_out, headers="keys"))
-    csv_out_file = Path(outfile.parent / (f"{Path(__file__).stem}_output.csv"))
-    csv_out_file.write_text("\n".join(csv_out))
-
-    # Display all model/versions that resulted in v1 error
-    # typer.echo(f"\n{typer.style('Code Versions resulting in sshv1 error:', fg='cyan')}\n{''.join(list(set(ver_list)))}")
-    typer.echo("\n-- Unique model / version combinations that returned SSHv1 Error --")
-    typer.echo(tabulate(ver_list2, headers="firstrow"))
+    with profiler.stage("join imc data"):
+        # join inventory and Config Center data for the v1 devices
+        v1_data = devs.join(DevStore.from_dict(imc_icc_dict, fields=out_keys), ids=v1_devs)
+
+        # only the useful fields in output data
+        fields = [k for k in v1_data.columns if k in out_keys]
+        tty_out = list(v1_data.rows(*fields, default=""))
+        if seen is not None:
+            fields += ["firstSeen", "lastSeen"]
+            tty_out = [(*row, *seen.get(dev, ("", ""))) for dev, row in zip(v1_data.ids, tty_out)]
+        csv_out = [",".join(fields), *[",".join(row) for row in tty_out]]
+        ver_list = [(*k, len(v)) for k, v in v1_data.group_by("currentVersion", "deviceModel", default="--").items()]
+
+    with profiler.stage("write files"):
+        # -- // Write ssh_v1_devs file \\ --
+        with outfile.open("w+") as f:
+            file_data = f.readlines()
+            ips = ips or {}
+            new_fdata = [ips.get(dev) or ip or f"Error: ip for device with id {dev} not found." for dev, ip in zip(v1_data.ids, v1_data.column("ip"))]
+            f.writelines("\n".join([line for line in set([*file_data, *new_fdata])]))
+        csv_out_file = Path(outfile.parent / (f"{Path(__file__).stem}_output.csv"))
+        csv_out_file.write_text("\n".join(csv_out))
+
+    with profiler.stage("display"):
+        # Output data to screen
+        typer.echo("\n-- Details for all devices parsed from logs with SSHv1 Error --")
+        typer.echo(tabulate(tty_out, headers=fields))
+
+        # Display all model/versions that resulted in v1 error
+        typer.echo("\n-- Unique model / version combinations that returned SSHv1 Error --")
+        typer.echo(tabulate(ver_list, headers=("Version", "Model", "Devices")))
 
     typer.echo(f"\nFound {v1_cnt} devices with errors indicating they require SSHv1 (parsed from log).")
     if outfile.exists():
@@ -421,35 +692,282 @@ def get_v1_devs(developer_mode: bool = typer.Option(False, "--dev", hidden=True)
         typer.echo(f"{ERR_STR} Unable to find {outfile.resolve()}\n")
 
 
+def _get_imc_data(cache: ImcCache, dev_ids: list = None, refresh: bool = False,
+                  offline: bool = False) -> Tuple[dict, dict]:
+    '''Return (inventory, Config Center) data keyed by dev id.
+
+    Served from the local cache when it's within imc.cache_ttl, otherwise (or with refresh)
+    whatever is needed is collected from IMC concurrently and cached.  With dev_ids only the
+    inventory for those devices is required, devices not cached are looked up individually
+    or in bulk depending on imc.lookup_threshold (see plat.device.get_devs_by_id).
+    offline returns only what is cached.
+    '''
+    cfg = config.get("imc", {})
+    imc_dev_dict = None if refresh else cache.get(DEVICE)
+    imc_icc_dict = None if refresh else cache.get(ICC)
+    missing = None
+    if dev_ids is not None:
+        if imc_dev_dict is None:
+            imc_dev_dict = {} if refresh else cache.get_devs(DEVICE, dev_ids)
+        missing = [dev for dev in dev_ids if dev not in imc_dev_dict]
+
+    if imc_dev_dict:
+        typer.echo(f"Using device inventory from local cache ({len(imc_dev_dict)} devices), use --refresh to collect from IMC")
+    if imc_icc_dict is not None:
+        typer.echo(f"Using Config Center data from local cache ({len(imc_icc_dict)} devices), use --refresh to collect from IMC")
+    if offline:
+        return imc_dev_dict or {}, imc_icc_dict or {}
+
+    # inventory and Config Center are independent, collect both concurrently
+    from imcapicli.aio import AsyncImc  # imports requests/pyhpeimc, only loaded by commands that call IMC
+
+    aimc = AsyncImc(config.imc.creds, config.imc.url)
+    calls = {}
+    if dev_ids is None and imc_dev_dict is None:
+        calls[DEVICE] = aimc.get_all_devs(by_id=True, fields=DEV_FIELDS, verify=False, workers=cfg.get("workers", 4))
+    elif missing:
+        calls[DEVICE] = aimc.get_devs_by_id(missing, threshold=cfg.get("lookup_threshold", 0.01), fields=DEV_FIELDS,
+                                            workers=cfg.get("workers", 4), verify=False)
+    if imc_icc_dict is None:
+        calls[ICC] = aimc.get_config_center_dict()
+    if calls:
+        results = dict(zip(calls, aimc.run(*calls.values())))
+        if DEVICE in results and dev_ids is None:
+            imc_dev_dict = results[DEVICE] or {}
+            if imc_dev_dict:
+                cache.put(DEVICE, imc_dev_dict)
+        elif DEVICE in results:
+            imc_dev_dict.update(results[DEVICE])
+            cache.update(DEVICE, results[DEVICE])
+        if ICC in results:
+            imc_icc_dict = results[ICC].output if results[ICC].ok else {}
+            if imc_icc_dict:
+                cache.put(ICC, imc_icc_dict)
+
+    return imc_dev_dict, imc_icc_dict
+
+
+def _resolve_ips(dev_ids: List[int], id_map: Dict[int, str], cache: ImcCache,
+                 collect: Callable[[], dict] = None) -> Dict[int, str]:
+    '''Return {dev_id: ip} from the log (id_map), then the local cache, then the inventory collect() returns (IMC).
+
+    Without collect (offline) IMC isn't asked.
+    '''
+    tiers = [("log", log_tier(id_map)), ("cache", cache_tier(cache))]
+    if collect is not None:
+        tiers.append(("imc", inventory_tier(collect)))
+    resolver = IpResolver(*tiers)
+    with profiler.stage("resolve ips"):
+        ips = resolver.resolve(dev_ids)
+    typer.echo(f"Resolved {len(ips)} of {len(set(dev_ids))} device ips ({resolver.report()})")
+    return ips
+
+
+def _v1_imc_data(state: dict, cache: ImcCache, developer_mode: bool = False, refresh: bool = False,
+                 offline: bool = False, known: Tuple[dict, dict] = None) -> Tuple[Dict[int, str], dict, dict]:
+    '''Return (ips, inventory, Config Center data) for the SSHv1 devices in state.
+
+    IMC is asked once: the devices without an ip in the log or the cache are collected along with the
+    rest of the data the report needs (_get_imc_data, concurrently).  known (inventory, Config Center)
+    from an earlier report is reused when it has every device.
+    '''
+    v1_devs = state["v1_devs"]
+    if known is not None and known[0] and all(dev in known[0] for dev in v1_devs):
+        def collect() -> Tuple[dict, dict]:
+            return known
+    else:
+        # memoized, called by the resolver's imc tier if the log and the cache miss, else for the report
+        collect = lru_cache(maxsize=None)(profiler.stage("imc data (cache + collection)")(
+            partial(_get_imc_data, cache, None if developer_mode else v1_devs, refresh=refresh, offline=offline)
+        ))
+    ips = None
+    if not developer_mode:
+        ips = _resolve_ips(v1_devs, state["id_map"], cache, collect=None if offline else lambda: collect()[0])
+    imc_dev_dict, imc_icc_dict = collect()
+    return ips, imc_dev_dict, imc_icc_dict
+
+
+def _get_v1_devs_batch(log_paths: List[Path], jobs: int = None, developer_mode: bool = False,
+                       refresh: bool = False, since: str = None, until: str = None, offline: bool = False) -> None:
+    '''sshv1 over multiple logs, the logs are parsed concurrently and IMC data is gathered once for all of them.'''
+    print(f"Parsing {len(log_paths)} Log Files ({_log_date(log_paths[0])} to {_log_date(log_paths[-1])})...", end="")
+    with profiler.stage("parse log"):
+        state, seen = _parse_v1_files(log_paths, jobs=jobs, since=since, until=until)
+    print(f"OK {state['v1_cnt']} (SSHv1 devices found, {len(state['v1_devs'])} unique)")
+
+    cache = ImcCache.from_config(config)
+    ips, imc_dev_dict, imc_icc_dict = _v1_imc_data(state, cache, developer_mode=developer_mode, refresh=refresh,
+                                                   offline=offline)
+    _report_v1_devs(state["v1_devs"], state["v1_cnt"], imc_dev_dict, imc_icc_dict, developer_mode=developer_mode,
+                    seen=seen, ips=ips)
+
+
+@app.command("sshv1")
+def get_v1_devs(developer_mode: bool = typer.Option(False, "--dev", hidden=True),
+                debug: bool = typer.Option(False, hidden=True),
+                logfile: Path = typer.Option(None, "--in", help=IN_HELP),
+                jobs: int = typer.Option(None, "--jobs", "-j", help="Number of processes used to scan the log (default 1, one per CPU with multiple logs)"),
+                resume: bool = typer.Option(False, "--resume", help="Only parse what was appended to the log since the last --resume/--follow run"),
+                follow: bool = typer.Option(False, "--follow", help="Keep parsing new lines as they are appended to the log (implies --resume)"),
+                interval: int = typer.Option(60, help="Seconds between checks for new lines with --follow"),
+                refresh: bool = typer.Option(False, "--refresh", help="Collect data from IMC even if the local cache is current"),
+                offline: bool = typer.Option(False, "--offline", help="Don't call IMC, ips are from the log and the local cache (details only for cached devices)"),
+                store_events: bool = typer.Option(False, "--store", help="Also load the log's events into the event store (see query)"),
+                since: str = typer.Option(None, "--since", help=SINCE_HELP, callback=_time_option),
+                until: str = typer.Option(None, "--until", help=UNTIL_HELP, callback=_time_option)) -> None:
+
+    if debug:
+        config.debug = log.DEBUG = log.show = debug
+        log.setLevel(logging.DEBUG)
+
+    log_paths = get_log_files(logfile)
+    store = EventStore.from_config(config) if store_events else None
+    if offline and refresh:
+        typer.echo(f"{ERR_STR} --refresh collects from IMC, it can't be used with --offline")
+        raise typer.Exit(code=1)
+    if (resume or follow) and (since or until):
+        typer.echo(f"{ERR_STR} --resume and --follow parse from the last checkpoint, they can't be used with --since/--until")
+        raise typer.Exit(code=1)
+    if len(log_paths) > 1:
+        if resume or follow:
+            typer.echo(f"{ERR_STR} --resume and --follow need a single log, {len(log_paths)} found for {logfile}")
+            raise typer.Exit(code=1)
+        if store is not None:  # the logs are parsed in worker processes, their events are loaded on their own
+            _load_events(store, log_paths, jobs=jobs or 1)
+        return _get_v1_devs_batch(log_paths, jobs=jobs, developer_mode=developer_mode, refresh=refresh,
+                                  since=since, until=until, offline=offline)
+
+    log_path = log_paths[0]
+    jobs = jobs or 1
+    checkpoint = Checkpoint(Path(__file__).parent.joinpath("out", "ssh_v1_devices.checkpoint"), log_path)
+    if resume or follow:
+        checkpoint.load()
+        checkpoint.state["id_map"] = {int(k): v for k, v in checkpoint.state.get("id_map", {}).items()}
+        if checkpoint:
+            typer.echo(f"Resuming from byte {checkpoint.offset} of {log_path}")
+    if store is not None and (since or until or checkpoint.offset):  # only part of the log is parsed
+        _load_events(store, log_paths, jobs=jobs)
+
+    cache = ImcCache.from_config(config)
+    imc_dev_dict, imc_icc_dict = {}, {}
+    reported = None
+    while True:
+        # resumed parses carry state from the checkpoint, only a full parse is memoized
+        key = None if resume or follow else result_cache.key(log_path, "sshv1", since=since, until=until)
+        # with --store a parse of the whole log also loads its events, unless the store has them already
+        load_events = store is not None and not (since or until or checkpoint.offset) and not store.is_current(log_path)
+        state = None if load_events else result_cache.get(key)
+        prev_cnt = checkpoint.state.get("v1_cnt", 0)
+        print("Parsing Log File...", end="")
+        if state is None:
+            # only complete lines are parsed, a partially written last line is picked up next time
+            log_file = get_lines(log_path, jobs=jobs, since=since, until=until)
+            if not log_file.compression:  # an archive isn't being written to
+                log_file.end = log_file.line_start(log_file.end)
+            with profiler.stage("parse log"), _event_taps(store if load_events else None, log_path) as taps:
+                state = _parse_v1_devs(log_file, checkpoint.state, start=checkpoint.offset or None, taps=taps)
+            log_file.close()
+            result_cache.put(key, state)
+        if resume or follow:
+            checkpoint.save(log_file.end, state)
+            print(f"OK {state['v1_cnt']} (SSHv1 devices found, {state['v1_cnt'] - prev_cnt} new)")
+        else:
+            print(f"OK {state['v1_cnt']} (SSHv1 devices found)")
+
+        if state["v1_devs"] != reported:
+            # Gather Additional data from imc for each dev_id from log (again only if new devices aren't in it)
+            # developer mode picks devices from the full inventory
+            ips, imc_dev_dict, imc_icc_dict = _v1_imc_data(state, cache, developer_mode=developer_mode,
+                                                           refresh=refresh and reported is None, offline=offline,
+                                                           known=(imc_dev_dict, imc_icc_dict))
+            _report_v1_devs(state["v1_devs"], state["v1_cnt"], imc_dev_dict, imc_icc_dict, developer_mode=developer_mode,
+                            ips=ips)
+            reported = list(state["v1_devs"])
+
+        if not follow:
+            break
+        try:
+            time.sleep(interval)
+        except KeyboardInterrupt:
+            typer.echo(f"\nStopped following {log_path}, run with --resume or --follow to continue from byte {checkpoint.offset}")
+            break
+
+
+def _scan_errors(log_file: LogFile, names: List[str], user: str = None) -> Tuple[List[Hit], Dict[str, int]]:
+    '''Return (hits, {detector: times triggered}) for the detectors in names, one pass over log_file.'''
+    detectors = create_detectors(names, user=user)
+    hits = list(ErrorScanner(detectors).scan(log_file))
+    return hits, {d.name: d.triggered for d in detectors}
+
+
+def _scan_errors_file(path: Path, names: List[str], user: str = None, since: str = None,
+                      until: str = None) -> Tuple[List[Hit], Dict[str, int]]:
+    '''_scan_errors for the log at path (run in a worker process for each file).'''
+    with _window(LogFile(path), since, until) as log_file:
+        return _scan_errors(log_file, names, user=user)
+
+
+@app.command("errors")
+def get_errors(names: List[str] = typer.Option(None, "--detector", "-d", help=f"Only run this detector (multiple allowed): {', '.join(DETECTORS)}"),
+               summary: bool = typer.Option(False, "--summary", "-s", help="Only show the number of errors and devices for each detector"),
+               logfile: Path = typer.Option(None, "--in", help=IN_HELP),
+               jobs: int = typer.Option(None, "--jobs", "-j", help="Number of processes used to scan the log (default 1, one per CPU with multiple logs)"),
+               since: str = typer.Option(None, "--since", help=SINCE_HELP, callback=_time_option),
+               until: str = typer.Option(None, "--until", help=UNTIL_HELP, callback=_time_option)) -> None:
+    """Find every known error (sshv1, cli failures, command authorization...) in one pass of the log(s)"""
+    names = names or list(DETECTORS)
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        typer.echo(f"{ERR_STR} Unknown detector {', '.join(unknown)}, valid detectors: {', '.join(DETECTORS)}")
+        raise typer.Exit(code=1)
+    user = config.get("imc", {}).get("logparse", {}).get("user")
+    if not user and "not_authorized" in names:
+        typer.echo(f"{WAR_STR} imc, logparse, user is missing in config, the dev ip isn't known for not_authorized errors")
+
+    log_paths = get_log_files(logfile)
+    hits, triggered = [], dict.fromkeys(names, 0)
+    print(f"Scanning {'Log File' if len(log_paths) == 1 else f'{len(log_paths)} Log Files'} for {len(names)} errors...", end="")
+    options = {"names": names, "user": user, "since": since, "until": until}
+    with profiler.stage("parse log"):
+        if len(log_paths) == 1:
+            key = result_cache.key(log_paths[0], "errors", **options)
+            results = [result_cache.get(key)]
+            if results[0] is None:
+                log_file = open_log(log_paths[0], jobs=jobs or 1, since=since, until=until)
+                results = [_scan_errors(log_file, names, user=user)]
+                log_file.close()
+                result_cache.put(key, results[0])
+        else:
+            results = _parse_logs("errors", _scan_errors_file, log_paths, jobs=jobs, **options)
+    for _hits, _triggered in results:
+        hits += _hits
+        for name, cnt in _triggered.items():
+            triggered[name] += cnt
+    print(f"OK {len(hits)} errors found")
+
+    counts = [
+        (name, triggered[name], len({h.dev_id if h.dev_id is not None else h.dev_ip for h in hits if h.detector == name}),
+         DETECTORS[name].help)
+        for name in names
+    ]
+    lines = _table(counts, ("Detector", "Errors", "Devices", "Description"))
+    if not summary and hits:
+        hits.sort(key=lambda h: names.index(h.detector))  # stable, each detector's hits stay in log order
+        rows = [(h.detector, h.ts or "--", h.thread or "--", "--" if h.dev_id is None else h.dev_id, h.dev_ip or "--",
+                 h.detail or "") for h in hits]
+        lines = chain(_table(rows, ("Detector", "Time", "Thread", "Dev ID", "Dev IP", "Detail")), ["\n"], lines)
+    typer.echo_via_pager(lines)
+
+
 # @app.command()
 def get_cli_errors(include: str = typer.Argument(None), exclude: str = typer.Argument(None)) -> list:
-    lines = get_lines()
-    _capture = False
-    id_map = {}
-    v1_devs = []
-    v1_cnt = 0
-    input_params = ""
-    for line in lines:
-        if "dev id:" in line and "ip:" in line:
-            _ip = line.split("ip: ")[-1].split(" ")[0].rstrip(".")
-            id_map[int(line.split("dev id: ")[-1].split(",")[0])] = _ip
-
-        if "THREAD" in line and "Failed to execute by cli method" in line:
-            _capture = True
-            _thread = line.split("THREAD(")[-1].split(")")[0]
-            v1_cnt += 1
-        elif _capture:
-            if "InputParam " in line:
-                input_params = line
-            if _capture and "iDevID" in line:
-                v1_devs.append(int.from_bytes(bytes.fromhex(line.strip().split("'")[1]), "big"))
-                input_params = ""
-                _capture = False
-
-    print(v1_cnt)
-    # cfg = config.config.get("imc")
-    # imc_dev_list = imc.device.get_all_devs(config.imc.creds, config.imc.url, by_id=True, verify=False)
-    typer.echo_via_pager(json.dumps({dev: (input_params, id_map.get(dev, "")) for dev in v1_devs}, indent=4))
+    log_file = get_lines()
+    detectors = create_detectors([CliFailed.name])
+    scanner = ErrorScanner(detectors)
+    hits = list(scanner.scan(log_file))
+    print(detectors[0].triggered)
+    typer.echo_via_pager(json.dumps({hit.dev_id: (hit.detail or "", scanner.id_map.get(hit.dev_id, "")) for hit in hits},
+                                    indent=4))
 
 
 
@@ -457,7 +975,6 @@ def get_cli_errors(include: str = typer.Argument(None), exclude: str = typer.Arg
 if __name__ == "__main__":
     # lines = get_lines()
     app()
-    # DEVICES = _init_DEVICES(lines)
     # v1_devs = get_v1_devs(lines)
     # v1_devs = get_cli_errors(lines)
     # for k, v in sorted(v1_devs.items()):
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# imcapicli loads config.yaml and writes logs/ relative to the calling script, run as logparser.py would
+sys.argv[0] = str(Path(__file__).resolve().parent.parent / "logparser.py")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
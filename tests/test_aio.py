@@ -0,0 +1,70 @@
+"""
+The async IMC collection (AsyncImc and the plat coroutines) run against bench.mockimc.
+"""
+
+import time
+from itertools import islice
+
+import pytest
+
+from bench.genlog import FIRST_DEV_ID
+from bench.mockimc import MockImc
+from imcapicli.aio import AsyncImc
+from imcapicli.client import ImcSession
+from imcapicli.plat import device, icc
+
+DEVICES = 2500
+
+
+@pytest.fixture(scope="module")
+def mock():
+    with MockImc(devices=DEVICES) as mock:
+        yield mock
+
+
+@pytest.fixture
+def session():
+    with ImcSession(retries=0) as session:
+        yield session
+
+
+def test_collect_concurrently(mock: MockImc, session: ImcSession):
+    aimc = AsyncImc(None, mock.url)
+    dev_ids = [FIRST_DEV_ID + 7, FIRST_DEV_ID + 99, FIRST_DEV_ID + 2000]
+    devs, by_id, cfg = aimc.run(
+        aimc.get_all_devs(by_id=True, fields=("ip",), workers=4, session=session),
+        aimc.get_devs_by_id(dev_ids, threshold=0.01, session=session),
+        aimc.get_config_center_dict(session=session),
+    )
+    assert list(devs) == list(range(FIRST_DEV_ID, FIRST_DEV_ID + DEVICES))
+    assert devs[FIRST_DEV_ID + 1] == {"id": str(FIRST_DEV_ID + 1), "ip": "10.0.3.233"}
+    assert list(by_id) == dev_ids and by_id[FIRST_DEV_ID + 7] == mock.by_id[FIRST_DEV_ID + 7]
+    assert cfg.ok and len(cfg.output) == DEVICES
+
+
+def test_sync_wrappers_match(mock: MockImc, session: ImcSession):
+    aimc = AsyncImc(None, mock.url)
+    expected, = aimc.run(aimc.get_all_devs(by_id=True, workers=4, session=session))
+    assert device.get_all_devs(None, mock.url, by_id=True, session=session) == expected
+    assert device.get_dev_count(None, mock.url, session=session) == DEVICES
+    assert device.get_dev_details(None, mock.url, FIRST_DEV_ID, session=session) == mock.by_id[FIRST_DEV_ID]
+    assert icc.get_config_center_dict(None, mock.url, session=session).ok
+
+
+def test_iter_devs_stops_early(mock: MockImc, session: ImcSession):
+    before = mock.requests.get("/imcrs/plat/res/device", 0)
+    devs = list(islice(device.iter_devs(None, mock.url, session=session), 5))
+    assert [int(dev["id"]) for dev in devs] == list(range(FIRST_DEV_ID, FIRST_DEV_ID + 5))
+    assert mock.requests["/imcrs/plat/res/device"] - before == 1  # only the first page was requested
+
+
+def test_targeted_lookups_overlap(session: ImcSession):
+    latency, dev_ids = 0.1, list(range(FIRST_DEV_ID, FIRST_DEV_ID + 8))
+    with MockImc(devices=1000, latency=latency) as mock:
+        aimc = AsyncImc(None, mock.url)
+        start = time.perf_counter()
+        devs, = aimc.run(aimc.get_devs_by_id(dev_ids, threshold=0.01, workers=4, session=session))
+        elapsed = time.perf_counter() - start
+    assert list(devs) == dev_ids
+    # the count plus 8 lookups 4 at a time is 3 round trips, one at a time it would be 9
+    assert elapsed < latency * 6
@@ -0,0 +1,86 @@
+"""
+ImcCache freshness: full collections and individual devices expire after ttl.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from imcapicli import cache
+from imcapicli.cache import DEVICE, ICC, ImcCache
+
+NOW = 1_700_000_000.0
+
+
+class Clock:
+    def __init__(self, now: float = NOW):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def imc_cache(tmp_path: Path):
+    imc_cache = ImcCache(tmp_path / "imc_cache.db", ttl=60)
+    yield imc_cache
+    imc_cache.close()
+
+
+def test_collection_expires(clock: Clock, imc_cache: ImcCache):
+    assert imc_cache.get(DEVICE) is None
+    imc_cache.put(DEVICE, {1: {"ip": "10.0.0.1"}, 2: {"ip": "10.0.0.2"}})
+    assert imc_cache.collected(DEVICE) == NOW
+    clock.now += 60
+    assert imc_cache.get(DEVICE) == {1: {"ip": "10.0.0.1"}, 2: {"ip": "10.0.0.2"}}
+    assert imc_cache.get(ICC) is None  # sources are kept apart
+    clock.now += 1
+    assert imc_cache.get(DEVICE) is None
+
+
+def test_put_replaces_source(clock: Clock, imc_cache: ImcCache):
+    imc_cache.put(DEVICE, {1: {"ip": "10.0.0.1"}, 2: {"ip": "10.0.0.2"}})
+    imc_cache.put(ICC, {1: {"cfg": "a"}})
+    imc_cache.put(DEVICE, {3: {"ip": "10.0.0.3"}})
+    assert imc_cache.get(DEVICE) == {3: {"ip": "10.0.0.3"}}
+    assert imc_cache.get(ICC) == {1: {"cfg": "a"}}
+
+
+def test_devices_expire_individually(clock: Clock, imc_cache: ImcCache):
+    imc_cache.put(DEVICE, {1: {"ip": "10.0.0.1"}, 2: {"ip": "10.0.0.2"}})
+    clock.now += 50
+    imc_cache.update(DEVICE, {2: {"ip": "10.0.0.22"}, 3: {"ip": "10.0.0.3"}})
+    assert imc_cache.collected(DEVICE) == NOW  # update isn't a full collection
+
+    clock.now += 20  # 1 is 70s old, 2 and 3 are 20s old
+    assert imc_cache.get_devs(DEVICE, [1, 2, 3, 4]) == {2: {"ip": "10.0.0.22"}, 3: {"ip": "10.0.0.3"}}
+    assert imc_cache.stale(DEVICE, [1, 2, 3, 4]) == [1, 4]
+    assert imc_cache.get(DEVICE) is None
+
+
+def test_get_devs_many_ids(clock: Clock, imc_cache: ImcCache):
+    imc_cache.put(DEVICE, {dev_id: {"id": dev_id} for dev_id in range(1200)})
+    dev_ids = list(range(0, 2400, 2))  # more ids than fit in one query
+    assert list(imc_cache.get_devs(DEVICE, dev_ids)) == list(range(0, 1200, 2))
+    assert imc_cache.stale(DEVICE, dev_ids) == list(range(1200, 2400, 2))
+
+
+def test_clear_and_reopen(clock: Clock, imc_cache: ImcCache, tmp_path: Path):
+    imc_cache.put(DEVICE, {1: {"ip": "10.0.0.1"}})
+    imc_cache.put(ICC, {1: {"cfg": "a"}})
+    imc_cache.clear(ICC)
+    assert imc_cache.get(ICC) is None and imc_cache.collected(ICC) is None
+
+    reopened = ImcCache(tmp_path / "imc_cache.db", ttl=60)
+    assert reopened.get(DEVICE) == {1: {"ip": "10.0.0.1"}}
+    reopened.close()
+
+    imc_cache.clear()
+    assert imc_cache.get(DEVICE) is None
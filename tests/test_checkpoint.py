@@ -0,0 +1,82 @@
+"""
+Checkpoint and the sshv1 --resume parse: a log parsed as it's written, a piece at a time, gives
+the same result as parsing it once complete.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from bench.genlog import generate
+from imcapicli.checkpoint import Checkpoint
+from imcapicli.logsource import LogFile
+from logparser import _parse_v1_devs
+
+TRIGGER = b"version 2 required by our configuration"
+
+
+@pytest.fixture(scope="module")
+def log_data(tmp_path_factory) -> bytes:
+    path = tmp_path_factory.mktemp("logs") / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, 200, threads=6, devices=50, ssh_v1=0.3, seed=7)
+    return path.read_bytes()
+
+
+def _resume(log_path: Path, cp_file: Path) -> dict:
+    '''One sshv1 --resume run (the parse and checkpoint steps of logparser.get_v1_devs).'''
+    checkpoint = Checkpoint(cp_file, log_path).load()
+    checkpoint.state["id_map"] = {int(k): v for k, v in checkpoint.state.get("id_map", {}).items()}
+    with LogFile(log_path) as log_file:
+        log_file.end = log_file.line_start(log_file.end)  # a partly written last line is left for the next run
+        state = _parse_v1_devs(log_file, checkpoint.state, start=checkpoint.offset or None)
+        checkpoint.save(log_file.end, state)
+    return state
+
+
+def test_resume_equals_full_parse(log_data: bytes, tmp_path: Path):
+    full_path = tmp_path / "full.log"
+    full_path.write_bytes(log_data)
+    with LogFile(full_path) as log_file:
+        expected = _parse_v1_devs(log_file, {})
+
+    # cut in the middle of the iDevID line that follows an SSHv1 error, the capture is carried over
+    trigger = log_data.index(TRIGGER, len(log_data) // 3)
+    id_line = log_data.index(b"\n", trigger) + 1
+    cuts = [id_line + 10, len(log_data) * 2 // 3, len(log_data)]
+    log_path, cp_file = tmp_path / "imcupgdm.log", tmp_path / "sshv1.checkpoint"
+    log_path.write_bytes(b"")
+    written, states = 0, []
+    for cut in cuts:
+        with log_path.open("ab") as f:
+            f.write(log_data[written:cut])
+        written = cut
+        states.append(_resume(log_path, cp_file))
+
+    state = states[-1]
+    assert states[0]["capture"]
+
+    assert state["v1_devs"] == expected["v1_devs"] and state["v1_cnt"] == expected["v1_cnt"]
+    assert state["id_map"] == expected["id_map"]
+    assert json.loads(cp_file.read_text())["offset"] == len(log_data)
+
+
+def test_checkpoint_discarded(log_data: bytes, tmp_path: Path):
+    log_path, cp_file = tmp_path / "imcupgdm.log", tmp_path / "sshv1.checkpoint"
+    log_path.write_bytes(log_data)
+    Checkpoint(cp_file, log_path).save(1000, {"v1_cnt": 3})
+    assert Checkpoint(cp_file, log_path).load().offset == 1000
+
+    assert not Checkpoint(cp_file, tmp_path / "other.log").load()  # saved for another log
+    log_path.write_bytes(log_data[:500])  # truncated below the offset
+    assert not Checkpoint(cp_file, log_path).load()
+    log_path.write_bytes(b"x" + log_data[1:])  # replaced (rotated), the head changed
+    assert not Checkpoint(cp_file, log_path).load()
+    cp_file.write_text("{not json")
+    assert not Checkpoint(cp_file, log_path).load()
+
+    checkpoint = Checkpoint(cp_file, log_path)
+    checkpoint.save(10, {})
+    checkpoint.clear()
+    assert not cp_file.exists() and not checkpoint
@@ -0,0 +1,80 @@
+"""
+Compressed logs are streamed into the parsers: each is checked against the same log
+uncompressed, with the temp file fallback (compressed.read) disabled and chunks small
+enough that lines and error blocks straddle them.
+"""
+
+import gzip
+import lzma
+from pathlib import Path
+
+import pytest
+
+from bench.genlog import PARSE_USER, generate
+from imcapicli import compressed, logsource
+from imcapicli.detectors import ErrorScanner, create
+from imcapicli.logsource import LogFile
+
+
+@pytest.fixture(scope="module")
+def plain(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("logs") / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, 400, threads=8, devices=50)
+    return path
+
+
+def _zstd(raw: bytes) -> bytes:
+    zstandard = pytest.importorskip("zstandard")
+    c = zstandard.ZstdCompressor()
+    return b"".join(c.compress(raw[i:i + 20000]) for i in range(0, len(raw), 20000))  # several frames
+
+
+def _parse(log_file: LogFile) -> dict:
+    finished = list(log_file.grep(b"Finished, result:", count=False))
+    return {
+        "grep": list(log_file.grep(b"THREAD(", b"dev id:")),
+        "grep_start": list(log_file.grep(b"dev id:", start=finished[len(finished) // 2].offset)),
+        "lines": list(log_file.lines()),
+        "grep_map": list(log_file.grep_map(len, b"ip: ")),
+        "errors": list(ErrorScanner(create(user=PARSE_USER)).scan(log_file)),
+    }
+
+
+@pytest.mark.parametrize("fmt, jobs", [("gzip", 1), ("xz", 1), ("zstd", 1), ("zstd", 4)])
+def test_stream_equals_plain(plain: Path, tmp_path: Path, monkeypatch, fmt: str, jobs: int):
+    raw = plain.read_bytes()
+    data = {"gzip": gzip.compress, "xz": lzma.compress, "zstd": _zstd}[fmt](raw)
+    path = tmp_path / f"imcupgdm.log.{fmt}"
+    path.write_bytes(data)
+
+    with LogFile(plain) as log_file:
+        expected = _parse(log_file)
+
+    def no_temp_file(*args, **kwargs):
+        raise AssertionError("compressed log was decompressed to a temp file")
+
+    monkeypatch.setattr(compressed, "read", no_temp_file)
+    monkeypatch.setattr(compressed, "CHUNK", 16 * 1024)
+    monkeypatch.setattr(logsource, "LOOKAROUND", 8 * 1024)
+    with LogFile(path, jobs=jobs) as log_file:
+        assert _parse(log_file) == expected
+        assert log_file.size == len(raw)
+
+
+def test_random_access_falls_back_to_temp_file(plain: Path, tmp_path: Path):
+    path = tmp_path / "imcupgdm.log.gz"
+    path.write_bytes(gzip.compress(plain.read_bytes()))
+    with LogFile(plain) as expected, LogFile(path) as log_file:
+        offset = expected.size // 2
+        assert log_file.line_start(offset) == expected.line_start(offset)
+        assert log_file.size == expected.size
+        assert list(log_file.grep(b"dev id:")) == list(expected.grep(b"dev id:"))
+
+
+def test_truncated(plain: Path, tmp_path: Path):
+    path = tmp_path / "imcupgdm.log.gz"
+    data = gzip.compress(plain.read_bytes())
+    path.write_bytes(data[:len(data) // 2])
+    with LogFile(path) as log_file, pytest.raises(ValueError):
+        list(log_file.lines())
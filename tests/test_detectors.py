@@ -0,0 +1,85 @@
+"""
+The registered detectors run by ErrorScanner over a bench.genlog log, checked against a plain
+scan of the log text.
+"""
+
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from bench.genlog import NOT_AUTHZ, PARSE_USER, generate
+from imcapicli import detectors
+from imcapicli.detectors import DETECTORS, Detector, ErrorScanner, Hit, create, register
+from imcapicli.logsource import Line, LogFile
+
+
+@pytest.fixture(scope="module")
+def log_path(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("logs") / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, 300, threads=8, devices=60, seed=5)
+    return path
+
+
+def _scan(log_path: Path, names: List[str] = None, **options) -> List[Hit]:
+    with LogFile(log_path) as log_file:
+        return list(ErrorScanner(create(names, **options)).scan(log_file))
+
+
+def _ip(dev_id: int) -> str:
+    return f"10.{dev_id // 65536 % 256}.{dev_id // 256 % 256}.{dev_id % 256}"
+
+
+def test_detector_is_abstract():
+    with pytest.raises(TypeError):
+        Detector()
+
+    class NoFeed(Detector):
+        name = "no_feed"
+
+    with pytest.raises(TypeError):
+        NoFeed()
+
+
+def test_register(monkeypatch, log_path: Path):
+    monkeypatch.setattr(detectors, "DETECTORS", dict(DETECTORS))
+
+    @register
+    class Spawn(Detector):
+        name = "spawn"
+        markers = ("spawn ssh pid:",)
+
+        def feed(self, line: Line, log_file: LogFile) -> Optional[Hit]:
+            if "spawn ssh pid:" in line.text:
+                self.triggered += 1
+                return Hit(self.name, "", "", None, None, line.offset)
+
+    assert detectors.DETECTORS["spawn"] is Spawn
+    assert len(_scan(log_path, ["spawn"])) == log_path.read_text().count("spawn ssh pid:")
+    with pytest.raises(ValueError):
+        create(["nope"])
+
+
+def test_capture_detectors(log_path: Path):
+    text = log_path.read_text()
+    hits = _scan(log_path, ["sshv1", "cli_failed"])
+    sshv1 = [h for h in hits if h.detector == "sshv1"]
+    cli = [h for h in hits if h.detector == "cli_failed"]
+    assert len(sshv1) == text.count("version 2 required by our configuration")
+    assert len(cli) == text.count("Failed to execute by cli method")
+    # genlog logs the iDevID line on the same thread right after the error, ips are from the "dev id:" lines
+    assert all(h.dev_ip == _ip(h.dev_id) for h in hits)
+    assert all(h.detail.endswith("InputParam cmd=display version") for h in cli)
+    assert all(h.detail is None for h in sshv1)
+
+
+def test_not_authorized(log_path: Path):
+    text = log_path.read_text()
+    hits = _scan(log_path, ["not_authorized"], user=PARSE_USER)
+    assert len(hits) == text.count(NOT_AUTHZ)
+    assert all(h.dev_ip is not None and h.dev_id is not None and h.dev_ip == _ip(h.dev_id) for h in hits)
+    with LogFile(log_path) as log_file:
+        assert all("Finished, result:" in log_file.text(h.offset, log_file.line_end(h.offset)) for h in hits)
+    # without the user the prompt (and so the ip) isn't known
+    assert all(h.dev_ip is None for h in _scan(log_path, ["not_authorized"]))
@@ -0,0 +1,87 @@
+"""
+plat.device inventory collection against bench.mockimc.
+"""
+
+import pytest
+
+from bench.genlog import FIRST_DEV_ID
+from bench.mockimc import DEVICE_URL, MockImc
+from imcapicli.client import ImcSession
+from imcapicli.plat import device
+
+DEVICES = 4500  # 5 pages of 1000
+
+
+@pytest.fixture(scope="module")
+def mock():
+    with MockImc(devices=DEVICES) as mock:
+        yield mock
+
+
+@pytest.fixture
+def session():
+    with ImcSession(retries=0) as session:
+        yield session
+
+
+def _requests(mock: MockImc, path: str = DEVICE_URL) -> int:
+    return mock.requests.get(path, 0)
+
+
+@pytest.mark.parametrize("workers", [None, 1, 4])
+def test_pages_in_order(mock: MockImc, session: ImcSession, workers: int):
+    before = _requests(mock)
+    devs = device.get_all_devs(None, mock.url, workers=workers, session=session)
+    assert [int(dev["id"]) for dev in devs] == list(range(FIRST_DEV_ID, FIRST_DEV_ID + DEVICES))
+    assert devs == mock.devices
+    assert _requests(mock) - before == 5
+
+
+def test_single_device_page():
+    # IMC returns a dict rather than a list for a page with a single device
+    with MockImc(devices=1001) as mock, ImcSession(retries=0) as session:
+        devs = device.get_all_devs(None, mock.url, by_id=True, workers=4, session=session)
+    assert list(devs) == list(range(FIRST_DEV_ID, FIRST_DEV_ID + 1001))
+
+
+def test_iter_devs_fetches_ahead_only_workers_pages():
+    with MockImc(devices=9000) as mock, ImcSession(retries=0) as session:
+        devs = device.iter_devs(None, mock.url, workers=4, session=session)
+        for _ in range(1001):  # the first page and 1 device of the second
+            next(devs)
+        devs.close()
+        # the first page plus at most workers pages ahead of the one being consumed, not the 9 pages
+        assert _requests(mock) <= 1 + 4 + 1
+
+
+def test_fields(mock: MockImc, session: ImcSession):
+    devs = list(device.iter_devs(None, mock.url, fields=("label", "ip"), session=session))
+    assert len(devs) == DEVICES
+    assert all(list(dev) == ["label", "ip"] for dev in devs)  # IMC order, not the order asked for
+    by_id = device.get_all_devs(None, mock.url, by_id=True, fields=("ip",), session=session)
+    assert by_id[FIRST_DEV_ID] == {"id": str(FIRST_DEV_ID), "ip": mock.devices[0]["ip"]}
+
+
+def test_get_devs_by_id_targeted(mock: MockImc, session: ImcSession):
+    dev_ids = [FIRST_DEV_ID + 3, FIRST_DEV_ID + 40, FIRST_DEV_ID + 4499, 99]  # 99 isn't in IMC
+    pages, details = _requests(mock), _requests(mock, f"{DEVICE_URL}/{FIRST_DEV_ID + 3}")
+    # 4 ids is at most 1% of 4500 devices (crossover 45), each device is requested on its own
+    devs = device.get_devs_by_id(None, mock.url, dev_ids, threshold=0.01, session=session)
+    assert list(devs) == dev_ids[:3]
+    assert devs[FIRST_DEV_ID + 3] == mock.by_id[FIRST_DEV_ID + 3]
+    assert _requests(mock) - pages == 1  # the device count
+    assert _requests(mock, f"{DEVICE_URL}/{FIRST_DEV_ID + 3}") - details == 1
+
+
+def test_get_devs_by_id_bulk(mock: MockImc, session: ImcSession):
+    pages = _requests(mock)
+    devs = device.get_devs_by_id(None, mock.url, [FIRST_DEV_ID, FIRST_DEV_ID + 1], threshold=0.0001, session=session)
+    assert len(devs) == DEVICES  # above the crossover (0) the whole inventory is collected
+    assert _requests(mock) - pages == 1 + 5
+
+
+def test_get_devs_by_id_unreachable(session: ImcSession):
+    # the count can't be had, so the bulk collection is tried, which fails too: nothing found, nothing raised
+    assert device.get_dev_count(None, "http://127.0.0.1:1", session=session) is None
+    assert device.get_dev_details(None, "http://127.0.0.1:1", FIRST_DEV_ID, session=session) is None
+    assert device.get_devs_by_id(None, "http://127.0.0.1:1", [FIRST_DEV_ID], session=session) == {}
@@ -0,0 +1,55 @@
+"""
+DevStore columns, lookups and joins compared with the dict per device they replace.
+"""
+
+import pytest
+
+from imcapicli.devstore import DevStore
+
+DEVS = {
+    1: {"id": "1", "label": "sw1", "ip": "10.0.0.1", "model": "5130"},
+    2: {"id": "2", "label": "sw2", "ip": "10.0.0.2"},
+    3: {"id": "3", "label": "sw3", "ip": "10.0.0.3", "model": "5130"},
+}
+ICC = {
+    2: {"model": "5940", "cfg": "b"},
+    3: {"cfg": "c"},
+    4: {"cfg": "d"},
+}
+
+
+@pytest.fixture
+def devs() -> DevStore:
+    return DevStore.from_dict(DEVS)
+
+
+def test_from_dict(devs: DevStore):
+    assert list(devs.ids) == [1, 2, 3] and len(devs) == 3
+    assert list(devs.columns) == ["id", "label", "ip", "model"]  # order of first appearance
+    assert devs.column("model") == ["5130", None, "5130"]
+    assert devs.column("model", default="") == ["5130", "", "5130"]
+    assert devs.column("nope", default="") == ["", "", ""]
+    assert list(DevStore.from_dict(DEVS, fields=("ip",)).columns) == ["ip"]
+
+
+def test_get_and_where(devs: DevStore):
+    assert 2 in devs and 4 not in devs
+    assert devs.get(1, "label") == "sw1"
+    assert devs.get(2, "model", "-") == "-"  # missing value
+    assert devs.get(4, "label", "-") == "-"  # missing device
+    assert devs.get(1, "nope") is None
+    assert devs.where("model", "5130") == [1, 3]
+    assert devs.group_by("model", default="") == {("5130",): [1, 3], ("",): [2]}
+    assert list(devs.rows("label", "ip")) == [(d["label"], d["ip"]) for d in DEVS.values()]
+
+
+@pytest.mark.parametrize("ids", [None, [4, 2, 2, 5, 1]])
+def test_join_matches_dict_merge(devs: DevStore, ids):
+    joined = devs.join(DevStore.from_dict(ICC), ids)
+    ids = list(DEVS) if ids is None else list(dict.fromkeys(ids))
+    assert list(joined.ids) == ids
+    fields = list(joined.columns)
+    assert fields == ["id", "label", "ip", "model", "cfg"]
+    for dev_id in ids:
+        merged = {**DEVS.get(dev_id, {}), **ICC.get(dev_id, {})}
+        assert {f: joined.get(dev_id, f) for f in fields if joined.get(dev_id, f) is not None} == merged
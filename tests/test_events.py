@@ -0,0 +1,96 @@
+"""
+EventStore loaded by the sessions and sshv1 parses (EventTap) and queried.
+"""
+
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from bench.genlog import FIRST_DEV_ID, generate
+from imcapicli.cache import DEVICE, ImcCache
+from imcapicli.detectors import ErrorScanner, SshV1
+from imcapicli.events import EventParser, EventStore, EventTap
+from imcapicli.logsource import LogFile
+from imcapicli.sessions import Session, SessionParser
+from logparser import MATCHER
+
+
+@pytest.fixture(scope="module")
+def log_path(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("logs") / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, 200, threads=8, devices=40, seed=9)
+    return path
+
+
+@pytest.fixture(scope="module")
+def parsed(log_path: Path) -> List[tuple]:
+    '''The events of a pass over the log for them alone.'''
+    with LogFile(log_path) as log_file:
+        return list(EventParser(MATCHER).parse(log_file))
+
+
+@pytest.fixture
+def store(tmp_path: Path):
+    store = EventStore(tmp_path / "events.db")
+    yield store
+    store.close()
+
+
+def _stored(store: EventStore) -> List[tuple]:
+    return store.db.execute("SELECT ts, thread, dev_id, dev_ip, type, offset, detail FROM events ORDER BY offset").fetchall()
+
+
+def _fields(session: Session) -> tuple:
+    return tuple(getattr(session, name) for name in Session.__slots__)
+
+
+def test_sessions_parse_loads_events(log_path: Path, parsed: List[tuple], store: EventStore):
+    with LogFile(log_path) as log_file:
+        sessions = list(SessionParser(MATCHER).parse_log(log_file))
+        with store.loader(log_path) as loader:
+            tapped = list(SessionParser(MATCHER).parse_log(log_file, taps=[EventTap(MATCHER, loader)]))
+    assert [_fields(s) for s in tapped] == [_fields(s) for s in sessions]
+    assert loader.cnt == len(parsed) and _stored(store) == parsed
+    assert {"start", "login", "sshv1", "cli_failed", "finished", "not_authorized"} == {e[4] for e in parsed}
+    assert store.is_current(log_path)
+
+
+def test_error_scan_loads_events(log_path: Path, parsed: List[tuple], store: EventStore):
+    with LogFile(log_path) as log_file:
+        hits = list(ErrorScanner([SshV1()]).scan(log_file))
+        with store.loader(log_path) as loader:
+            tapped = list(ErrorScanner([SshV1(), EventTap(MATCHER, loader)]).scan(log_file))
+    assert tapped == hits
+    assert _stored(store) == parsed
+
+
+def test_interrupted_load(log_path: Path, parsed: List[tuple], store: EventStore):
+    store.load(log_path, parsed)
+    with pytest.raises(KeyboardInterrupt):
+        with store.loader(log_path) as loader:
+            loader.add(parsed[0])
+            raise KeyboardInterrupt
+    assert _stored(store) == parsed  # the previous events are kept
+
+
+def test_query(log_path: Path, parsed: List[tuple], store: EventStore, tmp_path: Path):
+    store.load(log_path, parsed)
+    headers, rows = store.query(types=["sshv1"])
+    assert headers[:2] == ["ts", "type"] and len(rows) == sum(e[4] == "sshv1" for e in parsed)
+    headers, rows = store.query(by=["type"])
+    assert headers == ["type", "Events", "Devices"]
+    assert {row[0]: row[1] for row in rows} == {t: sum(e[4] == t for e in parsed) for t in {e[4] for e in parsed}}
+
+    with pytest.raises(ValueError, match="dya"):
+        store.query(by=["dya"])  # no inventory
+    inventory = ImcCache(tmp_path / "imc_cache.db")
+    inventory.put(DEVICE, {dev_id: {"id": str(dev_id), "deviceModel": f"model {dev_id % 2}"}
+                           for dev_id in range(FIRST_DEV_ID, FIRST_DEV_ID + 40)})
+    inventory.close()
+    with pytest.raises(ValueError, match="Unknown field dya"):
+        store.query(by=["day", "dya"], inventory=inventory.db_file)
+    headers, rows = store.query(types=["start"], by=["deviceModel"], inventory=inventory.db_file)
+    assert sorted(row[0] for row in rows) == ["model 0", "model 1"]
+    assert sum(row[1] for row in rows) == sum(e[4] == "start" for e in parsed)
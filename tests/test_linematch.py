@@ -0,0 +1,56 @@
+"""
+LineMatcher is checked against the split() based extraction logparser used before it
+(get_attrs_from_line) over tests/data/linematch_corpus.txt.
+"""
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pytest
+
+from imcapicli.linematch import LineAttrs
+from logparser import DEV_ID_MATCH, DEV_IP_MATCH, MATCHER
+
+CORPUS = Path(__file__).parent / "data" / "linematch_corpus.txt"
+
+
+def _corpus() -> List[str]:
+    lines = CORPUS.read_text().splitlines()
+    return [f"{line}\n" for line in lines if line.strip() and not line.startswith("#")]
+
+
+def _reference(line: str) -> Tuple[str, Optional[int], Optional[str], Optional[str], Optional[str]]:
+    '''get_attrs_from_line as it was before LineMatcher, returning the attributes instead of an ImcDev.'''
+    _id, _ip, _adapter, _login_type = None, None, None, None
+    _thread = line.split("THREAD(")[-1].split(")")[0]
+    for _ in DEV_ID_MATCH:
+        if _ in line:
+            _id = int(line.split(_)[-1].lstrip().split(" ")[0].split(",")[0].strip())
+            for _ in DEV_IP_MATCH:
+                if _ in line:
+                    _ip = line.split(_)[-1].lstrip().split(" ")[0].split(",")[0].strip().rstrip(".")
+
+            if "AdaptName=" in line:
+                _adapter = line.split("AdaptName=")[-1].strip()
+            if "Device login type is " in line:
+                _login_type = line.split("Device login type is ")[-1].split(",")[0].strip()
+
+    return _thread, _id, _ip, _adapter, _login_type
+
+
+def test_corpus_covers_every_marker():
+    lines = _corpus()
+    for marker in [*DEV_ID_MATCH, *DEV_IP_MATCH]:
+        assert any(marker in line for line in lines), f"no corpus line has {marker!r}"
+
+
+@pytest.mark.parametrize("line", _corpus())
+def test_match_equals_reference(line: str):
+    try:
+        expected = LineAttrs(*_reference(line))
+    except ValueError:
+        with pytest.raises(ValueError):
+            MATCHER.match(line)
+        return
+    assert MATCHER.match(line) == expected
+    assert MATCHER.has_dev_id(line) == (expected.dev_id is not None)
@@ -0,0 +1,74 @@
+"""
+LogIndex saved and loaded, line numbers from its samples and the lines it returns for a device.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from bench.genlog import PARSE_USER, generate
+from imcapicli import logindex
+from imcapicli.logindex import LogIndex, sample_idx
+from imcapicli.logsource import LogFile
+from logparser import MATCHER
+
+
+@pytest.fixture
+def log_path(tmp_path: Path) -> Path:
+    path = tmp_path / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, 80, threads=6, devices=30, not_authz=0.5)
+    return path
+
+
+def test_save_load(log_path: Path):
+    with LogFile(log_path) as log_file:
+        built = LogIndex.get(log_file, MATCHER)
+        loaded = LogIndex.load(log_file)
+        assert loaded is not None
+        for attr in ("threads", "devs", "finished", "boundaries", "samples"):
+            assert getattr(loaded, attr) == getattr(built, attr)
+        assert LogIndex.load_samples(log_file) == built.samples
+
+
+@pytest.mark.parametrize("damage", [b"", b"\x80\x04garbage", b'{"stamp": 1}\n', b'["stamp"]\n'])
+def test_unreadable_index_is_ignored(log_path: Path, damage: bytes):
+    with LogFile(log_path) as log_file:
+        LogIndex.get(log_file, MATCHER).save().write_bytes(damage)
+        assert LogIndex.load(log_file) is None
+        assert LogIndex.load_samples(log_file) is None
+
+
+def test_truncated_index_is_ignored(log_path: Path):
+    with LogFile(log_path) as log_file:
+        index = LogIndex.get(log_file, MATCHER)
+        idx_file = index.save()
+        idx_file.write_bytes(idx_file.read_bytes()[:-8])
+        assert LogIndex.load(log_file) is None
+        assert LogIndex.load_samples(log_file) == index.samples  # saved ahead of the rest
+
+
+def test_sample_idx_at_end_of_log(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(logindex, "SAMPLE_SIZE", 16)
+    path = tmp_path / "imcupgdm.log"
+    path.write_bytes(b"0123456\n" * 8)  # 64 bytes, a multiple of SAMPLE_SIZE
+    with LogFile(path) as log_file:
+        index = LogIndex.build(log_file, MATCHER)
+        assert sample_idx(index.samples, log_file, 64) == 8
+        assert index.line_idx(64) == 8
+        assert sample_idx(index.samples, log_file, 24) == 3
+
+
+def test_dev_offsets_include_output(log_path: Path):
+    with LogFile(log_path) as log_file:
+        index = LogIndex.build(log_file, MATCHER)
+        for dev_id in index.devs:
+            offsets = index.dev_offsets(dev_id)
+            finished = [offset for offset in offsets if index.is_finished(offset)]
+            assert finished
+            for offset in finished:
+                output = list(index.output_offsets(offset))
+                assert output and set(output) <= set(offsets)
+                assert index.line(output[0]).text.startswith(f"{PARSE_USER}@")
+                assert "[THREAD" not in "".join(index.line(pos).text for pos in output)
+                assert output[-1] < (index.next_boundary(offset) or log_file.size)
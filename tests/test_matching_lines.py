@@ -0,0 +1,65 @@
+"""
+get-all-lines matching (logparser._matching_lines): -A/-B/-C context against a plain scan of the log.
+"""
+
+import re
+from pathlib import Path
+from typing import List
+
+import pytest
+import typer
+
+from bench.genlog import generate
+from imcapicli.logsource import LogFile
+from logparser import _matching_lines
+
+
+@pytest.fixture(scope="module")
+def log_path(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("logs") / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, 40, threads=4, devices=20, seed=11)
+    return path
+
+
+def _expected(lines: List[str], match, before: int, after: int, max_count: int = None) -> List[str]:
+    '''What _matching_lines should return, from the whole log split into lines.'''
+    matches = [idx for idx, line in enumerate(lines) if line.strip() and match(line)][:max_count]
+    out, shown = [], None  # shown: idx of the line after the last one output
+    for pos, idx in enumerate(matches):
+        start = max(idx - before, 0 if shown is None else shown)
+        if (before or after) and shown is not None and start > shown:
+            out.append("--\n")
+        out += [f"{i}- {lines[i]}" for i in range(start, idx) if lines[i].strip()]
+        out.append(f"{idx}. {lines[idx]}")
+        shown = idx + 1
+        end = min(idx + 1 + after, len(lines), *matches[pos + 1:pos + 2])
+        out += [f"{i}- {lines[i]}" for i in range(shown, end) if lines[i].strip()]
+        shown = max(shown, end)
+    return out
+
+
+@pytest.mark.parametrize("before,after", [(0, 0), (3, 0), (0, 2), (2, 2), (5, 1)])
+def test_context(log_path: Path, before: int, after: int):
+    lines = log_path.read_text().splitlines(keepends=True)
+    with LogFile(log_path) as log_file:
+        found = list(_matching_lines(log_file, ["Finished, result:"], before=before, after=after))
+        assert found == _expected(lines, lambda line: "Finished, result:" in line, before, after)
+        found = list(_matching_lines(log_file, ["version 2 required"], before=before, after=after, max_count=3))
+        assert found == _expected(lines, lambda line: "version 2 required" in line, before, after, max_count=3)
+
+
+def test_regex_and_exclude(log_path: Path):
+    lines = log_path.read_text().splitlines(keepends=True)
+    regex = re.compile(r"THREAD\(10[12]\)")
+    with LogFile(log_path) as log_file:
+        found = list(_matching_lines(log_file, [regex.pattern], ["Begin"], regex=True, before=1, after=1))
+    assert found == _expected(lines, lambda line: regex.search(line) and "Begin" not in line, 1, 1)
+
+
+def test_invalid_regex(log_path: Path):
+    with LogFile(log_path) as log_file:
+        with pytest.raises(typer.BadParameter, match="THREAD\\("):
+            _matching_lines(log_file, ["THREAD("], regex=True)  # raised before any line is read
+        with pytest.raises(typer.BadParameter):
+            _matching_lines(log_file, ["THREAD"], ["[a-"], regex=True)
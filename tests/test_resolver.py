@@ -0,0 +1,65 @@
+"""
+IpResolver asks each tier only for what the tiers before it missed, and IMC only when needed.
+"""
+
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from imcapicli.cache import DEVICE, ImcCache
+from imcapicli.resolver import IpResolver, cache_tier, inventory_tier, log_tier
+
+
+@pytest.fixture
+def imc_cache(tmp_path: Path):
+    imc_cache = ImcCache(tmp_path / "imc_cache.db")
+    imc_cache.put(DEVICE, {2: {"ip": "10.0.0.2"}, 3: {"ip": "10.0.0.3"}, 5: {"ip": ""}})
+    yield imc_cache
+    imc_cache.close()
+
+
+class Inventory:
+    '''fetch for inventory_tier that records its calls.'''
+    def __init__(self, devs: Dict[int, dict]):
+        self.devs, self.calls = devs, 0
+
+    def __call__(self) -> Dict[int, dict]:
+        self.calls += 1
+        return self.devs
+
+
+def _resolver(imc_cache: ImcCache, inventory: Inventory, asked: List[List[int]]) -> IpResolver:
+    log = log_tier({1: "10.0.0.1", 2: "10.0.0.20", 4: ""})
+
+    def logged(dev_ids: List[int]) -> Dict[int, str]:
+        asked.append(dev_ids)
+        return log(dev_ids)
+    return IpResolver(("log", logged), ("cache", cache_tier(imc_cache)), ("imc", inventory_tier(inventory)))
+
+
+def test_tiers_in_order(imc_cache: ImcCache):
+    inventory, asked = Inventory({4: {"ip": "10.0.0.4"}, 6: {"ip": None}}), []
+    resolver = _resolver(imc_cache, inventory, asked)
+    ips = resolver.resolve([1, 2, 3, 4, 5, 6, 1])
+    # the log wins for 2, empty ips are misses
+    assert ips == {1: "10.0.0.1", 2: "10.0.0.20", 3: "10.0.0.3", 4: "10.0.0.4"}
+    assert asked == [[1, 2, 3, 4, 5, 6]]  # duplicates are asked once
+    assert resolver.stats == {"log": [2, 4], "cache": [1, 3], "imc": [1, 2]}
+    assert inventory.calls == 1
+    assert resolver.report() == "log 2 hits / 4 misses, cache 1 hits / 3 misses, imc 1 hits / 2 misses"
+
+
+def test_imc_not_asked_when_resolved(imc_cache: ImcCache):
+    inventory = Inventory({})
+    resolver = _resolver(imc_cache, inventory, [])
+    assert resolver.resolve([1, 3]) == {1: "10.0.0.1", 3: "10.0.0.3"}
+    assert resolver.resolve([]) == {}
+    assert inventory.calls == 0
+    assert resolver.stats["imc"] == [0, 0]
+
+
+def test_unreachable_imc(imc_cache: ImcCache):
+    resolver = _resolver(imc_cache, Inventory(None), [])  # the collection failed
+    assert resolver.resolve([1, 7]) == {1: "10.0.0.1"}
+    assert resolver.stats["imc"] == [0, 1]
@@ -0,0 +1,83 @@
+"""
+ResultCache keys change with the log and the parse, and results are evicted least recently used first.
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from imcapicli import resultcache
+from imcapicli.resultcache import ResultCache
+
+
+@pytest.fixture
+def log_path(tmp_path: Path) -> Path:
+    path = tmp_path / "imcupgdm.log"
+    path.write_bytes(bytes(range(256)) * 1024)  # 256K, past the sampled blocks
+    return path
+
+
+@pytest.fixture
+def results(tmp_path: Path) -> ResultCache:
+    return ResultCache(tmp_path / "results")
+
+
+def test_key_follows_log(log_path: Path, results: ResultCache):
+    key = results.key(log_path, "errors", user="admin")
+    assert key == results.key(log_path, "errors", user="admin")
+    assert key != results.key(log_path, "errors", user="other")
+    assert key != results.key(log_path, "sshv1", user="admin")
+
+    with log_path.open("ab") as f:  # the log grew
+        f.write(b"more\n")
+    grown = results.key(log_path, "errors", user="admin")
+    assert grown != key
+
+    # rewritten in place, same size and mtime, only the content of the head differs
+    stat = log_path.stat()
+    data = bytearray(log_path.read_bytes())
+    data[0] ^= 0xFF
+    log_path.write_bytes(data)
+    os.utime(log_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert results.key(log_path, "errors", user="admin") != grown
+
+
+def test_version_bump(log_path: Path, results: ResultCache, monkeypatch):
+    key = results.key(log_path, "errors")
+    monkeypatch.setattr(resultcache, "RESULT_VERSION", resultcache.RESULT_VERSION + 1)
+    assert results.key(log_path, "errors") != key
+
+
+def test_get_put(log_path: Path, results: ResultCache):
+    key = results.key(log_path, "sessions")
+    assert results.get(key) is None
+    results.put(key, {"sessions": [1, 2, 3]})
+    assert results.get(key) == {"sessions": [1, 2, 3]}
+
+    results._file(key).write_bytes(b"damaged")
+    assert results.get(key) is None
+    results.clear()
+    assert not list(results.cache_dir.iterdir())
+
+
+def test_disabled(log_path: Path, results: ResultCache):
+    results.enabled = False
+    assert results.key(log_path, "sessions") is None
+    results.put("k", 1)
+    assert results.get("k") is None and not results.cache_dir.exists()
+
+
+def test_evicts_least_recently_used(results: ResultCache):
+    value = b"x" * 1000
+    results.max_size = 3500  # 3 results
+    for i, key in enumerate("abc"):
+        results.put(key, value)
+        os.utime(results._file(key), ns=(i * 10 ** 9, i * 10 ** 9))
+    assert results.get("a") == value  # a is now the most recently used
+    results.put("d", value)
+    assert sorted(f.stem for f in results.cache_dir.glob("*.pkl")) == ["a", "c", "d"]
+
+    results.max_size = 10
+    results.put("e", value)  # the result just stored is kept even when over max_size
+    assert [f.stem for f in results.cache_dir.glob("*.pkl")] == ["e"]
@@ -0,0 +1,71 @@
+"""
+SessionParser over a bench.genlog log, whole and cut off while sessions are still running.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from bench.genlog import generate
+from imcapicli.logsource import LogFile
+from imcapicli.sessions import Session, SessionParser
+from logparser import MATCHER
+
+SESSIONS = 60
+THREAD_RE = re.compile(r"THREAD\((\d+)\)")
+
+
+@pytest.fixture(scope="module")
+def log_text(tmp_path_factory) -> str:
+    path = tmp_path_factory.mktemp("logs") / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, SESSIONS, threads=6, devices=40, seed=3)
+    return path.read_text()
+
+
+def _parse(path: Path) -> List[Session]:
+    with LogFile(path) as log_file:
+        return list(SessionParser(MATCHER).parse_log(log_file))
+
+
+def _running(text: str) -> Dict[str, int]:
+    '''{thread: dev id} of the sessions started and not finished in text, without the parser.'''
+    running = {}
+    for line in text.splitlines():
+        match = THREAD_RE.search(line)
+        if match is None:
+            continue
+        if "CExecuter::CExecuter()" in line:
+            running[match.group(1)] = int(line.rsplit("ID: ", 1)[1])
+        elif "Finished, result:" in line:
+            running.pop(match.group(1), None)
+    return running
+
+
+def test_every_session_finishes(log_text: str, tmp_path: Path):
+    path = tmp_path / "imcupgdm.log"
+    path.write_text(log_text)
+    sessions = _parse(path)
+    assert len(sessions) == SESSIONS
+    assert all(s.result == "0" and s.dev_id is not None and s.dev_ip for s in sessions)
+    assert all(s.end is not None for s in sessions[:-1]) and sessions[-1].end is None  # output runs to EOF
+
+
+def test_open_at_eof(log_text: str, tmp_path: Path):
+    lines = log_text.splitlines(keepends=True)
+    cut = [i for i, line in enumerate(lines) if "CExecuter::CExecuter()" in line][SESSIONS // 2]
+    text = "".join(lines[:cut + 3])  # a few lines into the session started at cut
+    path = tmp_path / "imcupgdm.log"
+    path.write_text(text)
+
+    sessions = _parse(path)
+    unfinished = {s.thread: s.dev_id for s in sessions if s.result is None}
+    assert unfinished == _running(text)
+    assert len(unfinished) > 1
+    # sessions still open are returned last, in the order they started
+    open_sessions = sessions[-len(unfinished):]
+    assert all(s.result is None for s in open_sessions)
+    assert [s.start for s in open_sessions] == sorted(s.start for s in open_sessions)
+    assert all(s.finished is None and s.end is None for s in open_sessions)
@@ -0,0 +1,73 @@
+"""
+--since / --until: the values accepted and the lines of the window found by binary search.
+"""
+
+from pathlib import Path
+from typing import List
+
+import pytest
+import typer
+
+from bench.genlog import generate
+from imcapicli.logsource import LogFile
+from logparser import _date_time_option, _time_option, _window
+
+
+@pytest.fixture(scope="module")
+def log_path(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("logs") / "imcupgdm.log"
+    with path.open("w", newline="") as fp:
+        generate(fp, 300, threads=6, devices=50, seed=13)
+    return path
+
+
+@pytest.mark.parametrize("value,expected", [
+    (None, None),
+    ("2020-11-17", "2020-11-17"),
+    ("2020-11-17T08", "2020-11-17 08"),
+    ("2020-11-17 08:00:05.5", "2020-11-17 08:00:05.5"),
+    ("08:00", "08:00"),
+    ("23:59:59", "23:59:59"),
+])
+def test_time_option(value: str, expected: str):
+    assert _time_option(value) == expected
+
+
+@pytest.mark.parametrize("value", ["2020-13-01", "2020-02-30", "2020-11-17 24", "25:00", "08:60", "08:00:61",
+                                   "yesterday", "2020-11-17 8:00", "8:00"])
+def test_time_option_invalid(value: str):
+    with pytest.raises(typer.BadParameter):
+        _time_option(value)
+
+
+def test_query_needs_a_date():
+    assert _date_time_option("2020-11-17 08:00") == "2020-11-17 08:00"
+    assert _date_time_option(None) is None
+    with pytest.raises(typer.BadParameter, match="no date"):
+        _date_time_option("08:00")
+
+
+def _expected(log_path: Path, since: str, until: str) -> List[str]:
+    '''The lines logged in [since, until), lines without a timestamp go with the line before them.'''
+    lines, ts = [], ""
+    for line in log_path.read_text().splitlines(keepends=True):
+        ts = line[:23] if line[:2] == "20" else ts
+        if (since is None or ts >= since) and (until is None or ts < until):
+            lines.append(line)
+    return lines
+
+
+@pytest.mark.parametrize("since,until", [
+    ("2020-11-17 08:00:01", "2020-11-17 08:00:03"),
+    ("08:00:02.5", None),
+    (None, "08:00:01.25"),
+    ("2020-11-17 08:00:02", "2020-11-17 08:00:02"),  # empty
+    ("2020-11-16", "2020-11-18"),  # the whole log
+])
+def test_window(log_path: Path, since: str, until: str):
+    with LogFile(log_path) as log_file:
+        _window(log_file, _time_option(since), _time_option(until))
+        found = [text for _, _, text in log_file.lines(log_file.start, log_file.end)]
+    full = [t if t is None or "-" in t else f"2020-11-17 {t}" for t in (since, until)]
+    assert found == _expected(log_path, *full)
+    assert since != until or not found